@@ -1,7 +1,18 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify
-from models import Database, User, Student, Professor, Admin, Utils
+from flask import Flask, Response, render_template, request, redirect, url_for, flash, session, jsonify, g
+from database import Database, Session, bind_session, unbind_session, release_connection
+from models import User, Student, Professor, Admin, Utils, EnrollmentQueue, Export, Waitlist, SEMESTERS
+from migrations import migrate
+from scheduling import meeting_days, format_minutes
+from pagination import page_size
+import metrics
 from datetime import date
+import click
+import csv
+import hmac
+import io
+import json
 import os
+import time
 import uuid
 
 app = Flask(__name__)
@@ -13,6 +24,17 @@ if not secret_key:
     
 app.secret_key = secret_key
 
+# 'direct' enrolls inside the request; 'queued' hands requests to the enrollment worker
+ENROLLMENT_MODE = os.getenv('ENROLLMENT_MODE', 'direct')
+
+VALID_GRADES = ['A', 'B', 'C', 'D', 'F']
+
+# After a write, the user's read-only pages stay on the primary this long (read-your-writes)
+REPLICA_PIN_SECONDS = float(os.getenv('DB_REPLICA_PIN_SECONDS', '10'))
+
+# Larger user imports go through the import-users command
+WEB_IMPORT_MAX_USERS = int(os.getenv('WEB_IMPORT_MAX_USERS', '500'))
+
 def validate_uuid(uuid_string):
     """Validate UUID format"""
     try:
@@ -43,6 +65,128 @@ def require_auth(user_type=None):
         return wrapper
     return decorator
 
+def read_only(f):
+    """Run the view in a read-only transaction"""
+    f.read_only = True
+    return f
+
+def page_args():
+    """Keyset paging parameters from the query string"""
+    return {
+        'after': request.args.get('after'),
+        'before': request.args.get('before'),
+        'limit': page_size(request.args.get('per_page'))
+    }
+
+@app.template_global()
+def page_url(**tokens):
+    """Current URL with the paging token replaced"""
+    args = request.args.to_dict()
+    args.pop('after', None)
+    args.pop('before', None)
+    args.update(tokens)
+    return url_for(request.endpoint, **(request.view_args or {}), **args)
+
+@app.before_request
+def start_request_metrics():
+    metrics.begin_request(request.endpoint or 'unknown')
+
+@app.teardown_request
+def finish_request_metrics(error=None):
+    metrics.end_request()
+
+# One database session (connection + transaction) per request
+@app.before_request
+def open_db_session():
+    view = app.view_functions.get(request.endpoint)
+    pinned = session.get('db_pinned_until', 0) > time.time()
+    g.db_session = Session(read_only=getattr(view, 'read_only', False), use_replica=not pinned)
+    bind_session(g.db_session)
+
+@app.after_request
+def commit_db_session(response):
+    db_session = g.get('db_session')
+    if db_session is not None:
+        db_session.close(commit=response.status_code < 500)
+        if db_session.wrote:
+            session['db_pinned_until'] = time.time() + REPLICA_PIN_SECONDS
+    return response
+
+@app.teardown_request
+def close_db_session(error=None):
+    db_session = g.pop('db_session', None)
+    if db_session is not None:
+        db_session.close(commit=False)
+    unbind_session()
+
+def read_grade_csv(stream):
+    """Validate a 'student_id,grade' CSV row by row; returns (grades, errors)"""
+    reader = csv.DictReader(io.TextIOWrapper(stream, encoding='utf-8-sig', newline=''))
+    if not reader.fieldnames:
+        raise Exception("CSV file is empty")
+    reader.fieldnames = [name.strip().lower() for name in reader.fieldnames]
+    if 'student_id' not in reader.fieldnames or 'grade' not in reader.fieldnames:
+        raise Exception("CSV needs 'student_id' and 'grade' columns")
+    
+    grades = {}
+    errors = []
+    for line, row in enumerate(reader, start=2):
+        student_id = (row['student_id'] or '').strip()
+        grade = (row['grade'] or '').strip().upper()
+        
+        if not student_id:
+            errors.append(f'line {line}: missing student_id')
+        elif grade and grade not in VALID_GRADES:
+            errors.append(f'line {line}: invalid grade {grade!r}')
+        elif grade:
+            grades[student_id] = grade
+    
+    return grades, errors
+
+def read_csv_rows(stream):
+    """Rows of an import CSV as dicts with normalized column names"""
+    reader = csv.DictReader(io.TextIOWrapper(stream, encoding='utf-8-sig', newline=''))
+    if not reader.fieldnames:
+        raise Exception("CSV file is empty")
+    reader.fieldnames = [name.strip().lower() for name in reader.fieldnames]
+    return list(reader)
+
+def read_section_rows(stream, filename):
+    """Rows of a section import file: CSV, or JSON holding a list of objects"""
+    if not filename.lower().endswith('.json'):
+        return read_csv_rows(stream)
+    
+    try:
+        rows = json.load(stream)
+    except ValueError:
+        raise Exception("Invalid JSON file")
+    if isinstance(rows, dict):
+        rows = rows.get('sections')
+    if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+        raise Exception("JSON file must hold a list of section objects")
+    return rows
+
+def import_row_label(filename, index):
+    """Where a rejected import row is in its file"""
+    return f'row {index + 1}' if filename.lower().endswith('.json') else f'line {index + 2}'
+
+def csv_response(filename, header, rows):
+    """Stream rows as a CSV download, written out in chunks as they arrive"""
+    def generate():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(header)
+        for row in rows:
+            writer.writerow(row)
+            if buffer.tell() >= 65536:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+    
+    return Response(generate(), mimetype='text/csv',
+                    headers={'Content-Disposition': f'attachment; filename="{filename}"'})
+
 # Initialize admin user
 def init_admin():
     try:
@@ -56,6 +200,77 @@ def init_admin():
     except:
         pass
 
+@app.cli.command('init-db')
+def init_db_command():
+    """Apply pending schema migrations and create the admin account"""
+    applied = migrate()
+    print(f"Applied migrations: {applied}" if applied else "Schema is up to date")
+    init_admin()
+
+@app.cli.command('enrollment-worker')
+@click.option('--batch-size', default=500, help='Requests allocated per transaction')
+@click.option('--poll-interval', default=0.5, help='Seconds to sleep when the queue is empty')
+@click.option('--once', is_flag=True, help='Exit once the queue is drained')
+def enrollment_worker(batch_size, poll_interval, once):
+    """Allocate seats for queued enrollment requests"""
+    while True:
+        processed = EnrollmentQueue.process_batch(batch_size)
+        if processed:
+            print(f"Processed {processed} enrollment requests")
+        elif once:
+            break
+        else:
+            time.sleep(poll_interval)
+
+@app.cli.command('waitlist-sweep')
+def waitlist_sweep():
+    """Fill free seats in every section from its waitlist"""
+    promoted = Waitlist.promote()
+    print(f"Enrolled {promoted} waitlisted student(s)")
+
+@app.cli.command('rebuild-gpa')
+def rebuild_gpa_command():
+    """Recompute all GPA aggregates from enrollments"""
+    Utils.rebuild_gpa()
+    print("GPA aggregates rebuilt")
+
+@app.cli.command('import-users')
+@click.argument('csv_file', type=click.File('rb'))
+@click.option('--workers', type=int, default=None, help='Password hashing processes (default: CPU count)')
+def import_users_command(csv_file, workers):
+    """Bulk-create students and professors from a CSV file"""
+    started = time.perf_counter()
+    created, errors = Admin.bulk_register_users(read_csv_rows(csv_file), workers)
+    for index, message in errors:
+        print(f"line {index + 2}: {message}")
+    print(f"Created {created} user(s), {len(errors)} error(s) in {time.perf_counter() - started:.1f}s")
+
+@app.cli.command('import-sections')
+@click.argument('sections_file', type=click.File('rb'))
+def import_sections_command(sections_file):
+    """Bulk-create course sections from a CSV or JSON file"""
+    started = time.perf_counter()
+    created, errors = Admin.bulk_import_sections(read_section_rows(sections_file, sections_file.name))
+    for index, message in errors:
+        print(f"{import_row_label(sections_file.name, index)}: {message}")
+    print(f"Created {created} section(s), {len(errors)} error(s) in {time.perf_counter() - started:.1f}s")
+
+@app.cli.command('rollover-term')
+@click.argument('from_semester', type=click.Choice(SEMESTERS))
+@click.argument('from_year', type=click.IntRange(min=1))
+@click.argument('to_semester', type=click.Choice(SEMESTERS))
+@click.argument('to_year', type=click.IntRange(min=1))
+def rollover_term_command(from_semester, from_year, to_semester, to_year):
+    """Copy every section of one term into another, e.g. rollover-term Fall 2025 Fall 2026"""
+    started = time.perf_counter()
+    try:
+        created, skipped = Admin.rollover_term(from_semester, from_year, to_semester, to_year)
+    except Exception as e:
+        raise click.ClickException(str(e))
+    for section, reason in skipped:
+        print(f"{section}: {reason}")
+    print(f"Created {created} section(s), skipped {len(skipped)} in {time.perf_counter() - started:.1f}s")
+
 @app.route('/')
 def index():
     if 'user_id' in session:
@@ -72,7 +287,16 @@ def login():
             flash('Username and password required', 'error')
             return render_template('login.html')
         
-        user = User.authenticate(username, password)
+        try:
+            login = User.get_login(username)
+            # Nothing else has run in this request's transaction; end it so no pooled
+            # connection is held through the CPU-heavy hash check
+            release_connection()
+            user = User.check_login(login, password)
+        except Exception as e:
+            flash(str(e), 'error')
+            return render_template('login.html')
+        
         if user:
             session['user_id'] = user['id']
             session['user_type'] = user['user_type']
@@ -133,10 +357,31 @@ def edit_profile():
 
 # ADMIN ROUTES
 @app.route('/admin/dashboard')
+@read_only
 @require_auth('admin')
 def admin_dashboard():
     stats = Admin.get_statistics()
-    return render_template('admin/dashboard.html', **stats)
+    current_semester, current_year = Utils.get_current_semester()
+    term_stats = Admin.get_term_statistics(current_semester, current_year)
+    return render_template('admin/dashboard.html', **stats,
+                           term_stats=term_stats,
+                           current_semester=current_semester,
+                           current_year=current_year)
+
+@app.route('/admin/bookings')
+@read_only
+@require_auth('admin')
+def booking_report():
+    current_semester, current_year = Utils.get_current_semester()
+    semester = request.args.get('semester', current_semester)
+    try:
+        year = int(request.args.get('year', current_year))
+    except ValueError:
+        year = current_year
+    
+    conflicts = Admin.get_booking_conflicts(semester, year)
+    return render_template('admin/booking_conflicts.html', conflicts=conflicts,
+                           semester=semester, year=year)
 
 @app.route('/admin/register_user', methods=['GET', 'POST'])
 @require_auth('admin')
@@ -178,18 +423,94 @@ def register_user():
     
     return render_template('admin/register_user.html')
 
+@app.route('/admin/import_users', methods=['POST'])
+@require_auth('admin')
+def import_users():
+    upload = request.files.get('users_file')
+    if not upload or not upload.filename:
+        flash('Choose a CSV file to import', 'error')
+        return redirect(url_for('register_user'))
+    
+    try:
+        rows = read_csv_rows(upload.stream)
+        if len(rows) > WEB_IMPORT_MAX_USERS:
+            raise Exception(f"Files over {WEB_IMPORT_MAX_USERS} rows take too long to hash in a request; "
+                            "use 'flask import-users' instead")
+        # Web workers are threaded, so hash on threads rather than forking a process pool
+        created, errors = Admin.bulk_register_users(rows, threads=True)
+        flash(f'Created {created} user(s)', 'success')
+        if errors:
+            details = '; '.join(f'line {index + 2}: {message}' for index, message in errors[:5])
+            flash(f'Skipped {len(errors)} row(s): {details}', 'error')
+    except Exception as e:
+        flash(f'Error: {str(e)}', 'error')
+    
+    return redirect(url_for('register_user'))
+
+@app.route('/admin/term_setup')
+@read_only
+@require_auth('admin')
+def term_setup():
+    current_semester, current_year = Utils.get_current_semester()
+    return render_template('admin/term_setup.html', semesters=SEMESTERS,
+                           current_semester=current_semester, current_year=current_year)
+
+@app.route('/admin/import_sections', methods=['POST'])
+@require_auth('admin')
+def import_sections():
+    upload = request.files.get('sections_file')
+    if not upload or not upload.filename:
+        flash('Choose a CSV or JSON file to import', 'error')
+        return redirect(url_for('term_setup'))
+    
+    try:
+        created, errors = Admin.bulk_import_sections(read_section_rows(upload.stream, upload.filename))
+        flash(f'Created {created} section(s)', 'success')
+        if errors:
+            details = '; '.join(f'{import_row_label(upload.filename, index)}: {message}'
+                                for index, message in errors[:5])
+            flash(f'Skipped {len(errors)} row(s): {details}', 'error')
+    except Exception as e:
+        flash(f'Error: {str(e)}', 'error')
+    
+    return redirect(url_for('term_setup'))
+
+@app.route('/admin/rollover_term', methods=['POST'])
+@require_auth('admin')
+def rollover_term():
+    try:
+        from_semester = request.form.get('from_semester', '').strip()
+        to_semester = request.form.get('to_semester', '').strip()
+        from_year = int(request.form.get('from_year', ''))
+        to_year = int(request.form.get('to_year', ''))
+        created, skipped = Admin.rollover_term(from_semester, from_year, to_semester, to_year)
+        flash(f'Copied {created} section(s) from {from_semester} {from_year} to {to_semester} {to_year}', 'success')
+        if skipped:
+            details = '; '.join(f'{section}: {reason}' for section, reason in skipped[:5])
+            flash(f'Skipped {len(skipped)} section(s): {details}', 'error')
+    except ValueError:
+        flash('Error: Years must be numbers', 'error')
+    except Exception as e:
+        flash(f'Error: {str(e)}', 'error')
+    
+    return redirect(url_for('term_setup'))
+
 @app.route('/admin/manage_courses')
+@read_only
 @require_auth('admin')
 def manage_courses():
     search = request.args.get('search', '')
     department = request.args.get('department', '')
     
-    courses = Admin.get_all_courses(search=search if search else None, 
-                                   department=department if department else None)
+    page = Admin.get_courses_page(search=search if search else None, 
+                                  department=department if department else None,
+                                  **page_args())
     departments = Utils.get_departments()
     
     return render_template('admin/manage_courses.html', 
-                          courses=courses, 
+                          courses=page['items'], 
+                          page=page,
+                          stats={**Admin.get_statistics(), **Admin.get_course_statistics()},
                           departments=departments,
                           search=search,
                           selected_department=department)
@@ -274,14 +595,43 @@ def delete_course(course_id):
     return redirect(url_for('manage_courses'))
 
 @app.route('/admin/manage_students')
+@read_only
 @require_auth('admin')
 def manage_students():
     search = request.args.get('search', '')
-    students = User.get_all_users('student', search if search else None)
-    return render_template('admin/manage_students.html', students=students, search=search)
+    page = User.get_users_page('student', search if search else None, **page_args())
+    return render_template('admin/manage_students.html', students=page['items'], page=page,
+                           stats={**Admin.get_statistics(), **Admin.get_student_statistics()},
+                           search=search)
+
+@app.route('/admin/export/students.csv')
+@require_auth('admin')
+def export_students():
+    header, rows = Export.student_directory()
+    return csv_response('students.csv', header, rows)
+
+@app.route('/admin/export/grades.csv')
+@require_auth('admin')
+def export_grades():
+    semester, year = Utils.get_current_semester()
+    semester = request.args.get('semester', semester)
+    year = request.args.get('year', year, type=int)
+    header, rows = Export.term_grades(semester, year)
+    return csv_response(f'grades_{semester}_{year}.csv', header, rows)
+
+@app.route('/admin/export/section/<section_id>/roster.csv')
+@require_auth('admin')
+def export_section_roster(section_id):
+    if not validate_uuid(section_id):
+        flash('Invalid section ID', 'error')
+        return redirect(url_for('admin_dashboard'))
+    
+    header, rows = Export.section_roster(section_id)
+    return csv_response(f'roster_{section_id}.csv', header, rows)
 
 # PROFESSOR ROUTES
 @app.route('/professor/dashboard')
+@read_only
 @require_auth('professor')
 def professor_dashboard():
     professor_info = Professor.get_by_user_id(session['user_id'])
@@ -328,6 +678,7 @@ def create_section():
                           current_year=current_year)
 
 @app.route('/professor/section/<section_id>')
+@read_only
 @require_auth('professor')
 def view_section(section_id):
     if not validate_uuid(section_id):
@@ -339,7 +690,9 @@ def view_section(section_id):
         with db.get_connection() as conn:
             with conn.cursor() as cursor:
                 cursor.execute('''
-                    SELECT cs.*, c.title, c.course_code, c.credits
+                    SELECT cs.*, c.title, c.course_code, c.credits,
+                           (SELECT COUNT(*) FROM waitlist_entries w
+                            WHERE w.section_id = cs.id AND w.status = 'waiting') AS waitlisted
                     FROM course_sections cs
                     JOIN courses c ON cs.course_id = c.id
                     WHERE cs.id = %s AND cs.professor_id = %s
@@ -362,6 +715,36 @@ def view_section(section_id):
         flash('Error loading section', 'error')
         return redirect(url_for('professor_dashboard'))
 
+@app.route('/professor/section/<section_id>/capacity', methods=['POST'])
+@require_auth('professor')
+def update_capacity(section_id):
+    if not validate_uuid(section_id):
+        return redirect(url_for('professor_dashboard'))
+    
+    try:
+        professor = Professor('', '', '', '', '', '', '')
+        professor.id = session['user_id']
+        promoted = professor.update_section_capacity(section_id, int(request.form.get('max_capacity', '')))
+        flash(f'Capacity updated; {promoted} waitlisted student(s) enrolled', 'success')
+    except ValueError:
+        flash('Capacity must be a number', 'error')
+    except Exception as e:
+        flash(f'Error: {str(e)}', 'error')
+    
+    return redirect(url_for('view_section', section_id=section_id))
+
+@app.route('/professor/section/<section_id>/roster.csv')
+@require_auth('professor')
+def export_roster(section_id):
+    professor = Professor('', '', '', '', '', '', '')
+    professor.id = session['user_id']
+    if not validate_uuid(section_id) or not professor.owns_section(section_id):
+        flash('Section not found', 'error')
+        return redirect(url_for('professor_dashboard'))
+    
+    header, rows = Export.section_roster(section_id)
+    return csv_response(f'roster_{section_id}.csv', header, rows)
+
 @app.route('/professor/submit_grades/<section_id>', methods=['POST'])
 @require_auth('professor')
 def submit_grades(section_id):
@@ -378,7 +761,7 @@ def submit_grades(section_id):
                 enrollment_id = key.replace('grade_', '')
                 grade = value.strip()
                 
-                if grade and grade in ['A', 'B', 'C', 'D', 'F']:
+                if grade and grade in VALID_GRADES:
                     student_grades[enrollment_id] = grade
         
         if student_grades:
@@ -390,6 +773,34 @@ def submit_grades(section_id):
     
     return redirect(url_for('view_section', section_id=section_id))
 
+@app.route('/professor/section/<section_id>/grades/import', methods=['POST'])
+@require_auth('professor')
+def import_grades(section_id):
+    if not validate_uuid(section_id):
+        return redirect(url_for('professor_dashboard'))
+    
+    upload = request.files.get('grades_file')
+    if not upload or not upload.filename:
+        flash('Choose a CSV file to import', 'error')
+        return redirect(url_for('view_section', section_id=section_id))
+    
+    try:
+        grades, errors = read_grade_csv(upload.stream)
+        if errors:
+            flash(f"Skipped {len(errors)} invalid row(s): {'; '.join(errors[:5])}", 'error')
+        
+        if grades:
+            professor = Professor('', '', '', '', '', '', '')
+            professor.id = session['user_id']
+            result, unknown = professor.import_grades(section_id, grades)
+            flash(f"Imported {len(grades)} grade(s), {result['updated']} changed", 'success')
+            if unknown:
+                flash(f"Not enrolled in this section: {', '.join(unknown[:10])}", 'error')
+    except Exception as e:
+        flash(f'Error: {str(e)}', 'error')
+    
+    return redirect(url_for('view_section', section_id=section_id))
+
 @app.route('/professor/section/<section_id>/announcement', methods=['GET', 'POST'])
 @require_auth('professor')
 def create_announcement(section_id):
@@ -415,6 +826,7 @@ def create_announcement(section_id):
     return render_template('professor/create_announcement.html', section_id=section_id)
 
 @app.route('/professor/profile')
+@read_only
 @require_auth('professor')
 def professor_profile():
     professor_info = Professor.get_by_user_id(session['user_id'])
@@ -431,6 +843,7 @@ def professor_profile():
 
 # STUDENT ROUTES
 @app.route('/student/dashboard')
+@read_only
 @require_auth('student')
 def student_dashboard():
     student_info = Student.get_by_user_id(session['user_id'])
@@ -442,31 +855,74 @@ def student_dashboard():
     student = Student('', '', '', '', '', '')
     student.id = session['user_id']
     current_classes = student.get_class_schedule(current_semester, current_year)
-    announcements = student.get_announcements()
+    feed = student.get_announcements()
     
     gpa = Utils.calculate_gpa(session['user_id'])
+    waitlists = Waitlist.get_student_entries(session['user_id'])
     
     return render_template('student/dashboard.html', 
                          student=student_info, 
                          current_classes=current_classes,
-                         announcements=announcements,
+                         announcements=feed['items'],
+                         announcements_next=feed['next'],
+                         waitlists=waitlists,
                          gpa=gpa)
 
+def announcement_json(announcement):
+    announcement = dict(announcement)
+    # Same date format as the server-rendered feed
+    announcement['posted'] = announcement['created_at'].strftime('%b %d')
+    announcement['created_at'] = announcement['created_at'].isoformat()
+    return announcement
+
+@app.route('/student/announcements')
+@read_only
+@require_auth('student')
+def announcement_feed():
+    student = Student('', '', '', '', '', '')
+    student.id = session['user_id']
+    feed = student.get_announcements(before=request.args.get('before'),
+                                     since=request.args.get('since'),
+                                     limit=page_size(request.args.get('per_page'), default=10))
+    feed['items'] = [announcement_json(item) for item in feed['items']]
+    return jsonify(feed)
+
+@app.route('/student/announcements/<announcement_id>')
+@read_only
+@require_auth('student')
+def view_announcement(announcement_id):
+    if not validate_uuid(announcement_id):
+        return jsonify({'error': 'Announcement not found'}), 404
+    
+    student = Student('', '', '', '', '', '')
+    student.id = session['user_id']
+    announcement = student.get_announcement(announcement_id)
+    if not announcement:
+        return jsonify({'error': 'Announcement not found'}), 404
+    return jsonify(announcement_json(announcement))
+
 @app.route('/student/courses')
+@read_only
 @require_auth('student')
 def browse_courses():
     search = request.args.get('search', '')
     department = request.args.get('department', '')
     
-    sections = Utils.get_available_sections(
+    page = Utils.get_available_sections_page(
         session['user_id'], 
         search if search else None,
-        department if department else None
+        department if department else None,
+        **page_args()
     )
     departments = Utils.get_departments()
+    waitlisted = {str(entry['section_id']): entry['position']
+                  for entry in Waitlist.get_student_entries(session['user_id'])
+                  if entry['status'] == 'waiting'}
     
     return render_template('student/browse_courses.html', 
-                          sections=sections, 
+                          sections=page['items'], 
+                          page=page,
+                          waitlisted=waitlisted,
                           departments=departments,
                           search=search,
                           selected_department=department)
@@ -478,6 +934,10 @@ def enroll_in_course(section_id):
         return redirect(url_for('browse_courses'))
     
     try:
+        if ENROLLMENT_MODE == 'queued':
+            request_id = EnrollmentQueue.submit(session['user_id'], section_id)
+            return redirect(url_for('enrollment_status', request_id=request_id))
+        
         student = Student('', '', '', '', '', '')
         student.id = session['user_id']
         student.enroll_in_section(section_id)
@@ -487,6 +947,61 @@ def enroll_in_course(section_id):
     
     return redirect(url_for('browse_courses'))
 
+@app.route('/student/waitlist/<section_id>')
+@require_auth('student')
+def join_waitlist(section_id):
+    if not validate_uuid(section_id):
+        return redirect(url_for('browse_courses'))
+    
+    try:
+        entry = Waitlist.join(session['user_id'], section_id)
+        if entry['status'] == 'waiting':
+            flash(f"Added to the waitlist (position {entry['position']}). "
+                  "You will be enrolled when a seat frees up.", 'success')
+        elif entry['status'] == 'enrolled':
+            flash('A seat was available, you are enrolled!', 'success')
+        else:
+            flash(f"Could not join waitlist: {entry['reason'] or 'entry was removed'}", 'error')
+    except Exception as e:
+        flash(f'Could not join waitlist: {str(e)}', 'error')
+    
+    return redirect(url_for('browse_courses'))
+
+@app.route('/student/waitlist/<section_id>/leave')
+@require_auth('student')
+def leave_waitlist(section_id):
+    if not validate_uuid(section_id):
+        return redirect(url_for('browse_courses'))
+    
+    try:
+        Waitlist.leave(session['user_id'], section_id)
+        flash('Removed from the waitlist', 'success')
+    except Exception as e:
+        flash(f'Error: {str(e)}', 'error')
+    
+    return redirect(request.referrer or url_for('browse_courses'))
+
+@app.route('/student/enroll/status/<request_id>')
+@read_only
+@require_auth('student')
+def enrollment_status(request_id):
+    if not validate_uuid(request_id):
+        return redirect(url_for('browse_courses'))
+    
+    enrollment_request = EnrollmentQueue.get_status(request_id, session['user_id'])
+    if not enrollment_request:
+        flash('Enrollment request not found', 'error')
+        return redirect(url_for('browse_courses'))
+    
+    if request.args.get('format') == 'json':
+        return jsonify({
+            'status': enrollment_request['status'],
+            'reason': enrollment_request['reason'],
+            'queue_position': enrollment_request['queue_position']
+        })
+    
+    return render_template('student/enrollment_status.html', enrollment_request=enrollment_request)
+
 @app.route('/student/drop/<section_id>')
 @require_auth('student')
 def drop_course(section_id):
@@ -504,6 +1019,7 @@ def drop_course(section_id):
     return redirect(url_for('browse_courses'))
 
 @app.route('/student/grades')
+@read_only
 @require_auth('student')
 def view_grades():
     student = Student('', '', '', '', '', '')
@@ -519,12 +1035,64 @@ def view_grades():
         grades_by_semester[key].append(grade)
     
     gpa = Utils.calculate_gpa(session['user_id'])
+    term_gpas = Utils.get_term_gpas(session['user_id'])
     
     return render_template('student/grades.html', 
                          grades_by_semester=grades_by_semester, 
-                         gpa=gpa)
+                         gpa=gpa,
+                         term_gpas=term_gpas)
+
+@app.route('/student/schedule-builder')
+@read_only
+@require_auth('student')
+def schedule_builder():
+    courses = request.args.get('courses', '')
+    codes = courses.replace(',', ' ').split()
+    schedules = []
+    error = None
+    
+    if codes:
+        student = Student('', '', '', '', '', '')
+        student.id = session['user_id']
+        try:
+            limit = int(request.args.get('limit', 10))
+        except ValueError:
+            limit = 10
+        try:
+            schedules = student.build_schedules(codes, limit)
+        except Exception as e:
+            error = str(e)
+    
+    if request.args.get('format') == 'json':
+        if error:
+            return jsonify({'error': error}), 400
+        return jsonify({'schedules': schedules})
+    
+    if error:
+        flash(error, 'error')
+    current_semester, current_year = Utils.get_current_semester()
+    return render_template('student/schedule_builder.html', courses=courses, schedules=schedules, error=error,
+                           current_semester=current_semester, current_year=current_year)
+
+@app.route('/student/schedule-builder/enroll', methods=['POST'])
+@require_auth('student')
+def enroll_schedule():
+    section_ids = [sid for sid in request.form.getlist('section_id') if validate_uuid(sid)]
+    if not section_ids:
+        return redirect(url_for('schedule_builder'))
+    
+    try:
+        student = Student('', '', '', '', '', '')
+        student.id = session['user_id']
+        student.enroll_in_sections(section_ids)
+        flash(f'Enrolled in {len(section_ids)} section(s)!', 'success')
+        return redirect(url_for('view_schedule'))
+    except Exception as e:
+        flash(f'Enrollment failed, nothing was changed: {str(e)}', 'error')
+        return redirect(url_for('schedule_builder', courses=request.form.get('courses', '')))
 
 @app.route('/student/schedule')
+@read_only
 @require_auth('student')
 def view_schedule():
     try:
@@ -535,25 +1103,21 @@ def view_schedule():
         schedule = student.get_class_schedule(current_semester, current_year)
         
         # Create weekly schedule view
-        schedule_by_day = {'Monday': [], 'Tuesday': [], 'Wednesday': [], 'Thursday': [], 'Friday': []}
-        day_mapping = {'M': 'Monday', 'T': 'Tuesday', 'W': 'Wednesday', 'R': 'Thursday', 'F': 'Friday'}
+        schedule_by_day = {day: [] for day in ['M', 'T', 'W', 'R', 'F']}
         
         for course in schedule:
-            if course['schedule'] and ' ' in course['schedule']:
-                days_part = course['schedule'].split(' ')[0]
-                time_part = course['schedule'].split(' ')[1] if len(course['schedule'].split(' ')) > 1 else ''
-                
-                for day_char in days_part:
-                    if day_char in day_mapping:
-                        day_name = day_mapping[day_char]
-                        schedule_by_day[day_name].append({
+            for meeting in course['meetings']:
+                for day in meeting_days(meeting['days']):
+                    if day in schedule_by_day:
+                        schedule_by_day[day].append({
                             'course': course,
-                            'time': time_part
+                            'start_minute': meeting['start_minute'],
+                            'time': f"{format_minutes(meeting['start_minute'])}-{format_minutes(meeting['end_minute'])}"
                         })
         
         # Sort by time for each day
         for day in schedule_by_day:
-            schedule_by_day[day].sort(key=lambda x: x['time'])
+            schedule_by_day[day].sort(key=lambda x: x['start_minute'])
         
         return render_template('student/schedule.html', 
                              schedule=schedule, 
@@ -565,13 +1129,27 @@ def view_schedule():
         return redirect(url_for('student_dashboard'))
 
 # PUBLIC ROUTES
+@app.route('/metrics')
+def metrics_endpoint():
+    # Statement shapes and timings are internal: disabled until METRICS_TOKEN is set, then
+    # scrapers must send 'Authorization: Bearer <token>'
+    token = os.getenv('METRICS_TOKEN')
+    if not token:
+        return Response('Not Found\n', status=404, mimetype='text/plain')
+    if not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return Response('Unauthorized\n', status=401, mimetype='text/plain')
+    return Response(metrics.registry.render(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/search/professors')
+@read_only
 def search_professors():
     search = request.args.get('search', '')
-    professors = User.get_all_users('professor', search if search else None)
-    return render_template('search_professors.html', professors=professors, search=search)
+    page = User.get_users_page('professor', search if search else None, **page_args())
+    return render_template('search_professors.html', professors=page['items'], page=page,
+                           stats=Admin.get_statistics(), search=search)
 
 @app.route('/professor/<professor_id>')
+@read_only
 def view_professor(professor_id):
     if not validate_uuid(professor_id):
         return redirect(url_for('search_professors'))
@@ -598,5 +1176,6 @@ def internal_error(error):
     return render_template('errors/500.html'), 500
 
 if __name__ == '__main__':
+    migrate()
     init_admin()
     app.run(debug=os.getenv('FLASK_DEBUG', 'False').lower() == 'true')
\ No newline at end of file
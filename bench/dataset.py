@@ -0,0 +1,286 @@
+"""Generate a large synthetic university for query benchmarks.
+
+Defaults model a large campus: 100k students, 2k professors, 10k sections
+spread over the last 8 terms, about 4 enrollments per student per term
+(several million rows, skewed toward popular sections, graded in past terms)
+and about 100 announcements per section. Rows are generated server-side with
+generate_series, so the run is bound by the database, not Python.
+
+    python -m bench.dataset                  # full size
+    python -m bench.dataset --scale 0.05     # quick local copy
+    python -m bench.dataset --drop           # remove generated data
+
+Every generated user shares the password 'password'. Generated users have
+'gen_' usernames and generated courses are marked in their description, so
+--drop removes exactly what was generated. Use a disposable database.
+"""
+import argparse
+import time
+
+from psycopg2.extras import execute_values
+
+from database import Database
+from migrations import migrate
+from models import Utils
+from passwords import hash_password
+from scheduling import parse_schedule, week_mask
+
+MARKER = 'Generated by bench.dataset'
+
+DEPARTMENTS = ['Computer Science', 'Business', 'Biology', 'Psychology', 'Mathematics', 'Engineering',
+               'Economics', 'English', 'History', 'Chemistry', 'Physics', 'Political Science',
+               'Sociology', 'Art', 'Music', 'Philosophy', 'Nursing', 'Education', 'Linguistics', 'Geology']
+FIRST_NAMES = ['James', 'Mary', 'Wei', 'Fatima', 'Carlos', 'Aisha', 'Liam', 'Olivia', 'Noah', 'Emma',
+               'Mohammed', 'Sofia', 'Hiroshi', 'Ana', 'Ivan', 'Priya', 'Kwame', 'Chloe', 'Mateo', 'Zara',
+               'Lucas', 'Amara', 'Ethan', 'Mia', 'Arjun', 'Leila', 'Daniel', 'Yuki', 'Omar', 'Grace']
+LAST_NAMES = ['Smith', 'Johnson', 'Li', 'Garcia', 'Khan', 'Nguyen', 'Brown', 'Martinez', 'Okafor', 'Kim',
+              'Rossi', 'Ivanova', 'Patel', 'Silva', 'Müller', 'Tanaka', 'Cohen', 'Hernandez', 'Ali', 'Wilson',
+              'Anderson', 'Lopez', 'Mensah', 'Dubois', 'Novak', 'Sato', 'Haddad', 'Walker', 'Reyes', 'Chen']
+POSITIONS = ['Assistant Professor', 'Assistant Professor', 'Associate Professor', 'Professor', 'Lecturer']
+SLOTS = ['MWF 8:00-8:50', 'MWF 9:00-9:50', 'MWF 10:00-10:50', 'MWF 11:00-11:50', 'MWF 13:00-13:50',
+         'MWF 14:00-14:50', 'TR 8:00-9:15', 'TR 9:30-10:45', 'TR 11:00-12:15', 'TR 13:00-14:15',
+         'TR 14:30-15:45', 'MW 16:00-17:15', 'TR 16:00-17:15', 'M 18:00-20:45', 'W 18:00-20:45',
+         'MW 10:00-10:50; F 10:00-11:50', 'TBA']
+
+def step(label, sql, params=None, fetch=False):
+    started = time.perf_counter()
+    db = Database()
+    with db.get_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(sql, params)
+            rows = cursor.fetchall() if fetch else None
+            count = cursor.rowcount
+            conn.commit()
+    print(f"  {label}: {count} rows in {time.perf_counter() - started:.1f}s")
+    return rows
+
+def generate(students, professors, sections, terms, per_term, announcements):
+    password_hash = hash_password('password')
+    names = {'first': FIRST_NAMES, 'last': LAST_NAMES, 'hash': password_hash}
+    term_list = Utils.recent_terms(terms)
+    current_semester, current_year = term_list[0]
+
+    step('users (students)', '''
+        INSERT INTO users (first_name, last_name, email, username, password_hash, user_type, created_at)
+        SELECT (%(first)s::text[])[1 + floor(random() * cardinality(%(first)s::text[]))::int],
+               (%(last)s::text[])[1 + floor(random() * cardinality(%(last)s::text[]))::int],
+               'gen.s' || i || '@example.edu', 'gen_s' || i, %(hash)s, 'student',
+               now() - random() * interval '4 years'
+        FROM generate_series(1, %(count)s) i
+    ''', dict(names, count=students))
+    step('students', '''
+        INSERT INTO students (user_id, student_id, major, year_level)
+        SELECT id, 'GEN' || substr(username, 6),
+               (%(departments)s::text[])[1 + floor(power(random(), 1.6) * cardinality(%(departments)s::text[]))::int],
+               1 + floor(random() * 4)::int
+        FROM users WHERE username LIKE 'gen\\_s%%'
+    ''', {'departments': DEPARTMENTS})
+
+    step('users (professors)', '''
+        INSERT INTO users (first_name, last_name, email, username, password_hash, user_type, created_at)
+        SELECT (%(first)s::text[])[1 + floor(random() * cardinality(%(first)s::text[]))::int],
+               (%(last)s::text[])[1 + floor(random() * cardinality(%(last)s::text[]))::int],
+               'gen.p' || i || '@example.edu', 'gen_p' || i, %(hash)s, 'professor',
+               now() - random() * interval '15 years'
+        FROM generate_series(1, %(count)s) i
+    ''', dict(names, count=professors))
+    professor_rows = step('professors', '''
+        INSERT INTO professors (user_id, employee_id, department, position, office_location)
+        SELECT id, 'GENP' || substr(username, 6),
+               (%(departments)s::text[])[1 + floor(power(random(), 1.6) * cardinality(%(departments)s::text[]))::int],
+               (%(positions)s::text[])[1 + floor(random() * cardinality(%(positions)s::text[]))::int],
+               'Hall ' || (1 + floor(random() * 30)::int) || '-' || (100 + floor(random() * 300)::int)
+        FROM users WHERE username LIKE 'gen\\_p%%'
+        RETURNING user_id
+    ''', {'departments': DEPARTMENTS, 'positions': POSITIONS}, fetch=True)
+    professor_ids = [str(row['user_id']) for row in professor_rows]
+
+    course_rows = step('courses', '''
+        INSERT INTO courses (course_code, title, description, credits, department, max_students)
+        SELECT 'G' || upper(left(replace(d, ' ', ''), 4)) || lpad(i::text, 5, '0'),
+               (ARRAY['Introduction to', 'Topics in', 'Advanced', 'Foundations of', 'Seminar in'])
+                   [1 + floor(random() * 5)::int] || ' ' || d || ' ' || i,
+               %(marker)s || '. ' || repeat('Course description text. ', 1 + floor(random() * 10)::int),
+               (ARRAY[3, 3, 3, 4, 4, 1, 2])[1 + floor(random() * 7)::int], d, 40
+        FROM (
+            SELECT i, (%(departments)s::text[])[1 + floor(power(random(), 1.6) * cardinality(%(departments)s::text[]))::int] AS d
+            FROM generate_series(1, %(count)s) i
+        ) picks
+        RETURNING id
+    ''', {'departments': DEPARTMENTS, 'marker': MARKER, 'count': max(1, sections // 4)}, fetch=True)
+    course_ids = [str(row['id']) for row in course_rows]
+
+    # Popular courses get more sections; row_number keeps section numbers unique per course and term
+    section_rows = step('course_sections', '''
+        WITH picks AS (
+            SELECT (%(course_ids)s::uuid[])[1 + floor(power(random(), 1.5) * cardinality(%(course_ids)s::uuid[]))::int] AS course_id,
+                   (%(professor_ids)s::uuid[])[1 + floor(random() * cardinality(%(professor_ids)s::uuid[]))::int] AS professor_id,
+                   1 + floor(random() * cardinality(%(semesters)s::text[]))::int AS term,
+                   (%(slots)s::text[])[1 + floor(random() * cardinality(%(slots)s::text[]))::int] AS schedule,
+                   (ARRAY[25, 30, 30, 40, 40, 60, 120, 250])[1 + floor(random() * 8)::int] AS capacity
+            FROM generate_series(1, %(count)s)
+        )
+        INSERT INTO course_sections (course_id, professor_id, section_number, semester, year,
+                                     schedule, room, max_capacity, status)
+        SELECT course_id, professor_id,
+               lpad((row_number() OVER (PARTITION BY course_id, term))::text, 3, '0'),
+               (%(semesters)s::text[])[term], (%(years)s::int[])[term], schedule,
+               'GEN-' || (100 + floor(random() * 400)::int), capacity,
+               CASE WHEN term = 1 THEN 'open' ELSE 'closed' END
+        FROM picks
+        RETURNING id, schedule, professor_id, room, semester, year
+    ''', {'course_ids': course_ids, 'professor_ids': professor_ids, 'slots': SLOTS, 'count': sections,
+          'semesters': [semester for semester, _ in term_list], 'years': [year for _, year in term_list]},
+        fetch=True)
+    section_ids = [str(row['id']) for row in section_rows]
+
+    # Rooms and professors cannot be double-booked; random picks that would be become TBA
+    started = time.perf_counter()
+    meetings = []
+    unscheduled = []
+    booked = {}
+    for row in section_rows:
+        section_meetings = parse_schedule(row['schedule'])
+        mask = week_mask(section_meetings)
+        term = (row['semester'], row['year'])
+        resources = [('professor', str(row['professor_id']), term), ('room', row['room'], term)]
+        if any(booked.get(resource, 0) & mask for resource in resources):
+            unscheduled.append((str(row['id']),))
+            continue
+        for resource in resources:
+            booked[resource] = booked.get(resource, 0) | mask
+        meetings.extend((str(row['id']), *meeting) for meeting in section_meetings)
+    db = Database()
+    with db.get_connection() as conn:
+        with conn.cursor() as cursor:
+            execute_values(cursor, '''
+                INSERT INTO section_meetings (section_id, days, start_minute, end_minute) VALUES %s
+            ''', meetings, page_size=5000)
+            if unscheduled:
+                execute_values(cursor, '''
+                    UPDATE course_sections cs SET schedule = 'TBA' FROM (VALUES %s) AS v(id) WHERE cs.id = v.id
+                ''', unscheduled, template='(%s::uuid)', page_size=5000)
+            conn.commit()
+    print(f"  section_meetings: {len(meetings)} rows ({len(unscheduled)} sections left TBA) "
+          f"in {time.perf_counter() - started:.1f}s")
+
+    # Most students take per_term sections each term, drawn with a skew toward popular sections
+    step('enrollments', '''
+        WITH term_sections AS (
+            SELECT id, semester, year,
+                   row_number() OVER (PARTITION BY semester, year ORDER BY random()) AS rank,
+                   COUNT(*) OVER (PARTITION BY semester, year) AS total
+            FROM course_sections WHERE id = ANY(%(section_ids)s::uuid[])
+        ),
+        terms AS (
+            SELECT DISTINCT semester, year, total FROM term_sections
+        ),
+        picks AS (
+            SELECT s.user_id AS student_id, t.semester, t.year,
+                   1 + floor(power(random(), 2) * t.total)::int AS rank
+            FROM students s
+            CROSS JOIN terms t
+            CROSS JOIN generate_series(1, %(per_term)s)
+            WHERE s.student_id LIKE 'GEN%%' AND random() < 0.85
+        )
+        INSERT INTO enrollments (student_id, section_id, enrollment_date, grade)
+        SELECT p.student_id, ts.id,
+               make_date(p.year, CASE p.semester WHEN 'Spring' THEN 1 WHEN 'Summer' THEN 5 ELSE 8 END, 15),
+               CASE WHEN p.semester = %(current_semester)s AND p.year = %(current_year)s THEN NULL
+                    ELSE (ARRAY['A', 'A', 'A', 'B', 'B', 'B', 'B', 'C', 'C', 'D', 'F'])[1 + floor(random() * 11)::int]
+               END
+        FROM picks p
+        JOIN term_sections ts ON ts.semester = p.semester AND ts.year = p.year AND ts.rank = p.rank
+        ON CONFLICT (student_id, section_id) DO NOTHING
+    ''', {'section_ids': section_ids, 'per_term': per_term,
+          'current_semester': current_semester, 'current_year': current_year})
+
+    step('seat counts', '''
+        UPDATE course_sections cs
+        SET current_enrollment = counts.enrolled,
+            max_capacity = GREATEST(cs.max_capacity, counts.enrolled)
+        FROM (
+            SELECT section_id, COUNT(*) AS enrolled FROM enrollments
+            WHERE section_id = ANY(%(section_ids)s::uuid[])
+            GROUP BY section_id
+        ) counts
+        WHERE cs.id = counts.section_id
+    ''', {'section_ids': section_ids})
+
+    step('announcements', '''
+        INSERT INTO announcements (section_id, title, content, created_at)
+        SELECT cs.id, 'Week ' || (1 + n %% 15) || ' update',
+               repeat('Announcement text for the class. ', 1 + floor(random() * 40)::int),
+               make_timestamp(cs.year, CASE cs.semester WHEN 'Spring' THEN 1 WHEN 'Summer' THEN 5 ELSE 8 END,
+                              15, 8, 0, 0) + random() * interval '110 days'
+        FROM (
+            SELECT id, semester, year, floor(random() * 2 * %(average)s)::int AS count
+            FROM course_sections WHERE id = ANY(%(section_ids)s::uuid[])
+        ) cs
+        CROSS JOIN LATERAL generate_series(1, cs.count) n
+    ''', {'section_ids': section_ids, 'average': announcements})
+
+    started = time.perf_counter()
+    Utils.rebuild_gpa()
+    print(f"  GPA aggregates rebuilt in {time.perf_counter() - started:.1f}s")
+
+def drop():
+    step('enrollment_requests', '''
+        DELETE FROM enrollment_requests WHERE student_id IN (
+            SELECT id FROM users WHERE username LIKE 'gen\\_%%'
+        )
+    ''')
+    step('enrollments', '''
+        DELETE FROM enrollments
+        WHERE student_id IN (SELECT id FROM users WHERE username LIKE 'gen\\_%%')
+           OR section_id IN (SELECT cs.id FROM course_sections cs JOIN courses c ON c.id = cs.course_id
+                             WHERE c.description LIKE %(marker)s)
+    ''', {'marker': MARKER + '%'})
+    step('announcements', '''
+        DELETE FROM announcements WHERE section_id IN (
+            SELECT cs.id FROM course_sections cs JOIN courses c ON c.id = cs.course_id
+            WHERE c.description LIKE %(marker)s
+        )
+    ''', {'marker': MARKER + '%'})
+    step('course_sections', '''
+        DELETE FROM course_sections WHERE course_id IN (SELECT id FROM courses WHERE description LIKE %(marker)s)
+    ''', {'marker': MARKER + '%'})
+    step('courses', 'DELETE FROM courses WHERE description LIKE %(marker)s', {'marker': MARKER + '%'})
+    step('users', "DELETE FROM users WHERE username LIKE 'gen\\_%%'")
+    Utils.rebuild_gpa()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scale', type=float, default=1.0, help='Multiply every count')
+    parser.add_argument('--students', type=int, default=100000)
+    parser.add_argument('--professors', type=int, default=2000)
+    parser.add_argument('--sections', type=int, default=10000)
+    parser.add_argument('--terms', type=int, default=8)
+    parser.add_argument('--enrollments-per-term', type=int, default=4)
+    parser.add_argument('--announcements-per-section', type=int, default=100)
+    parser.add_argument('--drop', action='store_true', help='Remove generated data and exit')
+    args = parser.parse_args()
+
+    migrate()
+    if args.drop:
+        print('Dropping generated data...')
+        drop()
+        return
+
+    db = Database()
+    with db.get_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM users WHERE username LIKE 'gen\\_%%' LIMIT 1")
+            if cursor.fetchone():
+                parser.error('Generated data already present; run with --drop first')
+
+    started = time.perf_counter()
+    print('Generating...')
+    generate(max(1, int(args.students * args.scale)), max(1, int(args.professors * args.scale)),
+             max(1, int(args.sections * args.scale)), args.terms, args.enrollments_per_term,
+             args.announcements_per_section)
+    step('analyze', 'ANALYZE')
+    print(f"Done in {time.perf_counter() - started:.1f}s")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+"""Compare direct and queued enrollment under concurrent load.
+
+Run against a disposable database. Enrollments made by the run are removed
+again afterwards unless --keep is given.
+
+    python -m bench.enrollment <section_id> --mode direct --students 500 --concurrency 32
+    python -m bench.enrollment <section_id> --mode queued --students 500 --concurrency 32
+
+Set DB_POOL_MAX at least as high as --concurrency to measure the database
+rather than the pool.
+"""
+import argparse
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from database import Database
+from models import Student, EnrollmentQueue
+
+def pick_students(section_id, count):
+    db = Database()
+    with db.get_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute('''
+                SELECT s.user_id FROM students s
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM enrollments e WHERE e.student_id = s.user_id AND e.section_id = %s
+                )
+                LIMIT %s
+            ''', (section_id, count))
+            return [str(row['user_id']) for row in cursor.fetchall()]
+
+def run_direct(section_id, student_ids, concurrency):
+    def enroll(student_id):
+        student = Student('', '', '', '', '', '')
+        student.id = student_id
+        try:
+            student.enroll_in_section(section_id)
+            return 'enrolled'
+        except Exception as e:
+            return str(e)
+    
+    with ThreadPoolExecutor(concurrency) as pool:
+        return list(pool.map(enroll, student_ids))
+
+def run_queued(section_id, student_ids, concurrency, batch_size):
+    with ThreadPoolExecutor(concurrency) as pool:
+        request_ids = list(pool.map(lambda sid: EnrollmentQueue.submit(sid, section_id), student_ids))
+    
+    while EnrollmentQueue.process_batch(batch_size):
+        pass
+    
+    db = Database()
+    with db.get_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute('''
+                SELECT COALESCE(reason, status) AS outcome FROM enrollment_requests
+                WHERE id = ANY(%s::uuid[])
+            ''', (request_ids,))
+            return [row['outcome'] for row in cursor.fetchall()]
+
+def check_section(section_id):
+    db = Database()
+    with db.get_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute('''
+                SELECT cs.current_enrollment, cs.max_capacity,
+                       (SELECT COUNT(*) FROM enrollments e WHERE e.section_id = cs.id) AS actual
+                FROM course_sections cs WHERE cs.id = %s
+            ''', (section_id,))
+            return dict(cursor.fetchone())
+
+def cleanup(section_id, student_ids):
+    db = Database()
+    with db.get_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute('''
+                DELETE FROM enrollments WHERE section_id = %s AND student_id = ANY(%s::uuid[])
+            ''', (section_id, student_ids))
+            cursor.execute('''
+                DELETE FROM enrollment_requests WHERE section_id = %s AND student_id = ANY(%s::uuid[])
+            ''', (section_id, student_ids))
+            cursor.execute('''
+                UPDATE course_sections
+                SET current_enrollment = (SELECT COUNT(*) FROM enrollments WHERE section_id = %s)
+                WHERE id = %s
+            ''', (section_id, section_id))
+            conn.commit()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('section_id')
+    parser.add_argument('--mode', choices=['direct', 'queued'], default='direct')
+    parser.add_argument('--students', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--keep', action='store_true', help='Keep the enrollments made by the run')
+    args = parser.parse_args()
+    
+    student_ids = pick_students(args.section_id, args.students)
+    if not student_ids:
+        parser.error('No eligible students found')
+    
+    started = time.perf_counter()
+    if args.mode == 'direct':
+        outcomes = run_direct(args.section_id, student_ids, args.concurrency)
+    else:
+        outcomes = run_queued(args.section_id, student_ids, args.concurrency, args.batch_size)
+    elapsed = time.perf_counter() - started
+    
+    section = check_section(args.section_id)
+    print(f"mode={args.mode} requests={len(student_ids)} concurrency={args.concurrency}")
+    print(f"elapsed={elapsed:.3f}s throughput={len(student_ids) / elapsed:.1f} req/s")
+    for outcome, count in Counter(outcomes).most_common():
+        print(f"  {outcome}: {count}")
+    consistent = section['current_enrollment'] == section['actual'] <= section['max_capacity']
+    print(f"seats {section['current_enrollment']}/{section['max_capacity']} "
+          f"(enrollment rows: {section['actual']}) {'OK' if consistent else 'INCONSISTENT'}")
+    
+    if not args.keep:
+        cleanup(args.section_id, student_ids)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,287 @@
+"""Replay a registration rush against the web app over HTTP.
+
+Seeds a throwaway cohort (a professor, a few small popular sections, regular
+sections and --students students), serves the app in-process on a local port
+(or targets a running server with --url) and runs, in order:
+
+    login   every student and the professor sign in at once
+    browse  students open, search and page through the course list
+    enroll  students race for the popular sections
+    grades  the professor submits grades for every seeded section
+
+Reports throughput and p50/p95/p99 latency per route, then checks that no
+section is oversubscribed, seat counts match enrollment rows and GPA
+aggregates match the grades. Seeded data is removed unless --keep is given.
+
+    python -m bench.loadtest --students 500 --concurrency 64
+    python -m bench.loadtest --url http://localhost:5000 --students 200
+
+Run against a disposable database with DB_POOL_MAX >= --concurrency.
+Seeding hashes one password per student with PASSWORD_HASH_METHOD.
+"""
+import argparse
+import math
+import random
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from database import Database
+from migrations import migrate
+from models import Admin, Professor, Utils, EnrollmentQueue
+
+PASSWORD = 'loadtest-password'
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    # Time each route on its own; a redirect is the response
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+class Client:
+    """One browser: its own cookie jar, results shared with the run"""
+
+    def __init__(self, base_url, results):
+        self.base_url = base_url
+        self.results = results
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(), _NoRedirect)
+
+    def request(self, label, path, data=None):
+        body = urllib.parse.urlencode(data).encode() if data is not None else None
+        started = time.perf_counter()
+        try:
+            with self.opener.open(self.base_url + path, body, timeout=120) as response:
+                response.read()
+                status = response.status
+        except urllib.error.HTTPError as e:
+            e.read()
+            status = e.code
+        except OSError:
+            status = 0
+        self.results.append((label, time.perf_counter() - started, status))
+        return status
+
+def seed(tag, students, popular, seats, regular):
+    rows = [{'first_name': 'Load', 'last_name': 'Professor', 'email': f'{tag}.prof@example.com',
+             'username': f'{tag}_prof', 'password': PASSWORD, 'user_type': 'professor',
+             'department': 'Load Test'}]
+    rows += [{'first_name': 'Load', 'last_name': f'Student{i:05d}', 'email': f'{tag}.s{i}@example.com',
+              'username': f'{tag}_s{i}', 'password': PASSWORD, 'user_type': 'student'}
+             for i in range(students)]
+    created, errors = Admin.bulk_register_users(rows)
+    if errors:
+        raise Exception(f"Seeding users failed: {errors[:3]}")
+
+    db = Database()
+    with db.get_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT id FROM users WHERE username = %s", (f'{tag}_prof',))
+            professor_id = str(cursor.fetchone()['id'])
+
+    admin = Admin('', '', '', '', '')
+    professor = Professor('', '', '', '', '', '', '')
+    professor.id = professor_id
+    semester, year = Utils.get_current_semester()
+    days = ['M', 'T', 'W', 'R', 'F']
+
+    popular_ids, regular_ids = [], []
+    for index in range(popular + regular):
+        code = f'{tag[:10]}-{index:03d}'.upper()
+        course_id = admin.create_course(code, f'Load Test Course {index}', 'Seeded by bench.loadtest', 3,
+                                        'Load Test', seats)
+        # Distinct meeting slots so students can hold every popular section at once; the run's
+        # one professor has only 60 of them, so further sections meet TBA (never booked)
+        if index < 60:
+            schedule = f'{days[index % 5]} {8 + index // 5}:00-{8 + index // 5}:50'
+        else:
+            schedule = 'TBA'
+        capacity = seats if index < popular else max(seats, students)
+        # A room of the run's own, so leftovers of an earlier run (--keep, a crash) can't clash
+        section_id = professor.create_course_section(course_id, '001', semester, year, schedule,
+                                                     f'{tag}-room'.upper(), capacity)
+        (popular_ids if index < popular else regular_ids).append(section_id)
+
+    return professor_id, popular_ids, regular_ids
+
+def run_phase(name, tasks, concurrency):
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        list(pool.map(lambda task: task(), tasks))
+    elapsed = time.perf_counter() - started
+    print(f"{name}: {len(tasks)} users in {elapsed:.1f}s")
+
+def percentile(sorted_values, fraction):
+    # Nearest-rank percentile
+    index = max(0, math.ceil(fraction * len(sorted_values)) - 1)
+    return sorted_values[index]
+
+def report(results, elapsed):
+    by_route = defaultdict(list)
+    errors = defaultdict(int)
+    for label, seconds, status in results:
+        by_route[label].append(seconds)
+        if status == 0 or status >= 500:
+            errors[label] += 1
+
+    print(f"\n{'route':<36} {'requests':>8} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>6}")
+    for label, timings in sorted(by_route.items()):
+        timings.sort()
+        print(f"{label:<36} {len(timings):>8} {len(timings) / elapsed:>8.1f} "
+              f"{percentile(timings, 0.50) * 1000:>8.1f} {percentile(timings, 0.95) * 1000:>8.1f} "
+              f"{percentile(timings, 0.99) * 1000:>8.1f} {errors[label]:>6}")
+    return sum(errors.values())
+
+def check_consistency(section_ids, student_ids):
+    db = Database()
+    with db.get_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute('''
+                SELECT cs.id, cs.current_enrollment, cs.max_capacity,
+                       (SELECT COUNT(*) FROM enrollments e WHERE e.section_id = cs.id) AS actual
+                FROM course_sections cs WHERE cs.id = ANY(%s::uuid[])
+            ''', (section_ids,))
+            sections = cursor.fetchall()
+
+            cursor.execute('''
+                WITH expected AS (
+                    SELECT e.student_id, SUM(gp.points * c.credits) AS quality_points,
+                           SUM(c.credits) AS graded_credits
+                    FROM enrollments e
+                    JOIN grade_points gp ON gp.grade = e.grade
+                    JOIN course_sections cs ON e.section_id = cs.id
+                    JOIN courses c ON cs.course_id = c.id
+                    WHERE e.student_id = ANY(%s::uuid[])
+                    GROUP BY e.student_id
+                )
+                SELECT COUNT(*) AS mismatched
+                FROM expected x
+                FULL JOIN (SELECT * FROM student_gpa WHERE student_id = ANY(%s::uuid[]) AND graded_credits <> 0) g
+                       ON g.student_id = x.student_id
+                WHERE x.quality_points IS DISTINCT FROM g.quality_points
+                   OR x.graded_credits IS DISTINCT FROM g.graded_credits
+            ''', (student_ids, student_ids))
+            gpa_mismatches = cursor.fetchone()['mismatched']
+
+    problems = 0
+    for section in sections:
+        if section['current_enrollment'] != section['actual']:
+            problems += 1
+            print(f"INCONSISTENT section {section['id']}: counter {section['current_enrollment']}, "
+                  f"rows {section['actual']}")
+        if section['actual'] > section['max_capacity']:
+            problems += 1
+            print(f"OVERSUBSCRIBED section {section['id']}: {section['actual']}/{section['max_capacity']}")
+    if gpa_mismatches:
+        problems += 1
+        print(f"INCONSISTENT GPA aggregates for {gpa_mismatches} student(s)")
+    return problems
+
+def cleanup(tag, professor_id, section_ids):
+    db = Database()
+    with db.get_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT id FROM users WHERE username LIKE %s", (f'{tag}\\_%',))
+            user_ids = [str(row['id']) for row in cursor.fetchall()]
+            cursor.execute('DELETE FROM enrollment_requests WHERE student_id = ANY(%s::uuid[])', (user_ids,))
+            cursor.execute('DELETE FROM enrollments WHERE section_id = ANY(%s::uuid[]) OR student_id = ANY(%s::uuid[])',
+                           (section_ids, user_ids))
+            cursor.execute('DELETE FROM announcements WHERE section_id = ANY(%s::uuid[])', (section_ids,))
+            cursor.execute('DELETE FROM course_sections WHERE professor_id = %s RETURNING course_id', (professor_id,))
+            course_ids = [str(row['course_id']) for row in cursor.fetchall()]
+            cursor.execute('DELETE FROM courses WHERE id = ANY(%s::uuid[])', (course_ids,))
+            cursor.execute('DELETE FROM users WHERE id = ANY(%s::uuid[])', (user_ids,))
+            conn.commit()
+
+def serve_locally():
+    from werkzeug.serving import make_server
+    from app import app
+
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_port}'
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', help='Target a running server instead of serving the app in-process')
+    parser.add_argument('--students', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--popular', type=int, default=3, help='Popular sections every student tries to join')
+    parser.add_argument('--seats', type=int, default=30, help='Seats per popular section')
+    parser.add_argument('--regular', type=int, default=5, help='Sections with room for everyone')
+    parser.add_argument('--keep', action='store_true', help='Keep the seeded data')
+    args = parser.parse_args()
+
+    migrate()
+    tag = f'lt{uuid.uuid4().hex[:8]}'
+    print(f"Seeding {args.students} students ({tag})...")
+    professor_id, popular_ids, regular_ids = seed(tag, args.students, args.popular, args.seats, args.regular)
+    section_ids = popular_ids + regular_ids
+
+    server = None
+    base_url = args.url.rstrip('/') if args.url else None
+    if base_url is None:
+        server, base_url = serve_locally()
+
+    results = []
+    students = [Client(base_url, results) for _ in range(args.students)]
+    professor = Client(base_url, results)
+    started = time.perf_counter()
+    try:
+        run_phase('login', [
+            (lambda client=client, i=i: client.request('POST /login', '/login',
+                                                       {'username': f'{tag}_s{i}', 'password': PASSWORD}))
+            for i, client in enumerate(students)
+        ] + [lambda: professor.request('POST /login', '/login',
+                                       {'username': f'{tag}_prof', 'password': PASSWORD})],
+            args.concurrency)
+
+        def browse(client):
+            client.request('GET /student/courses', '/student/courses')
+            client.request('GET /student/courses?search', '/student/courses?search=load+test')
+            client.request('GET /student/courses?per_page', '/student/courses?per_page=10')
+        run_phase('browse', [lambda client=client: browse(client) for client in students], args.concurrency)
+
+        def enroll(client):
+            # Everyone rushes the popular sections, then takes one regular section
+            targets = random.sample(popular_ids, len(popular_ids)) + random.sample(regular_ids, min(1, len(regular_ids)))
+            for section_id in targets:
+                client.request('GET /student/enroll/<id>', f'/student/enroll/{section_id}')
+        run_phase('enroll', [lambda client=client: enroll(client) for client in students], args.concurrency)
+
+        # Queued mode: drain the queue so the checks see the final state
+        while EnrollmentQueue.process_batch(500):
+            pass
+
+        grader = Professor('', '', '', '', '', '', '')
+        grader.id = professor_id
+
+        def grade(section_id):
+            enrolled = grader.get_section_students(section_id)
+            form = {f"grade_{row['enrollment_id']}": random.choice('ABCDF') for row in enrolled}
+            professor.request('POST /professor/submit_grades/<id>', f'/professor/submit_grades/{section_id}', form)
+        run_phase('grades', [lambda section_id=section_id: grade(section_id) for section_id in section_ids],
+                  min(args.concurrency, len(section_ids)))
+
+        elapsed = time.perf_counter() - started
+        errors = report(results, elapsed)
+
+        db = Database()
+        with db.get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT id FROM users WHERE username LIKE %s", (f'{tag}\\_s%',))
+                student_ids = [str(row['id']) for row in cursor.fetchall()]
+        problems = check_consistency(section_ids, student_ids)
+        print(f"\n{len(results)} requests in {elapsed:.1f}s, {errors} server errors, "
+              f"consistency {'OK' if not problems else f'FAILED ({problems} problems)'}")
+    finally:
+        if server is not None:
+            server.shutdown()
+        if not args.keep:
+            cleanup(tag, professor_id, section_ids)
+
+if __name__ == '__main__':
+    main()
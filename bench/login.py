@@ -0,0 +1,64 @@
+"""Measure login throughput (logins/sec and logins/sec per core).
+
+Without --username only password verification is timed, using a hash made
+with the current PASSWORD_HASH_METHOD. With --username/--password the full
+User.authenticate path runs against the configured database.
+
+    python -m bench.login --threads 8 --seconds 10
+    python -m bench.login --username alice --password secret --threads 32
+"""
+import argparse
+import os
+import threading
+import time
+
+from passwords import hash_password, verify_password
+
+def run(login, threads, seconds):
+    counts = [0] * threads
+    failures = [0] * threads
+    deadline = time.perf_counter() + seconds
+    
+    def worker(slot):
+        while time.perf_counter() < deadline:
+            try:
+                if login():
+                    counts[slot] += 1
+                else:
+                    failures[slot] += 1
+            except Exception:
+                failures[slot] += 1
+    
+    workers = [threading.Thread(target=worker, args=(slot,)) for slot in range(threads)]
+    started = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return sum(counts), sum(failures), time.perf_counter() - started
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--threads', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--username')
+    parser.add_argument('--password', default='password')
+    args = parser.parse_args()
+    
+    if args.username:
+        from models import User
+        login = lambda: User.authenticate(args.username, args.password)
+        label = 'User.authenticate'
+    else:
+        stored = hash_password(args.password)
+        login = lambda: verify_password(stored, args.password)[0]
+        label = 'verify_password'
+    
+    ok, failed, elapsed = run(login, args.threads, args.seconds)
+    cores = os.cpu_count() or 1
+    print(f"{label}: method={os.getenv('PASSWORD_HASH_METHOD', 'pbkdf2')} threads={args.threads}")
+    print(f"{ok} logins, {failed} failed/rejected in {elapsed:.1f}s")
+    print(f"{ok / elapsed:.1f} logins/sec, {ok / elapsed / cores:.1f} logins/sec per core ({cores} cores)")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,391 @@
+"""Time every public model method and flag sequential scans in its plans.
+
+Meant to run against data from bench.dataset. Each call runs in its own
+request session that is rolled back, so write methods leave nothing behind.
+After timing, the method runs once more with its SQL captured and every
+statement is re-run under EXPLAIN (ANALYZE, BUFFERS) inside a savepoint.
+Sequential scans reading more than --seq-scan-rows rows are flagged.
+
+    python -m bench.queries
+    python -m bench.queries --repeat 20 --only Student --output baseline.json
+    python -m bench.queries --compare baseline.json
+
+The reference cache is cleared before every call so database time is measured.
+"""
+import argparse
+import inspect
+import json
+import statistics
+import time
+
+from bench.loadtest import percentile
+from cache import reference_cache
+from database import Database, Session, bind_session, unbind_session
+from metrics import capture_queries
+from models import Admin, Professor, Search, Student, User, Utils, Waitlist
+from pagination import encode_cursor
+
+CLASSES = [User, Student, Professor, Waitlist, Admin, Search, Utils]
+
+# Public methods deliberately left out, with the benchmark that covers them instead
+EXCLUDED = {
+    'Admin.bulk_register_users': 'hashes passwords in a process pool before it starts a transaction; see bench.loadtest',
+    'Utils.rebuild_gpa': 'full maintenance rebuild, timed by bench.dataset',
+}
+
+EXPLAINABLE = ('SELECT', 'WITH', 'INSERT', 'UPDATE', 'DELETE')
+
+def pick_samples():
+    """Ids the cases run against, favouring the busiest rows"""
+    semester, year = Utils.get_current_semester()
+    db = Database()
+    with db.get_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute('''
+                SELECT cs.id AS section_id, cs.course_id, cs.professor_id
+                FROM course_sections cs
+                WHERE cs.semester = %s AND cs.year = %s AND cs.professor_id IS NOT NULL
+                ORDER BY cs.current_enrollment DESC LIMIT 1
+            ''', (semester, year))
+            section = cursor.fetchone()
+            if section is None:
+                raise Exception("No sections this term; generate data with python -m bench.dataset")
+
+            cursor.execute('''
+                SELECT e.student_id, u.username FROM enrollments e
+                JOIN users u ON u.id = e.student_id
+                WHERE e.section_id = %s ORDER BY e.enrollment_date, e.id LIMIT 1
+            ''', (section['section_id'],))
+            student = cursor.fetchone()
+
+            cursor.execute('''
+                SELECT cs.id FROM course_sections cs
+                WHERE cs.semester = %s AND cs.year = %s AND cs.status = 'open'
+                  AND cs.current_enrollment < cs.max_capacity
+                  AND NOT EXISTS (SELECT 1 FROM enrollments e
+                                  WHERE e.section_id = cs.id AND e.student_id = %s)
+                LIMIT 1
+            ''', (semester, year, student['student_id']))
+            open_section = cursor.fetchone()
+
+            cursor.execute('''
+                SELECT a.id FROM announcements a
+                WHERE a.section_id = %s ORDER BY a.created_at DESC LIMIT 1
+            ''', (section['section_id'],))
+            announcement = cursor.fetchone()
+
+            cursor.execute('''
+                SELECT department FROM courses WHERE department IS NOT NULL
+                GROUP BY department ORDER BY COUNT(*) DESC LIMIT 1
+            ''')
+            department = cursor.fetchone()
+
+            cursor.execute('SELECT last_name FROM users WHERE user_type = %s LIMIT 1', ('student',))
+            last_name = cursor.fetchone()
+
+            # The courses with the most open sections make the widest schedule search
+            cursor.execute('''
+                SELECT c.course_code FROM course_sections cs JOIN courses c ON cs.course_id = c.id
+                WHERE cs.semester = %s AND cs.year = %s AND cs.status = 'open'
+                  AND cs.current_enrollment < cs.max_capacity
+                  AND NOT EXISTS (SELECT 1 FROM enrollments e JOIN course_sections es ON e.section_id = es.id
+                                  WHERE e.student_id = %s AND es.course_id = c.id
+                                    AND es.semester = cs.semester AND es.year = cs.year)
+                GROUP BY c.course_code ORDER BY COUNT(*) DESC LIMIT 4
+            ''', (semester, year, student['student_id']))
+            course_codes = [row['course_code'] for row in cursor.fetchall()]
+
+    return {
+        'semester': semester,
+        'year': year,
+        'section_id': str(section['section_id']),
+        'course_id': str(section['course_id']),
+        'professor_id': str(section['professor_id']),
+        'student_id': str(student['student_id']),
+        'username': student['username'],
+        'open_section_id': str(open_section['id']) if open_section else str(section['section_id']),
+        'announcement_id': str(announcement['id']) if announcement else None,
+        'department': department['department'] if department else None,
+        'name': last_name['last_name'].lower() if last_name else 'smith',
+        'course_codes': course_codes,
+    }
+
+def as_user(cls, user_id):
+    user = cls.__new__(cls)
+    user.id = user_id
+    return user
+
+def build_cases(s):
+    """(name, setup, call) triples; setup runs untimed in the same session and returns call's arguments"""
+    student = as_user(Student, s['student_id'])
+    professor = as_user(Professor, s['professor_id'])
+    admin = as_user(Admin, s['professor_id'])
+    stamp = str(time.time_ns())
+
+    def new_course():
+        admin.create_course('BENCH' + stamp[-5:], 'Benchmark course', '', 3, s['department'])
+        db = Database()
+        with db.get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute('SELECT id FROM courses WHERE course_code = %s', ('BENCH' + stamp[-5:],))
+                return (str(cursor.fetchone()['id']),)
+
+    def next_term_rows():
+        """The sample term's sections as import rows for the following year"""
+        db = Database()
+        with db.get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute('''
+                    SELECT c.course_code, cs.section_number, cs.schedule, cs.room, cs.max_capacity, u.username
+                    FROM course_sections cs
+                    JOIN courses c ON cs.course_id = c.id
+                    JOIN users u ON cs.professor_id = u.id
+                    WHERE cs.semester = %s AND cs.year = %s
+                ''', (s['semester'], s['year']))
+                rows = [{'course_code': row['course_code'], 'section_number': row['section_number'],
+                         'semester': s['semester'], 'year': s['year'] + 1, 'schedule': row['schedule'],
+                         'room': row['room'], 'max_capacity': row['max_capacity'], 'professor': row['username']}
+                        for row in cursor.fetchall()]
+                return (rows,)
+
+    def waitlisted():
+        db = Database()
+        with db.get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute('INSERT INTO waitlist_entries (student_id, section_id) VALUES (%s, %s)',
+                               (s['student_id'], s['open_section_id']))
+        return ()
+
+    def roster():
+        students = professor.get_section_students(s['section_id'])
+        grades = {row['enrollment_id']: 'A' for row in students[:50]}
+        numbers = {row['student_id']: 'B' for row in students[:50]}
+        return grades, numbers
+
+    return [
+        ('User.save', None, lambda: User('Bench', 'User', f'bench{stamp}@example.edu', f'bench_u{stamp}',
+                                         'password', 'student').save()),
+        ('User.authenticate', None, lambda: User.authenticate(s['username'], 'password')),
+        ('User.get_login', None, lambda: User.get_login(s['username'])),
+        ('User.check_login', lambda: (User.get_login(s['username']),),
+         lambda login: User.check_login(login, 'password')),
+        ('User.get_by_id', None, lambda: User.get_by_id(s['student_id'])),
+        ('User.get_users_page', None, lambda: User.get_users_page('student')),
+        ('User.get_users_page[search]', None, lambda: User.get_users_page('student', s['name'])),
+        ('User.get_all_users', None, lambda: User.get_all_users('professor')),
+        ('User.update_profile', None, lambda: as_user(User, s['student_id']).update_profile(
+            'Bench', 'User', f'bench{stamp}@example.edu')),
+        ('Student.save', None, lambda: Student('Bench', 'Student', f'bench{stamp}s@example.edu',
+                                               f'bench_s{stamp}', 'password', s['department']).save()),
+        ('Student.get_by_user_id', None, lambda: Student.get_by_user_id(s['student_id'])),
+        ('Student.enroll_in_section', None, lambda: student.enroll_in_section(s['open_section_id'])),
+        ('Student.enroll_in_sections', None, lambda: student.enroll_in_sections([s['open_section_id']])),
+        ('Student.build_schedules', None, lambda: student.build_schedules(s['course_codes'])),
+        ('Student.has_time_conflict', None, lambda: student.has_time_conflict(s['open_section_id'])),
+        ('Student.drop_course', None, lambda: student.drop_course(s['section_id'])),
+        ('Student.get_class_schedule', None, lambda: student.get_class_schedule(s['semester'], s['year'])),
+        ('Student.get_all_grades', None, lambda: student.get_all_grades()),
+        ('Student.get_announcements', None, lambda: student.get_announcements()),
+        ('Student.get_announcement', None, lambda: student.get_announcement(s['announcement_id'])),
+        ('Professor.save', None, lambda: Professor('Bench', 'Professor', f'bench{stamp}p@example.edu',
+                                                   f'bench_p{stamp}', 'password', s['department']).save()),
+        ('Professor.get_by_user_id', None, lambda: Professor.get_by_user_id(s['professor_id'])),
+        ('Professor.create_course_section', None, lambda: professor.create_course_section(
+            s['course_id'], 'B' + stamp[-2:], s['semester'], s['year'], 'U 6:00-6:50', 'BENCH-ROOM')),
+        ('Admin.get_booking_conflicts', None, lambda: Admin.get_booking_conflicts(s['semester'], s['year'])),
+        ('Admin.bulk_import_sections', next_term_rows, lambda rows: Admin.bulk_import_sections(rows)),
+        ('Admin.rollover_term', None, lambda: Admin.rollover_term(s['semester'], s['year'],
+                                                                  s['semester'], s['year'] + 1)),
+        ('Professor.update_section_capacity', None, lambda: professor.update_section_capacity(s['section_id'], 500)),
+        ('Waitlist.join', None, lambda: Waitlist.join(s['student_id'], s['open_section_id'])),
+        ('Waitlist.leave', waitlisted, lambda: Waitlist.leave(s['student_id'], s['open_section_id'])),
+        ('Waitlist.position', None, lambda: Waitlist.position(s['student_id'], s['open_section_id'])),
+        ('Waitlist.get_student_entries', None, lambda: Waitlist.get_student_entries(s['student_id'])),
+        ('Waitlist.promote', None, Waitlist.promote),
+        ('Professor.get_teaching_sections', None, lambda: professor.get_teaching_sections()),
+        ('Professor.owns_section', None, lambda: professor.owns_section(s['section_id'])),
+        ('Professor.get_section_students', None, lambda: professor.get_section_students(s['section_id'])),
+        ('Professor.submit_grades', roster, lambda grades, numbers: professor.submit_grades(s['section_id'], grades)),
+        ('Professor.import_grades', roster, lambda grades, numbers: professor.import_grades(s['section_id'], numbers)),
+        ('Professor.create_announcement', None, lambda: professor.create_announcement(
+            s['section_id'], 'Benchmark', 'Benchmark announcement')),
+        ('Admin.save', None, lambda: Admin('Bench', 'Admin', f'bench{stamp}a@example.edu',
+                                           f'bench_a{stamp}', 'password').save()),
+        ('Admin.get_statistics', None, Admin.get_statistics),
+        ('Admin.get_student_statistics', None, Admin.get_student_statistics),
+        ('Admin.get_course_statistics', None, Admin.get_course_statistics),
+        ('Admin.get_term_statistics', None, lambda: Admin.get_term_statistics(s['semester'], s['year'])),
+        ('Admin.create_course', None, lambda: admin.create_course(
+            'BENCH' + stamp[-5:], 'Benchmark course', '', 3, s['department'])),
+        ('Admin.update_course', None, lambda: admin.update_course(
+            s['course_id'], 'BENCH' + stamp[-5:], 'Benchmark course', '', 4, s['department'])),
+        ('Admin.delete_course', new_course, lambda course_id: admin.delete_course(course_id)),
+        ('Admin.get_courses_page', None, lambda: Admin.get_courses_page(department=s['department'])),
+        ('Admin.get_all_courses', None, lambda: Admin.get_all_courses()),
+        ('Admin.get_all_courses[search]', None, lambda: Admin.get_all_courses('intro')),
+        ('Admin.get_course_by_id', None, lambda: Admin.get_course_by_id(s['course_id'])),
+        ('Search.match_params', None, lambda: Search.match_params(s['name'])),
+        ('Search.page', None, lambda: Search.page(lambda limit, offset: Search.users(s['name'], None, limit, offset),
+                                                  encode_cursor([50]))),
+        ('Search.users', None, lambda: Search.users(s['name'])),
+        ('Search.courses', None, lambda: Search.courses('intro')),
+        ('Utils.calculate_gpa', None, lambda: Utils.calculate_gpa(s['student_id'])),
+        ('Utils.get_term_gpas', None, lambda: Utils.get_term_gpas(s['student_id'])),
+        ('Utils.get_current_semester', None, Utils.get_current_semester),
+        ('Utils.recent_terms', None, lambda: Utils.recent_terms(3)),
+        ('Utils.get_available_sections', None, lambda: Utils.get_available_sections(s['student_id'])),
+        ('Utils.get_available_sections[search]', None, lambda: Utils.get_available_sections(
+            s['student_id'], 'intro')),
+        ('Utils.get_available_sections_page', None, lambda: Utils.get_available_sections_page(
+            s['student_id'], department=s['department'])),
+        ('Utils.get_departments', None, Utils.get_departments),
+    ]
+
+def uncovered(cases):
+    covered = {name.split('[')[0] for name, _, _ in cases} | set(EXCLUDED)
+    missing = []
+    for cls in CLASSES:
+        for name, member in vars(cls).items():
+            if name.startswith('_') or not callable(getattr(cls, name)):
+                continue
+            if inspect.isclass(member):
+                continue
+            if f'{cls.__name__}.{name}' not in covered:
+                missing.append(f'{cls.__name__}.{name}')
+    return missing
+
+def run_once(setup, call, capture=False):
+    """Seconds taken by call, and the session and captured SQL (the session is left open when capturing)"""
+    reference_cache.invalidate()
+    session = Session()
+    bind_session(session)
+    try:
+        args = setup() if setup else ()
+        with capture_queries() as queries:
+            started = time.perf_counter()
+            call(*args)
+            elapsed = time.perf_counter() - started
+    except Exception:
+        session.close(commit=False)
+        raise
+    finally:
+        unbind_session()
+
+    if capture:
+        return elapsed, session, queries
+    session.close(commit=False)
+    return elapsed, None, queries
+
+def seq_scans(plan, threshold):
+    """Sequential scan nodes in a JSON plan that read at least threshold rows"""
+    found = []
+    if plan.get('Node Type') == 'Seq Scan':
+        scanned = (plan.get('Actual Rows', 0) + plan.get('Rows Removed by Filter', 0)) * plan.get('Actual Loops', 1)
+        if scanned >= threshold:
+            found.append({'relation': plan.get('Relation Name'), 'rows': scanned, 'filter': plan.get('Filter')})
+    for child in plan.get('Plans', []):
+        found.extend(seq_scans(child, threshold))
+    return found
+
+def explain(session, queries, threshold):
+    """EXPLAIN ANALYZE each captured statement in a savepoint; returns (plans, flagged seq scans)"""
+    plans = []
+    flagged = []
+    conn = session.connection()
+    with conn.cursor() as cursor:
+        for sql in queries:
+            if isinstance(sql, bytes):
+                sql = sql.decode('utf-8', 'replace')
+            if not sql.lstrip().upper().startswith(EXPLAINABLE):
+                continue
+            cursor.execute('SAVEPOINT bench_explain')
+            try:
+                cursor.execute('EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) ' + sql)
+                plan = cursor.fetchone()['QUERY PLAN'][0]
+            except Exception as e:
+                plan = {'error': str(e).strip()}
+            cursor.execute('ROLLBACK TO SAVEPOINT bench_explain')
+
+            scans = seq_scans(plan.get('Plan', {}), threshold)
+            flagged.extend(dict(scan, sql=' '.join(sql.split())[:160]) for scan in scans)
+            plans.append({'sql': sql, 'plan': plan})
+    return plans, flagged
+
+def bench(name, setup, call, repeat, warmup, threshold):
+    for _ in range(warmup):
+        run_once(setup, call)
+    timings = sorted(run_once(setup, call)[0] for _ in range(repeat))
+
+    _, session, queries = run_once(setup, call, capture=True)
+    try:
+        plans, flagged = explain(session, queries, threshold)
+    finally:
+        session.close(commit=False)
+
+    return {
+        'method': name,
+        'mean_ms': statistics.mean(timings) * 1000,
+        'p50_ms': percentile(timings, 0.50) * 1000,
+        'p95_ms': percentile(timings, 0.95) * 1000,
+        'queries': len(queries),
+        'seq_scans': flagged,
+        'plans': plans,
+    }
+
+def report(results, baseline=None):
+    print(f"{'method':<40} {'mean ms':>9} {'p50 ms':>9} {'p95 ms':>9} {'queries':>8} {'seq':>4}  change")
+    for result in results:
+        change = ''
+        previous = (baseline or {}).get(result['method'])
+        if previous and previous['p50_ms']:
+            change = f"{(result['p50_ms'] / previous['p50_ms'] - 1) * 100:+.0f}%"
+        if 'error' in result:
+            print(f"{result['method']:<40} error: {result['error']}")
+            continue
+        print(f"{result['method']:<40} {result['mean_ms']:9.2f} {result['p50_ms']:9.2f} {result['p95_ms']:9.2f} "
+              f"{result['queries']:8d} {len(result['seq_scans']):4d}  {change}")
+
+    flagged = [(result['method'], scan) for result in results for scan in result.get('seq_scans', [])]
+    if flagged:
+        print('\nSequential scans:')
+        for method, scan in flagged:
+            print(f"  {method}: {scan['relation']} ({scan['rows']:.0f} rows) in {scan['sql']}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--warmup', type=int, default=2)
+    parser.add_argument('--only', help='Run methods whose name starts with this, e.g. Student or Utils.get_')
+    parser.add_argument('--seq-scan-rows', type=int, default=10000,
+                        help='Flag sequential scans reading at least this many rows')
+    parser.add_argument('--output', help='Write results, including plans, as JSON')
+    parser.add_argument('--compare', help='JSON from an earlier --output to compare p50 against')
+    args = parser.parse_args()
+
+    samples = pick_samples()
+    cases = build_cases(samples)
+    missing = uncovered(cases)
+    if missing:
+        print(f"Not benchmarked: {', '.join(missing)}\n")
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = {result['method']: result for result in json.load(f)['results']}
+
+    results = []
+    for name, setup, call in cases:
+        if args.only and not name.startswith(args.only):
+            continue
+        try:
+            results.append(bench(name, setup, call, args.repeat, args.warmup, args.seq_scan_rows))
+        except Exception as e:
+            results.append({'method': name, 'error': str(e)})
+
+    report(results, baseline)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'samples': samples, 'results': results}, f, indent=2, default=str)
+
+if __name__ == '__main__':
+    main()
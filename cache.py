@@ -0,0 +1,75 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from metrics import registry
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries expire after ttl seconds"""
+
+    def __init__(self, maxsize=256, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._data = OrderedDict()
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def get_or_load(self, key, loader):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[0] > now:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            generation = self._generation
+
+        # Load outside the lock; concurrent misses may load twice, which is harmless
+        value = loader()
+
+        with self._lock:
+            # Drop results read before an invalidation, they may predate the change
+            if generation == self._generation:
+                self._data[key] = (time.monotonic() + self.ttl, value)
+                self._data.move_to_end(key)
+                while len(self._data) > self.maxsize:
+                    self._data.popitem(last=False)
+                    self.evictions += 1
+        return value
+
+    def invalidate(self):
+        with self._lock:
+            self._data.clear()
+            self._generation += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': len(self._data),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions
+            }
+
+# Departments and the course catalog: read on most pages, changed only by admins.
+# Each process has its own copy, so other workers see a change within the TTL.
+reference_cache = TTLCache(
+    maxsize=int(os.getenv('REFERENCE_CACHE_SIZE', '256')),
+    ttl=float(os.getenv('REFERENCE_CACHE_TTL', '300'))
+)
+
+def _cache_metrics():
+    stats = reference_cache.stats()
+    return [
+        ('reference_cache_hits_total', 'counter', 'Reference cache hits', {(): stats['hits']}),
+        ('reference_cache_misses_total', 'counter', 'Reference cache misses', {(): stats['misses']}),
+        ('reference_cache_evictions_total', 'counter', 'Reference cache evictions', {(): stats['evictions']}),
+        ('reference_cache_entries', 'gauge', 'Reference cache entries', {(): stats['size']})
+    ]
+
+registry.register_collector(_cache_metrics)
@@ -0,0 +1,490 @@
+import psycopg2
+from psycopg2 import extensions
+from psycopg2.extras import RealDictCursor
+import contextvars
+import itertools
+import logging
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from metrics import registry, record_query, record_checkout
+
+logger = logging.getLogger(__name__)
+
+class InstrumentedCursor(RealDictCursor):
+    """Dict cursor that reports every statement to the metrics registry"""
+    
+    def execute(self, query, vars=None):
+        started = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            record_query(query, time.perf_counter() - started, self.rowcount, self.query)
+    
+    def copy_expert(self, sql, file, size=8192):
+        started = time.perf_counter()
+        try:
+            return super().copy_expert(sql, file, size)
+        finally:
+            record_query(sql, time.perf_counter() - started, self.rowcount)
+
+class ConnectionPool:
+    """Thread-safe pool of PostgreSQL connections"""
+
+    def __init__(self, minconn, maxconn, timeout=30, check_after=30, **connect_kwargs):
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.check_after = check_after
+        self.connect_kwargs = connect_kwargs
+        self.pid = os.getpid()
+
+        self._idle = []
+        self._last_used = {}
+        self._size = 0
+        self._cond = threading.Condition()
+
+        for _ in range(minconn):
+            self._idle.append(self._connect())
+            self._size += 1
+
+    def _connect(self):
+        conn = psycopg2.connect(cursor_factory=InstrumentedCursor, **self.connect_kwargs)
+        self._last_used[id(conn)] = time.monotonic()
+        return conn
+
+    def _is_healthy(self, conn):
+        """Cheap check; only ping connections that sat idle for a while"""
+        if conn.closed:
+            return False
+        if time.monotonic() - self._last_used.get(id(conn), 0) < self.check_after:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _discard(self, conn):
+        self._last_used.pop(id(conn), None)
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+        with self._cond:
+            self._size -= 1
+            self._cond.notify()
+
+    def getconn(self):
+        started = time.perf_counter()
+        try:
+            return self._getconn()
+        finally:
+            record_checkout(time.perf_counter() - started)
+    
+    def _getconn(self):
+        deadline = time.monotonic() + self.timeout
+        while True:
+            conn = None
+            with self._cond:
+                while not self._idle and self._size >= self.maxconn:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise Exception("Database error: connection pool exhausted")
+                    self._cond.wait(remaining)
+
+                if self._idle:
+                    conn = self._idle.pop()
+                else:
+                    self._size += 1
+
+            # Open a new connection outside the lock
+            if conn is None:
+                try:
+                    return self._connect()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+
+            if self._is_healthy(conn):
+                return conn
+            self._discard(conn)
+
+    def putconn(self, conn):
+        """Return a connection with its transaction state reset"""
+        if conn.closed:
+            self._discard(conn)
+            return
+
+        try:
+            status = conn.info.transaction_status
+            if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+                self._discard(conn)
+                return
+            if status != extensions.TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+            if conn.autocommit:
+                conn.autocommit = False
+            if conn.readonly is not None or conn.isolation_level is not None:
+                conn.set_session(isolation_level='DEFAULT', readonly='DEFAULT')
+        except psycopg2.Error:
+            self._discard(conn)
+            return
+
+        self._last_used[id(conn)] = time.monotonic()
+        with self._cond:
+            self._idle.append(conn)
+            self._cond.notify()
+
+    def closeall(self):
+        with self._cond:
+            for conn in self._idle:
+                self._last_used.pop(id(conn), None)
+                conn.close()
+            self._size -= len(self._idle)
+            self._idle = []
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+def get_pool(**connect_kwargs):
+    """Process-wide pool for the given connection settings"""
+    key = tuple(sorted(connect_kwargs.items()))
+    with _pools_lock:
+        pool = _pools.get(key)
+        # Connections must not be shared across a fork
+        if pool is None or pool.pid != os.getpid():
+            pool = ConnectionPool(
+                int(os.getenv('DB_POOL_MIN', '1')),
+                int(os.getenv('DB_POOL_MAX', '10')),
+                timeout=float(os.getenv('DB_POOL_TIMEOUT', '30')),
+                check_after=float(os.getenv('DB_POOL_CHECK_AFTER', '30')),
+                **connect_kwargs
+            )
+            _pools[key] = pool
+        return pool
+
+def _pool_metrics():
+    with _pools_lock:
+        pools = list(_pools.values())
+    size = {}
+    idle = {}
+    for pool in pools:
+        labels = (('database', pool.connect_kwargs.get('database', '')),
+                  ('host', pool.connect_kwargs.get('host', '')))
+        size[labels] = size.get(labels, 0) + pool._size
+        idle[labels] = idle.get(labels, 0) + len(pool._idle)
+    return [
+        ('db_pool_connections', 'gauge', 'Open pooled connections', size),
+        ('db_pool_idle_connections', 'gauge', 'Idle pooled connections', idle)
+    ]
+
+registry.register_collector(_pool_metrics)
+
+class ReplicaSet:
+    """Round-robin over read replicas, skipping ones that are down or lagging"""
+
+    # Zero while the replica has replayed everything it received
+    LAG_SQL = '''
+        SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+                    ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+               END AS lag
+    '''
+
+    def __init__(self, hosts, max_lag=10, check_after=5, retry_after=30, **connect_kwargs):
+        self.hosts = hosts
+        self.max_lag = max_lag
+        self.check_after = check_after
+        self.retry_after = retry_after
+        self.connect_kwargs = connect_kwargs
+
+        self._next = itertools.count()
+        self._down_until = {}
+        self._checked = {}
+
+    def _pool(self, host):
+        name, _, port = host.partition(':')
+        return get_pool(**dict(self.connect_kwargs, host=name, port=port or self.connect_kwargs.get('port')))
+
+    def _mark_down(self, host, reason):
+        logger.warning('Read replica %s unavailable for %ss: %s', host, self.retry_after, reason)
+        self._down_until[host] = time.monotonic() + self.retry_after
+
+    def getconn(self):
+        """(pool, connection) from the next healthy replica, or (None, None) if none is usable"""
+        start = next(self._next)
+        for offset in range(len(self.hosts)):
+            host = self.hosts[(start + offset) % len(self.hosts)]
+            if self._down_until.get(host, 0) > time.monotonic():
+                continue
+
+            try:
+                pool = self._pool(host)
+                conn = pool.getconn()
+            except psycopg2.Error as e:
+                self._mark_down(host, e)
+                continue
+            except Exception:
+                # Pool exhausted: busy rather than broken, try the next one
+                continue
+
+            if time.monotonic() - self._checked.get(host, 0) >= self.check_after:
+                try:
+                    with conn.cursor() as cursor:
+                        cursor.execute(self.LAG_SQL)
+                        lag = float(cursor.fetchone()['lag'])
+                    conn.rollback()
+                except psycopg2.Error as e:
+                    pool.putconn(conn)
+                    self._mark_down(host, e)
+                    continue
+                if lag > self.max_lag:
+                    pool.putconn(conn)
+                    self._mark_down(host, f'{lag:.1f}s behind')
+                    continue
+                self._checked[host] = time.monotonic()
+            return pool, conn
+        return None, None
+
+_replica_sets = {}
+
+def get_replicas(**connect_kwargs):
+    """Process-wide replica set for DB_REPLICA_HOSTS, or None when no replicas are configured"""
+    hosts = tuple(host.strip() for host in os.getenv('DB_REPLICA_HOSTS', '').split(',') if host.strip())
+    if not hosts:
+        return None
+    key = (hosts, tuple(sorted(connect_kwargs.items())))
+    with _pools_lock:
+        replicas = _replica_sets.get(key)
+        if replicas is None:
+            replicas = ReplicaSet(
+                list(hosts),
+                max_lag=float(os.getenv('DB_REPLICA_MAX_LAG', '10')),
+                check_after=float(os.getenv('DB_REPLICA_CHECK_AFTER', '5')),
+                retry_after=float(os.getenv('DB_REPLICA_RETRY_AFTER', '30')),
+                **connect_kwargs
+            )
+            _replica_sets[key] = replicas
+        return replicas
+
+class Database:
+    def __init__(self):
+        self.host = os.getenv('DB_HOST', 'localhost')
+        self.port = os.getenv('DB_PORT', '5432')
+        self.database = os.getenv('DB_NAME', 'university_db')
+        self.user = os.getenv('DB_USER', 'postgres')
+        self.password = os.getenv('DB_PASSWORD', 'password')
+        self.pool = get_pool(
+            host=self.host,
+            port=self.port,
+            database=self.database,
+            user=self.user,
+            password=self.password
+        )
+        self.replicas = get_replicas(
+            port=self.port,
+            database=self.database,
+            user=self.user,
+            password=self.password
+        )
+
+    def read_connection(self):
+        """(pool, connection) for read-only work: a replica when one is healthy, else the primary"""
+        if self.replicas is not None:
+            pool, conn = self.replicas.getconn()
+            if conn is not None:
+                return pool, conn
+        return self.pool, self.pool.getconn()
+
+    @contextmanager
+    def get_connection(self):
+        session = current_session()
+        if session is not None:
+            with session.unit() as conn:
+                yield conn
+            return
+
+        conn = None
+        try:
+            conn = self.pool.getconn()
+            yield conn
+        except psycopg2.Error as e:
+            raise Exception(f"Database error: {e}")
+        finally:
+            if conn:
+                self.pool.putconn(conn)
+
+    def stream(self, query, params=None, itersize=2000):
+        """Yield tuples from a server-side cursor, itersize rows per round trip.
+
+        Uses its own connection and read-only snapshot, independent of the request
+        session, so it can outlive the request that started it (streamed responses).
+        Served by a read replica when one is configured.
+        """
+        pool, conn = self.read_connection()
+        try:
+            conn.set_session(isolation_level='REPEATABLE READ', readonly=True)
+            name = f'stream_{uuid.uuid4().hex}'
+            with conn.cursor(name=name, cursor_factory=extensions.cursor) as cursor:
+                cursor.itersize = itersize
+                cursor.execute(query, params)
+                yield from cursor
+        except psycopg2.Error as e:
+            raise Exception(f"Database error: {e}")
+        finally:
+            pool.putconn(conn)
+
+class SessionConnection:
+    """Connection handed to model code inside a session; commit is deferred"""
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def commit(self):
+        # The session commits once at the end of the request
+        pass
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+class Session:
+    """One connection and one transaction shared by all model calls in a request"""
+
+    def __init__(self, database=None, read_only=False, use_replica=None):
+        self.database = database or Database()
+        self.read_only = read_only
+        # Read-only sessions go to a replica unless the caller needs its own recent writes
+        self.use_replica = read_only if use_replica is None else use_replica and read_only
+        self.conn = None
+        self.pool = None
+        self.commit_callbacks = []
+        self.wrote = False
+
+    def connection(self):
+        # Checked out lazily so requests that never touch the database stay free
+        if self.conn is None:
+            if self.use_replica:
+                self.pool, self.conn = self.database.read_connection()
+            else:
+                self.pool, self.conn = self.database.pool, self.database.pool.getconn()
+            if self.read_only:
+                # One snapshot for every panel rendered by the request
+                self.conn.set_session(isolation_level='REPEATABLE READ', readonly=True)
+        return self.conn
+
+    @contextmanager
+    def unit(self):
+        """Scope of a single model call within the shared transaction"""
+        try:
+            conn = self.connection()
+            # Protect earlier work in the transaction from a failing call
+            savepoint = (not self.read_only and
+                         conn.info.transaction_status != extensions.TRANSACTION_STATUS_IDLE)
+            if savepoint:
+                with conn.cursor() as cursor:
+                    cursor.execute('SAVEPOINT unit')
+        except psycopg2.Error as e:
+            raise Exception(f"Database error: {e}")
+
+        try:
+            yield SessionConnection(conn)
+        except Exception as e:
+            try:
+                if savepoint:
+                    with conn.cursor() as cursor:
+                        cursor.execute('ROLLBACK TO SAVEPOINT unit')
+                else:
+                    conn.rollback()
+            except psycopg2.Error:
+                conn.rollback()
+            if isinstance(e, psycopg2.Error):
+                raise Exception(f"Database error: {e}")
+            raise
+        else:
+            if savepoint:
+                # Only a failing call needs the savepoint; don't let them stack up
+                try:
+                    with conn.cursor() as cursor:
+                        cursor.execute('RELEASE SAVEPOINT unit')
+                except psycopg2.Error as e:
+                    raise Exception(f"Database error: {e}")
+
+    def close(self, commit=True):
+        callbacks, self.commit_callbacks = self.commit_callbacks, []
+        if self.conn is not None:
+            conn, self.conn = self.conn, None
+            try:
+                if commit:
+                    if not self.read_only and self.database.replicas is not None:
+                        # Callers pin follow-up reads to the primary after a write
+                        with conn.cursor() as cursor:
+                            cursor.execute('SELECT txid_current_if_assigned() IS NOT NULL AS wrote')
+                            self.wrote = self.wrote or cursor.fetchone()['wrote']
+                    conn.commit()
+                else:
+                    conn.rollback()
+            except psycopg2.Error as e:
+                raise Exception(f"Database error: {e}")
+            finally:
+                self.pool.putconn(conn)
+        
+        if not commit:
+            return
+        for callback in callbacks:
+            callback()
+
+_current_session = contextvars.ContextVar('db_session', default=None)
+
+def current_session():
+    return _current_session.get()
+
+def bind_session(session):
+    """Route every Database.get_connection() in this context through session"""
+    _current_session.set(session)
+
+def unbind_session():
+    _current_session.set(None)
+
+def release_connection():
+    """Commit and hand the request's connection back to the pool until it is next needed.
+
+    This commits everything the request has done so far and later calls start a new
+    transaction, so call it from views at a point where that is intended, never from models.
+    """
+    session = current_session()
+    if session is not None:
+        session.close()
+
+def on_primary(loader):
+    """Call loader in its own short read-only transaction on the primary.
+
+    For results that outlive the request (caches). Inside a request the loader must
+    not see the request's own uncommitted writes, which may still be rolled back, nor
+    an old snapshot or a lagging replica from before a change that already
+    invalidated them.
+    """
+    session = current_session()
+    if session is None:
+        return loader()
+
+    primary = Session(session.database, read_only=True, use_replica=False)
+    token = _current_session.set(primary)
+    try:
+        return loader()
+    finally:
+        _current_session.reset(token)
+        primary.close()
+
+def on_commit(callback):
+    """Run callback once the current request's transaction commits (at once outside a request)"""
+    session = current_session()
+    if session is None:
+        callback()
+    else:
+        session.commit_callbacks.append(callback)
@@ -0,0 +1,160 @@
+import contextvars
+import logging
+import os
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+SLOW_QUERY_SECONDS = float(os.getenv('SLOW_QUERY_MS', '200')) / 1000
+# The same statement run this many times in one request is logged as a likely N+1
+REPEATED_QUERY_THRESHOLD = int(os.getenv('REPEATED_QUERY_THRESHOLD', '10'))
+
+_LITERAL_RE = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+# One bound value after literal replacement, with an optional cast ('?::uuid', 'NULL::int[]')
+_ITEM = r'(?:\?|NULL|TRUE|FALSE|DEFAULT)(?:::\w+(?:\[\])?)?'
+_VALUES_RE = re.compile(rf'\((?:{_ITEM},\s*)*{_ITEM}\)(?:,\s*\((?:{_ITEM},\s*)*{_ITEM}\))+', re.IGNORECASE)
+_ARRAY_RE = re.compile(rf'ARRAY\[(?:{_ITEM},\s*)*{_ITEM}\]', re.IGNORECASE)
+
+def normalize(sql):
+    """Statement shape with literals replaced, used to group executions"""
+    if isinstance(sql, bytes):
+        sql = sql.decode('utf-8', 'replace')
+    sql = ' '.join(str(sql).split())
+    sql = _LITERAL_RE.sub('?', sql)
+    # Multi-row VALUES lists (execute_values) and bound lists collapse to one shape
+    sql = _VALUES_RE.sub('(...)', sql)
+    sql = _ARRAY_RE.sub('ARRAY[...]', sql)
+    return sql[:200]
+
+class Registry:
+    """Counters and count/sum summaries rendered in Prometheus text format"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+        self._values = defaultdict(float)
+        self._collectors = []
+
+    def describe(self, name, kind, help_text):
+        self._metrics[name] = (kind, help_text)
+
+    def inc(self, name, labels=(), value=1):
+        with self._lock:
+            self._values[(name, '', labels)] += value
+
+    def observe(self, name, labels, value):
+        with self._lock:
+            self._values[(name, '_count', labels)] += 1
+            self._values[(name, '_sum', labels)] += value
+
+    def register_collector(self, collector):
+        """collector() returns [(name, kind, help, {labels: value})] at scrape time"""
+        self._collectors.append(collector)
+
+    def render(self):
+        with self._lock:
+            values = sorted(self._values.items())
+
+        lines = []
+        for base, (kind, help_text) in sorted(self._metrics.items()):
+            lines.append(f'# HELP {base} {help_text}')
+            lines.append(f'# TYPE {base} {kind}')
+            for (name, suffix, labels), value in values:
+                if name == base:
+                    lines.append(f'{name}{suffix}{_labels(labels)} {_number(value)}')
+
+        for collector in self._collectors:
+            for name, kind, help_text, samples in collector():
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} {kind}')
+                for labels, value in samples.items():
+                    lines.append(f'{name}{_labels(labels)} {_number(value)}')
+        return '\n'.join(lines) + '\n'
+
+def _labels(labels):
+    if not labels:
+        return ''
+    pairs = (f'{key}="{_escape(value)}"' for key, value in labels)
+    return '{' + ','.join(pairs) + '}'
+
+def _number(value):
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+registry = Registry()
+registry.describe('http_requests', 'summary', 'Requests and their duration in seconds, by route')
+registry.describe('db_queries_total', 'counter', 'SQL statements executed, by route')
+registry.describe('db_query_seconds_total', 'counter', 'Time spent executing SQL, by route')
+registry.describe('db_rows_total', 'counter', 'Rows returned or affected by SQL, by route')
+registry.describe('db_connection_checkout', 'summary', 'Time waiting for a pooled connection in seconds, by route')
+registry.describe('db_statement', 'summary', 'Execution time of each statement shape in seconds')
+registry.describe('db_slow_queries_total', 'counter', 'Statements slower than SLOW_QUERY_MS, by route')
+registry.describe('db_repeated_queries_total', 'counter', 'Requests repeating one statement past REPEATED_QUERY_THRESHOLD, by route')
+
+class RequestStats:
+    def __init__(self, route):
+        self.route = route
+        self.started = time.perf_counter()
+        self.statements = Counter()
+
+_current = contextvars.ContextVar('request_stats', default=None)
+
+def begin_request(route):
+    _current.set(RequestStats(route))
+
+def end_request():
+    stats = _current.get()
+    if stats is None:
+        return
+    _current.set(None)
+
+    labels = (('route', stats.route),)
+    registry.observe('http_requests', labels, time.perf_counter() - stats.started)
+    for statement, count in stats.statements.items():
+        if count >= REPEATED_QUERY_THRESHOLD:
+            registry.inc('db_repeated_queries_total', labels)
+            logger.warning('Possible N+1 in %s: %d executions of %s', stats.route, count, statement)
+
+def _route():
+    stats = _current.get()
+    return stats.route if stats is not None else 'none'
+
+_captured = contextvars.ContextVar('captured_queries', default=None)
+
+@contextmanager
+def capture_queries():
+    """Collect the SQL, with parameters bound, executed in this context"""
+    queries = []
+    token = _captured.set(queries)
+    try:
+        yield queries
+    finally:
+        _captured.reset(token)
+
+def record_query(sql, seconds, rows, bound=None):
+    captured = _captured.get()
+    if captured is not None:
+        captured.append(bound or sql)
+
+    statement = normalize(sql)
+    labels = (('route', _route()),)
+    registry.inc('db_queries_total', labels)
+    registry.inc('db_query_seconds_total', labels, seconds)
+    registry.inc('db_rows_total', labels, max(rows, 0))
+    registry.observe('db_statement', (('statement', statement),), seconds)
+
+    stats = _current.get()
+    if stats is not None:
+        stats.statements[statement] += 1
+    if seconds >= SLOW_QUERY_SECONDS:
+        registry.inc('db_slow_queries_total', labels)
+        logger.warning('Slow query in %s (%.0f ms): %s', _route(), seconds * 1000, statement)
+
+def record_checkout(seconds):
+    registry.observe('db_connection_checkout', (('route', _route()),), seconds)
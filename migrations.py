@@ -0,0 +1,506 @@
+import sys
+from psycopg2.extras import execute_values
+from database import Database
+from scheduling import parse_schedule
+
+def backfill_section_meetings(cursor):
+    cursor.execute('SELECT id, schedule FROM course_sections')
+    rows = []
+    for section in cursor.fetchall():
+        try:
+            meetings = parse_schedule(section['schedule'])
+        except ValueError:
+            # Legacy free-text schedules stay unscheduled
+            continue
+        rows.extend((section['id'], *meeting) for meeting in meetings)
+    if rows:
+        execute_values(cursor, '''
+            INSERT INTO section_meetings (section_id, days, start_minute, end_minute) VALUES %s
+        ''', rows)
+
+# Ordered schema steps. Append new versions; never edit an applied one.
+# A step is an SQL string or a callable taking the cursor (for data backfills).
+MIGRATIONS = [
+    (1, 'Initial schema', [
+        '''
+            CREATE TABLE IF NOT EXISTS users (
+                id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+                first_name VARCHAR(100) NOT NULL,
+                last_name VARCHAR(100) NOT NULL,
+                email VARCHAR(255) UNIQUE NOT NULL,
+                username VARCHAR(50) UNIQUE NOT NULL,
+                password_hash VARCHAR(255) NOT NULL,
+                user_type VARCHAR(20) NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                is_active BOOLEAN DEFAULT TRUE
+            )
+        ''',
+        '''
+            CREATE TABLE IF NOT EXISTS students (
+                user_id UUID PRIMARY KEY REFERENCES users(id) ON DELETE CASCADE,
+                student_id VARCHAR(50) UNIQUE NOT NULL,
+                major VARCHAR(100),
+                year_level INTEGER DEFAULT 1,
+                status VARCHAR(20) DEFAULT 'active'
+            )
+        ''',
+        '''
+            CREATE TABLE IF NOT EXISTS professors (
+                user_id UUID PRIMARY KEY REFERENCES users(id) ON DELETE CASCADE,
+                employee_id VARCHAR(50) UNIQUE NOT NULL,
+                department VARCHAR(100) NOT NULL,
+                position VARCHAR(100) DEFAULT 'Assistant Professor',
+                office_location VARCHAR(100),
+                phone VARCHAR(20)
+            )
+        ''',
+        '''
+            CREATE TABLE IF NOT EXISTS admins (
+                user_id UUID PRIMARY KEY REFERENCES users(id) ON DELETE CASCADE,
+                admin_level INTEGER DEFAULT 1
+            )
+        ''',
+        '''
+            CREATE TABLE IF NOT EXISTS courses (
+                id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+                course_code VARCHAR(20) UNIQUE NOT NULL,
+                title VARCHAR(200) NOT NULL,
+                description TEXT,
+                credits INTEGER NOT NULL,
+                department VARCHAR(100),
+                max_students INTEGER DEFAULT 30,
+                is_active BOOLEAN DEFAULT TRUE,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''',
+        '''
+            CREATE TABLE IF NOT EXISTS course_sections (
+                id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+                course_id UUID NOT NULL REFERENCES courses(id),
+                professor_id UUID NOT NULL REFERENCES professors(user_id),
+                section_number VARCHAR(10) NOT NULL,
+                semester VARCHAR(20) NOT NULL,
+                year INTEGER NOT NULL,
+                schedule VARCHAR(100) NOT NULL,
+                room VARCHAR(50),
+                max_capacity INTEGER DEFAULT 30,
+                current_enrollment INTEGER DEFAULT 0,
+                status VARCHAR(20) DEFAULT 'open',
+                UNIQUE(course_id, section_number, semester, year)
+            )
+        ''',
+        '''
+            CREATE TABLE IF NOT EXISTS enrollments (
+                id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+                student_id UUID NOT NULL REFERENCES students(user_id),
+                section_id UUID NOT NULL REFERENCES course_sections(id),
+                enrollment_date DATE DEFAULT CURRENT_DATE,
+                grade VARCHAR(5),
+                UNIQUE(student_id, section_id)
+            )
+        ''',
+        '''
+            CREATE TABLE IF NOT EXISTS announcements (
+                id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+                section_id UUID NOT NULL REFERENCES course_sections(id),
+                title VARCHAR(200) NOT NULL,
+                content TEXT NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_users_username ON users(username)',
+        'CREATE INDEX IF NOT EXISTS idx_enrollments_student ON enrollments(student_id)',
+        'CREATE INDEX IF NOT EXISTS idx_enrollments_section ON enrollments(section_id)'
+    ]),
+    (2, 'Enrollment request queue', [
+        '''
+            CREATE TABLE enrollment_requests (
+                id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+                student_id UUID NOT NULL REFERENCES students(user_id),
+                section_id UUID NOT NULL REFERENCES course_sections(id),
+                status VARCHAR(20) NOT NULL DEFAULT 'pending',
+                reason VARCHAR(200),
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                processed_at TIMESTAMP
+            )
+        ''',
+        # At most one pending request per student and section
+        '''
+            CREATE UNIQUE INDEX idx_enrollment_requests_pending
+            ON enrollment_requests(student_id, section_id) WHERE status = 'pending'
+        ''',
+        '''
+            CREATE INDEX idx_enrollment_requests_queue
+            ON enrollment_requests(created_at) WHERE status = 'pending'
+        ''',
+        '''
+            CREATE INDEX idx_enrollment_requests_section_queue
+            ON enrollment_requests(section_id, created_at) WHERE status = 'pending'
+        '''
+    ]),
+    (3, 'Structured section meeting times', [
+        # days is a bitmask (M=1, T=2, W=4, R=8, F=16, S=32, U=64); times are minutes after midnight
+        '''
+            CREATE TABLE section_meetings (
+                id SERIAL PRIMARY KEY,
+                section_id UUID NOT NULL REFERENCES course_sections(id) ON DELETE CASCADE,
+                days SMALLINT NOT NULL CHECK (days > 0),
+                start_minute SMALLINT NOT NULL,
+                end_minute SMALLINT NOT NULL,
+                CHECK (start_minute >= 0 AND end_minute <= 1440 AND start_minute < end_minute)
+            )
+        ''',
+        'CREATE INDEX idx_section_meetings_section ON section_meetings(section_id)',
+        'CREATE INDEX idx_course_sections_term ON course_sections(semester, year)',
+        backfill_section_meetings
+    ]),
+    (4, 'Incrementally maintained GPA aggregates', [
+        '''
+            CREATE TABLE grade_points (
+                grade VARCHAR(5) PRIMARY KEY,
+                points NUMERIC(3, 2) NOT NULL
+            )
+        ''',
+        "INSERT INTO grade_points (grade, points) VALUES ('A', 4.0), ('B', 3.0), ('C', 2.0), ('D', 1.0), ('F', 0.0)",
+        '''
+            CREATE TABLE student_gpa_terms (
+                student_id UUID NOT NULL REFERENCES students(user_id) ON DELETE CASCADE,
+                semester VARCHAR(20) NOT NULL,
+                year INTEGER NOT NULL,
+                quality_points NUMERIC(10, 2) NOT NULL DEFAULT 0,
+                graded_credits INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (student_id, semester, year)
+            )
+        ''',
+        '''
+            CREATE TABLE student_gpa (
+                student_id UUID PRIMARY KEY REFERENCES students(user_id) ON DELETE CASCADE,
+                quality_points NUMERIC(10, 2) NOT NULL DEFAULT 0,
+                graded_credits INTEGER NOT NULL DEFAULT 0
+            )
+        ''',
+        '''
+            INSERT INTO student_gpa_terms (student_id, semester, year, quality_points, graded_credits)
+            SELECT e.student_id, cs.semester, cs.year, SUM(gp.points * c.credits), SUM(c.credits)
+            FROM enrollments e
+            JOIN grade_points gp ON gp.grade = e.grade
+            JOIN course_sections cs ON e.section_id = cs.id
+            JOIN courses c ON cs.course_id = c.id
+            GROUP BY e.student_id, cs.semester, cs.year
+        ''',
+        '''
+            INSERT INTO student_gpa (student_id, quality_points, graded_credits)
+            SELECT student_id, SUM(quality_points), SUM(graded_credits)
+            FROM student_gpa_terms
+            GROUP BY student_id
+        '''
+    ]),
+    (5, 'Trigram search indexes', [
+        'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+        '''
+            ALTER TABLE users ADD COLUMN search_text TEXT GENERATED ALWAYS AS (
+                lower(first_name || ' ' || last_name || ' ' || email || ' ' || username)
+            ) STORED
+        ''',
+        '''
+            ALTER TABLE courses ADD COLUMN search_text TEXT GENERATED ALWAYS AS (
+                lower(course_code || ' ' || title)
+            ) STORED
+        ''',
+        'CREATE INDEX idx_users_search ON users USING gin (search_text gin_trgm_ops)',
+        'CREATE INDEX idx_courses_search ON courses USING gin (search_text gin_trgm_ops)'
+    ]),
+    (6, 'User listing index', [
+        'CREATE INDEX idx_users_listing ON users(user_type, last_name, first_name, id) WHERE is_active'
+    ]),
+    (7, 'Dashboard counters', [
+        '''
+            CREATE TABLE stat_counters (
+                name VARCHAR(50) PRIMARY KEY,
+                value BIGINT NOT NULL DEFAULT 0
+            )
+        ''',
+        # Statement-level triggers: one counter update per statement, also for COPY.
+        # Concurrent writers to a table queue briefly on its counter row until commit;
+        # accepted, since users, courses and sections are written rarely and in batches
+        '''
+            CREATE FUNCTION count_users() RETURNS trigger LANGUAGE plpgsql AS $$
+            BEGIN
+                IF TG_OP = 'INSERT' THEN
+                    INSERT INTO stat_counters (name, value)
+                    SELECT user_type || '_count', COUNT(*) FROM new_rows GROUP BY user_type
+                    ON CONFLICT (name) DO UPDATE SET value = stat_counters.value + EXCLUDED.value;
+                ELSE
+                    INSERT INTO stat_counters (name, value)
+                    SELECT user_type || '_count', -COUNT(*) FROM old_rows GROUP BY user_type
+                    ON CONFLICT (name) DO UPDATE SET value = stat_counters.value + EXCLUDED.value;
+                END IF;
+                RETURN NULL;
+            END
+            $$
+        ''',
+        '''
+            CREATE FUNCTION count_rows() RETURNS trigger LANGUAGE plpgsql AS $$
+            DECLARE
+                delta BIGINT;
+            BEGIN
+                IF TG_OP = 'INSERT' THEN
+                    SELECT COUNT(*) INTO delta FROM new_rows;
+                ELSE
+                    SELECT -COUNT(*) INTO delta FROM old_rows;
+                END IF;
+                IF delta <> 0 THEN
+                    INSERT INTO stat_counters (name, value) VALUES (TG_ARGV[0], delta)
+                    ON CONFLICT (name) DO UPDATE SET value = stat_counters.value + EXCLUDED.value;
+                END IF;
+                RETURN NULL;
+            END
+            $$
+        ''',
+        '''
+            CREATE TRIGGER users_counted_insert AFTER INSERT ON users
+            REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION count_users()
+        ''',
+        '''
+            CREATE TRIGGER users_counted_delete AFTER DELETE ON users
+            REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION count_users()
+        ''',
+        '''
+            CREATE TRIGGER courses_counted_insert AFTER INSERT ON courses
+            REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION count_rows('course_count')
+        ''',
+        '''
+            CREATE TRIGGER courses_counted_delete AFTER DELETE ON courses
+            REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION count_rows('course_count')
+        ''',
+        '''
+            CREATE TRIGGER course_sections_counted_insert AFTER INSERT ON course_sections
+            REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION count_rows('section_count')
+        ''',
+        '''
+            CREATE TRIGGER course_sections_counted_delete AFTER DELETE ON course_sections
+            REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION count_rows('section_count')
+        ''',
+        '''
+            INSERT INTO stat_counters (name, value)
+            SELECT user_type || '_count', COUNT(*) FROM users GROUP BY user_type
+            UNION ALL SELECT 'course_count', COUNT(*) FROM courses
+            UNION ALL SELECT 'section_count', COUNT(*) FROM course_sections
+        '''
+    ]),
+    (8, 'Announcement feed index and summaries', [
+        'CREATE INDEX idx_announcements_feed ON announcements(section_id, created_at DESC, id DESC)',
+        # Feed listings read the summary; the full content is only loaded on demand
+        "ALTER TABLE announcements ADD COLUMN summary VARCHAR(200) GENERATED ALWAYS AS (left(content, 200)) STORED"
+    ]),
+    (9, 'Section waitlists', [
+        # status: waiting, enrolled (promoted), removed (could not be promoted) or left
+        '''
+            CREATE TABLE waitlist_entries (
+                id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+                student_id UUID NOT NULL REFERENCES students(user_id) ON DELETE CASCADE,
+                section_id UUID NOT NULL REFERENCES course_sections(id) ON DELETE CASCADE,
+                status VARCHAR(20) NOT NULL DEFAULT 'waiting',
+                reason VARCHAR(200),
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                processed_at TIMESTAMP
+            )
+        ''',
+        '''
+            CREATE UNIQUE INDEX idx_waitlist_waiting
+            ON waitlist_entries(student_id, section_id) WHERE status = 'waiting'
+        ''',
+        # Queue order per section; also answers position lookups with an index range count
+        '''
+            CREATE INDEX idx_waitlist_queue
+            ON waitlist_entries(section_id, created_at, id) WHERE status = 'waiting'
+        '''
+    ]),
+    (10, 'Room and instructor booking constraints', [
+        'CREATE EXTENSION IF NOT EXISTS btree_gist',
+        # 'B 101', 'b 101 ' and 'B 101' are one room; blank and TBA rooms are never booked
+        '''
+            CREATE FUNCTION booking_room(room TEXT) RETURNS TEXT LANGUAGE sql IMMUTABLE AS $$
+                SELECT NULLIF(NULLIF(upper(btrim(room)), ''), 'TBA')
+            $$
+        ''',
+        # One row per meeting day and resource (a room, or a professor id); the
+        # exclusion constraint makes overlapping bookings impossible even under concurrency
+        '''
+            CREATE TABLE section_bookings (
+                meeting_id INTEGER NOT NULL REFERENCES section_meetings(id) ON DELETE CASCADE,
+                section_id UUID NOT NULL REFERENCES course_sections(id) ON DELETE CASCADE,
+                kind VARCHAR(10) NOT NULL,
+                resource VARCHAR(100) NOT NULL,
+                semester VARCHAR(20) NOT NULL,
+                year INTEGER NOT NULL,
+                day SMALLINT NOT NULL,
+                minutes INT4RANGE NOT NULL,
+                CONSTRAINT section_bookings_no_overlap EXCLUDE USING gist (
+                    kind WITH =, resource WITH =, year WITH =, semester WITH =, day WITH =, minutes WITH &&
+                )
+            )
+        ''',
+        'CREATE INDEX idx_section_bookings_section ON section_bookings(section_id)',
+        '''
+            CREATE FUNCTION book_sections(section_ids UUID[]) RETURNS void LANGUAGE plpgsql AS $$
+            BEGIN
+                DELETE FROM section_bookings WHERE section_id = ANY(section_ids);
+                INSERT INTO section_bookings (meeting_id, section_id, kind, resource, semester, year, day, minutes)
+                SELECT m.id, m.section_id, r.kind, r.resource, cs.semester, cs.year, d,
+                       int4range(m.start_minute, m.end_minute)
+                FROM section_meetings m
+                JOIN course_sections cs ON cs.id = m.section_id
+                CROSS JOIN LATERAL (VALUES ('professor', cs.professor_id::text),
+                                           ('room', booking_room(cs.room))) AS r(kind, resource)
+                CROSS JOIN generate_series(0, 6) AS d
+                WHERE m.section_id = ANY(section_ids)
+                  AND m.days & (1 << d) <> 0
+                  AND r.resource IS NOT NULL;
+            END
+            $$
+        ''',
+        '''
+            CREATE FUNCTION book_new_meetings() RETURNS trigger LANGUAGE plpgsql AS $$
+            BEGIN
+                PERFORM book_sections(ARRAY(SELECT DISTINCT section_id FROM new_rows));
+                RETURN NULL;
+            END
+            $$
+        ''',
+        '''
+            CREATE TRIGGER section_meetings_booked AFTER INSERT ON section_meetings
+            REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION book_new_meetings()
+        ''',
+        '''
+            CREATE FUNCTION rebook_section() RETURNS trigger LANGUAGE plpgsql AS $$
+            BEGIN
+                PERFORM book_sections(ARRAY[NEW.id]);
+                RETURN NULL;
+            END
+            $$
+        ''',
+        '''
+            CREATE TRIGGER course_sections_rebooked
+            AFTER UPDATE OF room, professor_id, semester, year ON course_sections
+            FOR EACH ROW
+            WHEN (booking_room(OLD.room) IS DISTINCT FROM booking_room(NEW.room)
+                  OR OLD.professor_id IS DISTINCT FROM NEW.professor_id
+                  OR OLD.semester IS DISTINCT FROM NEW.semester OR OLD.year IS DISTINCT FROM NEW.year)
+            EXECUTE FUNCTION rebook_section()
+        ''',
+        # Existing double bookings cannot be booked; they stay listed in the term report
+        '''
+            INSERT INTO section_bookings (meeting_id, section_id, kind, resource, semester, year, day, minutes)
+            SELECT m.id, m.section_id, r.kind, r.resource, cs.semester, cs.year, d,
+                   int4range(m.start_minute, m.end_minute)
+            FROM section_meetings m
+            JOIN course_sections cs ON cs.id = m.section_id
+            CROSS JOIN LATERAL (VALUES ('professor', cs.professor_id::text),
+                                       ('room', booking_room(cs.room))) AS r(kind, resource)
+            CROSS JOIN generate_series(0, 6) AS d
+            WHERE m.days & (1 << d) <> 0 AND r.resource IS NOT NULL
+            ON CONFLICT DO NOTHING
+        '''
+    ]),
+    (11, 'Count active courses only', [
+        'DROP TRIGGER courses_counted_insert ON courses',
+        'DROP TRIGGER courses_counted_delete ON courses',
+        # Like count_rows, but only rows with is_active count, so deactivating or
+        # reactivating a course (an UPDATE) moves the counter too
+        '''
+            CREATE FUNCTION count_active_courses() RETURNS trigger LANGUAGE plpgsql AS $$
+            DECLARE
+                delta BIGINT := 0;
+            BEGIN
+                IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                    delta := delta + (SELECT COUNT(*) FROM new_rows WHERE is_active);
+                END IF;
+                IF TG_OP IN ('DELETE', 'UPDATE') THEN
+                    delta := delta - (SELECT COUNT(*) FROM old_rows WHERE is_active);
+                END IF;
+                IF delta <> 0 THEN
+                    INSERT INTO stat_counters (name, value) VALUES ('course_count', delta)
+                    ON CONFLICT (name) DO UPDATE SET value = stat_counters.value + EXCLUDED.value;
+                END IF;
+                RETURN NULL;
+            END
+            $$
+        ''',
+        '''
+            CREATE TRIGGER courses_counted_insert AFTER INSERT ON courses
+            REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION count_active_courses()
+        ''',
+        '''
+            CREATE TRIGGER courses_counted_update AFTER UPDATE ON courses
+            REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION count_active_courses()
+        ''',
+        '''
+            CREATE TRIGGER courses_counted_delete AFTER DELETE ON courses
+            REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION count_active_courses()
+        ''',
+        # Recount while the new triggers' locks keep course writes out
+        '''
+            INSERT INTO stat_counters (name, value)
+            SELECT 'course_count', COUNT(*) FROM courses WHERE is_active
+            ON CONFLICT (name) DO UPDATE SET value = EXCLUDED.value
+        '''
+    ]),
+]
+
+# Serializes concurrent runners (e.g. several app servers starting at once)
+MIGRATION_LOCK_ID = 4242001
+
+def get_schema_version(cursor):
+    cursor.execute("SELECT to_regclass('schema_version') AS name")
+    if cursor.fetchone()['name'] is None:
+        return 0
+    cursor.execute('SELECT COALESCE(MAX(version), 0) AS version FROM schema_version')
+    return cursor.fetchone()['version']
+
+def migrate(target=None):
+    """Apply pending migrations in one transaction; returns applied versions"""
+    db = Database()
+    with db.get_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute('SELECT pg_advisory_xact_lock(%s)', (MIGRATION_LOCK_ID,))
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS schema_version (
+                    version INTEGER PRIMARY KEY,
+                    description VARCHAR(200) NOT NULL,
+                    applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            current = get_schema_version(cursor)
+            
+            applied = []
+            for version, description, statements in MIGRATIONS:
+                if version <= current or (target is not None and version > target):
+                    continue
+                for statement in statements:
+                    if callable(statement):
+                        statement(cursor)
+                    else:
+                        cursor.execute(statement)
+                cursor.execute(
+                    'INSERT INTO schema_version (version, description) VALUES (%s, %s)',
+                    (version, description)
+                )
+                applied.append(version)
+            
+            conn.commit()
+            return applied
+
+def pending_migrations():
+    db = Database()
+    with db.get_connection() as conn:
+        with conn.cursor() as cursor:
+            current = get_schema_version(cursor)
+            return [(version, description) for version, description, _ in MIGRATIONS
+                    if version > current]
+
+if __name__ == '__main__':
+    target = int(sys.argv[1]) if len(sys.argv) > 1 else None
+    applied = migrate(target)
+    print(f"Applied migrations: {applied}" if applied else "Schema is up to date")
@@ -1,152 +1,236 @@
-import psycopg2
-from psycopg2.extras import RealDictCursor
+from database import Database, on_commit, on_primary
+from cache import reference_cache
+from psycopg2 import errors
+from psycopg2.extras import execute_values
+from scheduling import parse_schedule, schedules_conflict, week_mask, build_schedules, DAY_BITS
 from datetime import datetime, date
-from werkzeug.security import generate_password_hash, check_password_hash
+from passwords import hash_password, hash_passwords, verify_password
+from pagination import DEFAULT_PAGE_SIZE, fetch_page, encode_cursor, decode_cursor
+import csv
+import io
 import uuid
-import os
-from contextlib import contextmanager
 
-class Database:
-    def __init__(self):
-        self.host = os.getenv('DB_HOST', 'localhost')
-        self.port = os.getenv('DB_PORT', '5432')
-        self.database = os.getenv('DB_NAME', 'university_db')
-        self.user = os.getenv('DB_USER', 'postgres')
-        self.password = os.getenv('DB_PASSWORD', 'password')
-        self.init_db()
-    
-    @contextmanager
-    def get_connection(self):
-        conn = None
-        try:
-            conn = psycopg2.connect(
-                host=self.host,
-                port=self.port,
-                database=self.database,
-                user=self.user,
-                password=self.password,
-                cursor_factory=RealDictCursor
-            )
-            yield conn
-        except psycopg2.Error as e:
-            if conn:
-                conn.rollback()
-            raise Exception(f"Database error: {e}")
-        finally:
-            if conn:
-                conn.close()
-    
-    def init_db(self):
-        with self.get_connection() as conn:
-            with conn.cursor() as cursor:
-                # Users table (base for all user types)
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS users (
-                        id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
-                        first_name VARCHAR(100) NOT NULL,
-                        last_name VARCHAR(100) NOT NULL,
-                        email VARCHAR(255) UNIQUE NOT NULL,
-                        username VARCHAR(50) UNIQUE NOT NULL,
-                        password_hash VARCHAR(255) NOT NULL,
-                        user_type VARCHAR(20) NOT NULL,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        is_active BOOLEAN DEFAULT TRUE
-                    )
-                ''')
-                
-                # Students table
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS students (
-                        user_id UUID PRIMARY KEY REFERENCES users(id) ON DELETE CASCADE,
-                        student_id VARCHAR(50) UNIQUE NOT NULL,
-                        major VARCHAR(100),
-                        year_level INTEGER DEFAULT 1,
-                        status VARCHAR(20) DEFAULT 'active'
-                    )
-                ''')
-                
-                # Professors table
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS professors (
-                        user_id UUID PRIMARY KEY REFERENCES users(id) ON DELETE CASCADE,
-                        employee_id VARCHAR(50) UNIQUE NOT NULL,
-                        department VARCHAR(100) NOT NULL,
-                        position VARCHAR(100) DEFAULT 'Assistant Professor',
-                        office_location VARCHAR(100),
-                        phone VARCHAR(20)
-                    )
-                ''')
-                
-                # Admins table
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS admins (
-                        user_id UUID PRIMARY KEY REFERENCES users(id) ON DELETE CASCADE,
-                        admin_level INTEGER DEFAULT 1
-                    )
-                ''')
-                
-                # Courses table (department as string field)
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS courses (
-                        id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
-                        course_code VARCHAR(20) UNIQUE NOT NULL,
-                        title VARCHAR(200) NOT NULL,
-                        description TEXT,
-                        credits INTEGER NOT NULL,
-                        department VARCHAR(100),
-                        max_students INTEGER DEFAULT 30,
-                        is_active BOOLEAN DEFAULT TRUE,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                    )
-                ''')
-                
-                # Course sections table
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS course_sections (
-                        id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
-                        course_id UUID NOT NULL REFERENCES courses(id),
-                        professor_id UUID NOT NULL REFERENCES professors(user_id),
-                        section_number VARCHAR(10) NOT NULL,
-                        semester VARCHAR(20) NOT NULL,
-                        year INTEGER NOT NULL,
-                        schedule VARCHAR(100) NOT NULL,
-                        room VARCHAR(50),
-                        max_capacity INTEGER DEFAULT 30,
-                        current_enrollment INTEGER DEFAULT 0,
-                        status VARCHAR(20) DEFAULT 'open',
-                        UNIQUE(course_id, section_number, semester, year)
-                    )
-                ''')
-                
-                # Enrollments table (simplified)
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS enrollments (
-                        id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
-                        student_id UUID NOT NULL REFERENCES students(user_id),
-                        section_id UUID NOT NULL REFERENCES course_sections(id),
-                        enrollment_date DATE DEFAULT CURRENT_DATE,
-                        grade VARCHAR(5),
-                        UNIQUE(student_id, section_id)
-                    )
-                ''')
-                
-                # Simple announcements table
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS announcements (
-                        id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
-                        section_id UUID NOT NULL REFERENCES course_sections(id),
-                        title VARCHAR(200) NOT NULL,
-                        content TEXT NOT NULL,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                    )
-                ''')
-                
-                # Basic indexes only
-                cursor.execute('CREATE INDEX IF NOT EXISTS idx_users_username ON users(username)')
-                cursor.execute('CREATE INDEX IF NOT EXISTS idx_enrollments_student ON enrollments(student_id)')
-                cursor.execute('CREATE INDEX IF NOT EXISTS idx_enrollments_section ON enrollments(section_id)')
-                
-                conn.commit()
+# GPA aggregates (student_gpa, student_gpa_terms) are kept current by adding
+# the quality-point and credit delta of every change. Statements build a
+# 'delta' CTE (directly or from a 'changes' CTE of grade changes via
+# _GRADE_CHANGE_DELTA) followed by the _GPA_DELTA_UPSERT CTEs.
+_GRADE_CHANGE_DELTA = '''
+    delta AS (
+        SELECT ch.student_id, cs.semester, cs.year,
+               SUM((COALESCE(ng.points, 0) - COALESCE(og.points, 0)) * c.credits) AS quality_points,
+               SUM(((ng.grade IS NOT NULL)::int - (og.grade IS NOT NULL)::int) * c.credits) AS graded_credits
+        FROM changes ch
+        JOIN course_sections cs ON cs.id = ch.section_id
+        JOIN courses c ON c.id = cs.course_id
+        LEFT JOIN grade_points og ON og.grade = ch.old_grade
+        LEFT JOIN grade_points ng ON ng.grade = ch.new_grade
+        GROUP BY ch.student_id, cs.semester, cs.year
+    ),
+'''
+
+_GPA_DELTA_UPSERT = '''
+    terms AS (
+        INSERT INTO student_gpa_terms (student_id, semester, year, quality_points, graded_credits)
+        SELECT student_id, semester, year, quality_points, graded_credits FROM delta
+        ON CONFLICT (student_id, semester, year) DO UPDATE
+        SET quality_points = student_gpa_terms.quality_points + EXCLUDED.quality_points,
+            graded_credits = student_gpa_terms.graded_credits + EXCLUDED.graded_credits
+    ),
+    totals AS (
+        INSERT INTO student_gpa (student_id, quality_points, graded_credits)
+        SELECT student_id, SUM(quality_points), SUM(graded_credits) FROM delta GROUP BY student_id
+        ON CONFLICT (student_id) DO UPDATE
+        SET quality_points = student_gpa.quality_points + EXCLUDED.quality_points,
+            graded_credits = student_gpa.graded_credits + EXCLUDED.graded_credits
+    )
+'''
+
+def _apply_grade_changes(cursor, changes):
+    """Update GPA aggregates for (student_id, section_id, old_grade, new_grade) rows"""
+    changes = [change for change in changes if change[2] != change[3]]
+    if not changes:
+        return
+    
+    execute_values(cursor, '''
+        WITH changes (student_id, section_id, old_grade, new_grade) AS (VALUES %s),
+    ''' + _GRADE_CHANGE_DELTA + _GPA_DELTA_UPSERT + '''
+        SELECT COUNT(*) AS students FROM delta
+    ''', changes, template='(%s::uuid, %s::uuid, %s::varchar, %s::varchar)', page_size=len(changes))
+
+# Terms in calendar order
+SEMESTERS = ['Spring', 'Summer', 'Fall']
+
+# The announcement feed covers sections of the current term and the one before it
+FEED_TERMS = 2
+
+def _copy_rows(cursor, table, columns, rows):
+    """Bulk load rows with COPY; None becomes NULL"""
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    buffer.seek(0)
+    cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buffer)
+
+def _load_schedules(cursor, student_ids, section_ids):
+    """Students' enrollments and the meetings of those and the given sections.
+    
+    Returns ({student_id: [(section_id, semester, year)]}, {section_id: [(days, start, end)]}).
+    """
+    cursor.execute('''
+        SELECT e.student_id, e.section_id, cs.semester, cs.year
+        FROM enrollments e
+        JOIN course_sections cs ON e.section_id = cs.id
+        WHERE e.student_id = ANY(%s::uuid[])
+    ''', (list(student_ids),))
+    taken = {}
+    for row in cursor.fetchall():
+        taken.setdefault(str(row['student_id']), []).append(
+            (str(row['section_id']), row['semester'], row['year']))
+    
+    cursor.execute('''
+        SELECT section_id, days, start_minute, end_minute
+        FROM section_meetings
+        WHERE section_id = ANY(%s::uuid[])
+    ''', (list(section_ids) + [sid for rows in taken.values() for sid, _, _ in rows],))
+    meetings = {}
+    for row in cursor.fetchall():
+        meetings.setdefault(str(row['section_id']), []).append(
+            (row['days'], row['start_minute'], row['end_minute']))
+    return taken, meetings
+
+def _refusal(section_id, section, current, meetings):
+    """Why a student with these enrollments cannot take the section, or None"""
+    if not section or section['status'] != 'open':
+        return "Section not available"
+    if any(sid == section_id for sid, _, _ in current):
+        return "Already enrolled"
+    if any(semester == section['semester'] and year == section['year'] and
+           schedules_conflict(meetings.get(sid, []), meetings.get(section_id, []))
+           for sid, semester, year in current):
+        return "Time conflict with another course"
+    if section['current_enrollment'] >= section['max_capacity']:
+        return "Section is full"
+    return None
+
+def _insert_enrollments(cursor, new_enrollments, sections):
+    """Insert (student_id, section_id) rows and store the sections' updated seat counts"""
+    execute_values(cursor, '''
+        INSERT INTO enrollments (student_id, section_id) VALUES %s
+    ''', new_enrollments, template='(%s::uuid, %s::uuid)', page_size=len(new_enrollments))
+    
+    touched = {section_id for _, section_id in new_enrollments}
+    execute_values(cursor, '''
+        UPDATE course_sections cs
+        SET current_enrollment = v.current_enrollment
+        FROM (VALUES %s) AS v(id, current_enrollment)
+        WHERE cs.id = v.id
+    ''', [(sid, sections[sid]['current_enrollment']) for sid in touched],
+       template='(%s::uuid, %s)', page_size=len(touched))
+
+def _promote_waitlists(cursor, section_ids=None):
+    """Fill free seats from the waitlists of the given sections (all sections by default).
+    
+    Runs in the caller's transaction so a drop or capacity change and the promotions
+    it allows commit together. Returns the number of students enrolled.
+    """
+    params = {'all': section_ids is None, 'ids': list(section_ids or [])}
+    # Same lock order as the enrollment worker: section rows by id
+    cursor.execute('''
+        SELECT id, status, semester, year, current_enrollment, max_capacity
+        FROM course_sections cs
+        WHERE (%(all)s OR cs.id = ANY(%(ids)s::uuid[]))
+          AND cs.status = 'open' AND cs.current_enrollment < cs.max_capacity
+          AND EXISTS (SELECT 1 FROM waitlist_entries w
+                      WHERE w.section_id = cs.id AND w.status = 'waiting')
+        ORDER BY cs.id
+        FOR UPDATE
+    ''', params)
+    sections = {str(row['id']): dict(row) for row in cursor.fetchall()}
+    if not sections:
+        return 0
+    
+    cursor.execute('''
+        SELECT id, student_id, section_id
+        FROM waitlist_entries
+        WHERE section_id = ANY(%s::uuid[]) AND status = 'waiting'
+        ORDER BY created_at, id
+        FOR UPDATE
+    ''', (list(sections),))
+    entries = cursor.fetchall()
+    taken, meetings = _load_schedules(cursor, {str(e['student_id']) for e in entries}, sections)
+    
+    results = []
+    new_enrollments = []
+    for entry in entries:
+        student_id, section_id = str(entry['student_id']), str(entry['section_id'])
+        section = sections[section_id]
+        if section['current_enrollment'] >= section['max_capacity']:
+            continue
+        
+        current = taken.setdefault(student_id, [])
+        reason = _refusal(section_id, section, current, meetings)
+        if reason:
+            results.append((str(entry['id']), 'removed', reason))
+        else:
+            section['current_enrollment'] += 1
+            current.append((section_id, section['semester'], section['year']))
+            new_enrollments.append((student_id, section_id))
+            results.append((str(entry['id']), 'enrolled', None))
+    
+    if new_enrollments:
+        _insert_enrollments(cursor, new_enrollments, sections)
+    if results:
+        execute_values(cursor, '''
+            UPDATE waitlist_entries w
+            SET status = v.status, reason = v.reason, processed_at = CURRENT_TIMESTAMP
+            FROM (VALUES %s) AS v(id, status, reason)
+            WHERE w.id = v.id
+        ''', results, template='(%s::uuid, %s, %s)', page_size=len(results))
+    return len(new_enrollments)
+
+def _booking_conflicts(cursor, professor_id, semester, year, room, meetings):
+    """Sections already holding the room or the professor during any of the meetings"""
+    return _booking_conflicts_many(cursor, [(professor_id, semester, year, room, meetings)])[0]
+
+def _booking_conflicts_many(cursor, sections):
+    """_booking_conflicts for many (professor_id, semester, year, room, meetings) at once, in one query"""
+    slots = [(position, day, start, end)
+             for position, (_, _, _, _, meetings) in enumerate(sections)
+             for days, start, end in meetings
+             for day in range(len(DAY_BITS)) if days & (1 << day)]
+    conflicts = [[] for _ in sections]
+    if not slots:
+        return conflicts
+    
+    # Matches section_bookings rows on every column of its exclusion constraint's GiST index
+    cursor.execute('''
+        SELECT DISTINCT w.position, b.kind, c.course_code, cs.section_number, cs.schedule, cs.room
+        FROM unnest(%(positions)s::int[], %(days)s::smallint[], %(starts)s::int[], %(ends)s::int[])
+             AS w(position, day, start_minute, end_minute)
+        JOIN unnest(%(professors)s::text[], %(rooms)s::text[], %(semesters)s::text[], %(years)s::int[])
+             WITH ORDINALITY AS s(professor_id, room, semester, year, ordinal) ON s.ordinal = w.position + 1
+        CROSS JOIN LATERAL (VALUES ('professor', s.professor_id), ('room', booking_room(s.room))) AS r(kind, resource)
+        JOIN section_bookings b ON b.kind = r.kind AND b.resource = r.resource
+                               AND b.year = s.year AND b.semester = s.semester AND b.day = w.day
+                               AND b.minutes && int4range(w.start_minute, w.end_minute)
+        JOIN course_sections cs ON cs.id = b.section_id
+        JOIN courses c ON c.id = cs.course_id
+        ORDER BY w.position, b.kind, c.course_code, cs.section_number
+    ''', {'positions': [slot[0] for slot in slots], 'days': [slot[1] for slot in slots],
+          'starts': [slot[2] for slot in slots], 'ends': [slot[3] for slot in slots],
+          'professors': [str(section[0]) for section in sections],
+          'semesters': [section[1] for section in sections],
+          'years': [section[2] for section in sections],
+          'rooms': [section[3] for section in sections]})
+    for row in cursor.fetchall():
+        conflict = dict(row)
+        conflicts[conflict.pop('position')].append(conflict)
+    return conflicts
+
+def _describe_conflict(conflict):
+    section = f"{conflict['course_code']}-{conflict['section_number']} ({conflict['schedule']})"
+    if conflict['kind'] == 'room':
+        return f"Room {conflict['room']} is already booked by {section}"
+    return f"The instructor already teaches {section} at that time"
 
 class User:
     def __init__(self, first_name, last_name, email, username, password, user_type):
@@ -155,7 +239,7 @@ class User:
         self.last_name = last_name.strip()
         self.email = email.lower().strip()
         self.username = username.strip()
-        self.password_hash = generate_password_hash(password) if password else None
+        self.password_hash = hash_password(password) if password else None
         self.user_type = user_type
         self.created_at = datetime.now()
         self.is_active = True
@@ -173,9 +257,14 @@ class User:
     
     @staticmethod
     def authenticate(username, password):
-        if not username or not password:
+        return User.check_login(User.get_login(username), password) if username else None
+    
+    @staticmethod
+    def get_login(username):
+        """Stored credentials for an active username, or None"""
+        if not username:
             return None
-            
+        
         db = Database()
         with db.get_connection() as conn:
             with conn.cursor() as cursor:
@@ -183,11 +272,30 @@ class User:
                     'SELECT id, password_hash, user_type FROM users WHERE username = %s AND is_active = TRUE', 
                     (username,)
                 )
-                user = cursor.fetchone()
-                
-                if user and check_password_hash(user['password_hash'], password):
-                    return {'id': str(user['id']), 'user_type': user['user_type']}
-                return None
+                return cursor.fetchone()
+    
+    @staticmethod
+    def check_login(login, password):
+        """The user from get_login if the password matches, else None"""
+        if not login or not password:
+            return None
+        
+        valid, upgraded_hash = verify_password(login['password_hash'], password)
+        if not valid:
+            return None
+        
+        if upgraded_hash:
+            # Stored hash predates the current policy; upgrade it transparently
+            db = Database()
+            with db.get_connection() as conn:
+                with conn.cursor() as cursor:
+                    cursor.execute(
+                        'UPDATE users SET password_hash = %s WHERE id = %s AND password_hash = %s',
+                        (upgraded_hash, login['id'], login['password_hash'])
+                    )
+                    conn.commit()
+        
+        return {'id': str(login['id']), 'user_type': login['user_type']}
     
     @staticmethod
     def get_by_id(user_id):
@@ -198,8 +306,41 @@ class User:
                 user = cursor.fetchone()
                 return dict(user) if user else None
     
+    # Users with their student or professor details, for listings
+    LISTING_SQL = '''
+        SELECT u.*, s.student_id, s.major, s.year_level, s.status,
+               p.department, p.position, p.office_location, p.phone
+        FROM users u
+        LEFT JOIN students s ON s.user_id = u.id
+        LEFT JOIN professors p ON p.user_id = u.id
+        WHERE u.is_active = TRUE
+    '''
+    PAGE_KEYS = [('u.last_name', 'last_name'), ('u.first_name', 'first_name'), ('u.id', 'id')]
+    
+    @staticmethod
+    def get_users_page(user_type=None, search=None, after=None, before=None, limit=DEFAULT_PAGE_SIZE):
+        """One page ordered by name, or by relevance when searching"""
+        if search:
+            return Search.page(lambda limit, offset: Search.users(search, user_type, limit, offset),
+                               after, before, limit)
+        
+        db = Database()
+        with db.get_connection() as conn:
+            with conn.cursor() as cursor:
+                query = User.LISTING_SQL
+                params = []
+                
+                if user_type:
+                    query += ' AND u.user_type = %s'
+                    params.append(user_type)
+                
+                return fetch_page(cursor, query, params, User.PAGE_KEYS, after, before, limit)
+    
     @staticmethod
     def get_all_users(user_type=None, search=None):
+        if search:
+            return Search.users(search, user_type)
+        
         db = Database()
         with db.get_connection() as conn:
             with conn.cursor() as cursor:
@@ -210,11 +351,6 @@ class User:
                     query += ' AND user_type = %s'
                     params.append(user_type)
                 
-                if search:
-                    query += ' AND (first_name ILIKE %s OR last_name ILIKE %s OR email ILIKE %s OR username ILIKE %s)'
-                    search_param = f'%{search}%'
-                    params.extend([search_param, search_param, search_param, search_param])
-                
                 cursor.execute(query, params)
                 users = cursor.fetchall()
                 return [dict(user) for user in users]
@@ -263,89 +399,210 @@ class Student(User):
                 student = cursor.fetchone()
                 return dict(student) if student else None
     
+    # Capacity check, seat decrement and enrollment insert in one statement.
+    # The conditional UPDATE re-checks capacity under the row lock, so
+    # concurrent enrollments can never oversubscribe a section. Meetings
+    # conflict when they share a day bit and their minute ranges intersect.
+    ENROLL_SQL = '''
+        WITH section AS (
+            SELECT id, status, semester, year
+            FROM course_sections WHERE id = %(section_id)s
+        ),
+        checks AS (
+            SELECT s.id,
+                   s.status <> 'open' AS not_open,
+                   EXISTS (
+                       SELECT 1 FROM enrollments e
+                       WHERE e.student_id = %(student_id)s AND e.section_id = s.id
+                   ) AS already_enrolled,
+                   EXISTS (
+                       SELECT 1
+                       FROM enrollments e
+                       JOIN course_sections cs ON e.section_id = cs.id
+                       JOIN section_meetings em ON em.section_id = cs.id
+                       JOIN section_meetings nm ON nm.section_id = s.id
+                       WHERE e.student_id = %(student_id)s
+                         AND cs.semester = s.semester AND cs.year = s.year
+                         AND (em.days & nm.days) <> 0
+                         AND em.start_minute < nm.end_minute
+                         AND nm.start_minute < em.end_minute
+                   ) AS time_conflict
+            FROM section s
+        ),
+        seat AS (
+            UPDATE course_sections cs
+            SET current_enrollment = cs.current_enrollment + 1
+            FROM checks c
+            WHERE cs.id = c.id
+              AND NOT c.not_open AND NOT c.already_enrolled AND NOT c.time_conflict
+              AND cs.status = 'open'
+              AND cs.current_enrollment < cs.max_capacity
+            RETURNING cs.id
+        ),
+        enrolled AS (
+            INSERT INTO enrollments (student_id, section_id, enrollment_date)
+            SELECT %(student_id)s::uuid, id, CURRENT_DATE FROM seat
+            ON CONFLICT (student_id, section_id) DO NOTHING
+            RETURNING id
+        )
+        SELECT c.not_open, c.already_enrolled, c.time_conflict,
+               EXISTS (SELECT 1 FROM seat) AS seat_taken,
+               (SELECT id FROM enrolled) AS enrollment_id
+        FROM checks c
+    '''
+    
+    def _enroll(self, cursor, section_id):
+        cursor.execute(self.ENROLL_SQL, {'student_id': self.id, 'section_id': section_id})
+        result = cursor.fetchone()
+        
+        if not result or result['not_open']:
+            raise Exception("Section not available")
+        if result['already_enrolled']:
+            raise Exception("Already enrolled")
+        if result['time_conflict']:
+            raise Exception("Time conflict with another course")
+        if not result['seat_taken']:
+            raise Exception("Section is full")
+        if not result['enrollment_id']:
+            # Lost a race with a concurrent request; raising rolls back the seat
+            raise Exception("Already enrolled")
+        return str(result['enrollment_id'])
+    
     def enroll_in_section(self, section_id):
+        """Enroll atomically; raises with the reason when enrollment is refused"""
         db = Database()
         with db.get_connection() as conn:
             with conn.cursor() as cursor:
-                # Check if section exists and has space
-                cursor.execute('''
-                    SELECT current_enrollment, max_capacity, status
-                    FROM course_sections WHERE id = %s
-                ''', (section_id,))
-                section = cursor.fetchone()
-                
-                if not section or section['status'] != 'open':
-                    raise Exception("Section not available")
-                
-                if section['current_enrollment'] >= section['max_capacity']:
-                    raise Exception("Section is full")
-                
-                # Check if already enrolled
-                cursor.execute(
-                    'SELECT id FROM enrollments WHERE student_id = %s AND section_id = %s', 
-                    (self.id, section_id)
-                )
-                if cursor.fetchone():
-                    raise Exception("Already enrolled")
-                
-                # Simple time conflict check
-                if self.has_time_conflict(section_id):
-                    raise Exception("Time conflict with another course")
-                
-                # Enroll student
-                cursor.execute('''
-                    INSERT INTO enrollments (student_id, section_id, enrollment_date)
-                    VALUES (%s, %s, %s)
-                ''', (self.id, section_id, datetime.now().date()))
-                
-                # Update enrollment count
-                cursor.execute('''
-                    UPDATE course_sections 
-                    SET current_enrollment = current_enrollment + 1 
-                    WHERE id = %s
-                ''', (section_id,))
-                
+                enrollment_id = self._enroll(cursor, section_id)
                 conn.commit()
+                return enrollment_id
     
-    def has_time_conflict(self, new_section_id):
-        """Simple time conflict check"""
+    def enroll_in_sections(self, section_ids):
+        """Enroll in all of the sections or none of them (e.g. a schedule builder result)"""
         db = Database()
         with db.get_connection() as conn:
             with conn.cursor() as cursor:
-                cursor.execute('''
-                    SELECT schedule, semester, year FROM course_sections WHERE id = %s
-                ''', (new_section_id,))
-                new_section = cursor.fetchone()
-                
-                if not new_section:
-                    return False
+                # Sections are locked in id order so concurrent requests cannot deadlock
+                enrollment_ids = []
+                for section_id in sorted(set(section_ids)):
+                    try:
+                        enrollment_ids.append(self._enroll(cursor, section_id))
+                    except Exception as e:
+                        cursor.execute('''
+                            SELECT c.course_code, cs.section_number FROM course_sections cs
+                            JOIN courses c ON cs.course_id = c.id WHERE cs.id = %s
+                        ''', (section_id,))
+                        section = cursor.fetchone()
+                        name = f"{section['course_code']}-{section['section_number']}" if section else section_id
+                        raise Exception(f"{name}: {e}")
                 
+                conn.commit()
+                return enrollment_ids
+    
+    MAX_SCHEDULE_COURSES = 8
+    MAX_SCHEDULES = 50
+    
+    def build_schedules(self, course_codes, limit=10):
+        """Best conflict-free combinations of open sections of the given courses this term.
+        
+        Sections that meet at the same times are grouped: each entry lists the section with
+        the most free seats first. The student's current enrollments count as busy time.
+        """
+        codes = list(dict.fromkeys(code.strip().upper() for code in course_codes if code.strip()))
+        if not codes:
+            raise Exception("Enter at least one course code")
+        if len(codes) > self.MAX_SCHEDULE_COURSES:
+            raise Exception(f"At most {self.MAX_SCHEDULE_COURSES} courses at a time")
+        semester, year = Utils.get_current_semester()
+        
+        db = Database()
+        with db.get_connection() as conn:
+            with conn.cursor() as cursor:
                 cursor.execute('''
-                    SELECT cs.schedule
+                    SELECT m.days, m.start_minute, m.end_minute, c.course_code
                     FROM enrollments e
                     JOIN course_sections cs ON e.section_id = cs.id
+                    JOIN courses c ON cs.course_id = c.id
+                    LEFT JOIN section_meetings m ON m.section_id = cs.id
                     WHERE e.student_id = %s AND cs.semester = %s AND cs.year = %s
-                ''', (self.id, new_section['semester'], new_section['year']))
-                
-                current_schedules = cursor.fetchall()
+                ''', (self.id, semester, year))
+                enrolled = cursor.fetchall()
                 
-                # Simple overlap check - if days overlap, assume conflict
-                new_days = new_section['schedule'].split(' ')[0] if ' ' in new_section['schedule'] else ''
-                for current in current_schedules:
-                    current_days = current['schedule'].split(' ')[0] if ' ' in current['schedule'] else ''
-                    if any(day in current_days for day in new_days):
-                        return True
+                cursor.execute('''
+                    SELECT cs.id, c.course_code, c.title, c.credits, cs.section_number,
+                           cs.schedule, cs.room, cs.max_capacity - cs.current_enrollment AS seats_left,
+                           u.first_name, u.last_name,
+                           COALESCE((
+                               SELECT json_agg(json_build_array(m.days, m.start_minute, m.end_minute))
+                               FROM section_meetings m WHERE m.section_id = cs.id
+                           ), '[]') AS meetings
+                    FROM course_sections cs
+                    JOIN courses c ON cs.course_id = c.id
+                    JOIN users u ON cs.professor_id = u.id
+                    WHERE upper(c.course_code) = ANY(%s) AND cs.semester = %s AND cs.year = %s
+                      AND cs.status = 'open' AND cs.current_enrollment < cs.max_capacity
+                    ORDER BY c.course_code, seats_left DESC, cs.section_number
+                ''', (codes, semester, year))
+                sections = [dict(row) for row in cursor.fetchall()]
+        
+        already = {row['course_code'].upper() for row in enrolled} & set(codes)
+        if already:
+            raise Exception(f"Already enrolled in {', '.join(sorted(already))}")
+        
+        busy = week_mask([(row['days'], row['start_minute'], row['end_minute'])
+                          for row in enrolled if row['days'] is not None])
+        # Identical meeting times are one option; the search only branches on distinct times
+        options = {code: {} for code in codes}
+        for section in sections:
+            section['id'] = str(section['id'])
+            mask = week_mask(tuple(meeting) for meeting in section.pop('meetings'))
+            options[section['course_code'].upper()].setdefault(mask, []).append(section)
+        
+        missing = [code for code in codes if not options[code]]
+        if missing:
+            raise Exception(f"No open sections with seats for {', '.join(missing)}")
+        
+        limit = max(1, min(limit, self.MAX_SCHEDULES))
+        results = build_schedules([list(options[code].items()) for code in codes], busy, limit)
+        return [{'days': days, 'idle_minutes': idle, 'sections': groups}
+                for (days, idle, _), groups in results]
+    
+    def has_time_conflict(self, new_section_id):
+        """Whether any meeting of the section overlaps one of this term's enrollments"""
+        db = Database()
+        with db.get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute('''
+                    SELECT EXISTS (
+                        SELECT 1
+                        FROM course_sections ns
+                        JOIN section_meetings nm ON nm.section_id = ns.id
+                        JOIN course_sections cs ON cs.semester = ns.semester AND cs.year = ns.year
+                                               AND cs.id <> ns.id
+                        JOIN enrollments e ON e.section_id = cs.id AND e.student_id = %s
+                        JOIN section_meetings em ON em.section_id = cs.id
+                        WHERE ns.id = %s
+                          AND (em.days & nm.days) <> 0
+                          AND em.start_minute < nm.end_minute
+                          AND nm.start_minute < em.end_minute
+                    ) AS conflict
+                ''', (self.id, new_section_id))
                 
-                return False
+                return cursor.fetchone()['conflict']
     
     def drop_course(self, section_id):
         db = Database()
         with db.get_connection() as conn:
             with conn.cursor() as cursor:
                 cursor.execute(
-                    'DELETE FROM enrollments WHERE student_id = %s AND section_id = %s',
+                    'DELETE FROM enrollments WHERE student_id = %s AND section_id = %s RETURNING grade',
                     (self.id, section_id)
                 )
+                dropped = cursor.fetchone()
+                if not dropped:
+                    raise Exception("Not enrolled in this section")
+                if dropped['grade']:
+                    _apply_grade_changes(cursor, [(self.id, section_id, dropped['grade'], None)])
                 
                 cursor.execute('''
                     UPDATE course_sections 
@@ -353,6 +610,8 @@ class Student(User):
                     WHERE id = %s
                 ''', (section_id,))
                 
+                # Hand the freed seat to the waitlist in the same transaction
+                _promote_waitlists(cursor, [section_id])
                 conn.commit()
     
     def get_class_schedule(self, semester, year):
@@ -362,7 +621,15 @@ class Student(User):
             with conn.cursor() as cursor:
                 cursor.execute('''
                     SELECT c.course_code, c.title, c.credits, cs.section_number, 
-                           cs.schedule, cs.room, u.first_name, u.last_name, e.grade
+                           cs.schedule, cs.room, u.first_name, u.last_name, e.grade,
+                           COALESCE((
+                               SELECT json_agg(json_build_object(
+                                          'days', m.days,
+                                          'start_minute', m.start_minute,
+                                          'end_minute', m.end_minute)
+                                      ORDER BY m.start_minute)
+                               FROM section_meetings m WHERE m.section_id = cs.id
+                           ), '[]') AS meetings
                     FROM enrollments e
                     JOIN course_sections cs ON e.section_id = cs.id
                     JOIN courses c ON cs.course_id = c.id
@@ -381,35 +648,302 @@ class Student(User):
             with conn.cursor() as cursor:
                 cursor.execute('''
                     SELECT c.course_code, c.title, c.credits, cs.semester, cs.year, 
-                           e.grade, u.first_name, u.last_name
+                           e.grade, gp.points AS grade_points, u.first_name, u.last_name
                     FROM enrollments e
                     JOIN course_sections cs ON e.section_id = cs.id
                     JOIN courses c ON cs.course_id = c.id
                     JOIN professors p ON cs.professor_id = p.user_id
                     JOIN users u ON p.user_id = u.id
+                    LEFT JOIN grade_points gp ON gp.grade = e.grade
                     WHERE e.student_id = %s
                     ORDER BY cs.year DESC, cs.semester DESC, c.course_code
                 ''', (self.id,))
                 
                 return [dict(row) for row in cursor.fetchall()]
     
-    def get_announcements(self):
-        """Get announcements for enrolled courses"""
+    def get_announcements(self, before=None, since=None, limit=10):
+        """Announcement summaries for the student's sections of recent terms, newest first.
+
+        Returns {'items', 'next', 'latest'}: pass 'next' as before to load older
+        items and 'latest' as since to fetch only items posted after this page
+        (with both, older items of a long run of new ones).
+        """
+        # Bounded to recent terms so the cost doesn't grow with every section ever taken
+        terms = Utils.recent_terms(FEED_TERMS)
+        params = {'student_id': self.id, 'limit': limit + 1,
+                  'semesters': [term[0] for term in terms], 'years': [term[1] for term in terms]}
+        conditions = ''
+        
+        before_key = decode_cursor(before, 2) if before else None
+        if before_key:
+            conditions += ' AND (a.created_at, a.id) < (%(before_at)s::timestamp, %(before_id)s::uuid)'
+            params.update(before_at=before_key[0], before_id=before_key[1])
+        
+        since_key = decode_cursor(since, 2) if since else None
+        if since_key:
+            conditions += ' AND (a.created_at, a.id) > (%(since_at)s::timestamp, %(since_id)s::uuid)'
+            params.update(since_at=since_key[0], since_id=since_key[1])
+        
+        db = Database()
+        with db.get_connection() as conn:
+            with conn.cursor() as cursor:
+                # Newest few per section from the feed index, then merged
+                cursor.execute('''
+                    SELECT a.id, a.title, a.summary, a.created_at, c.course_code, c.title AS course_title
+                    FROM enrollments e
+                    JOIN course_sections cs ON cs.id = e.section_id
+                    JOIN courses c ON c.id = cs.course_id
+                    CROSS JOIN LATERAL (
+                        SELECT a.id, a.title, a.summary, a.created_at
+                        FROM announcements a
+                        WHERE a.section_id = cs.id''' + conditions + '''
+                        ORDER BY a.created_at DESC, a.id DESC
+                        LIMIT %(limit)s
+                    ) a
+                    WHERE e.student_id = %(student_id)s
+                      AND (cs.semester, cs.year) IN (SELECT * FROM unnest(%(semesters)s::text[], %(years)s::int[]))
+                    ORDER BY a.created_at DESC, a.id DESC
+                    LIMIT %(limit)s
+                ''', params)
+                rows = [dict(row) for row in cursor.fetchall()]
+        
+        items = rows[:limit]
+        feed = {'items': items, 'next': None, 'latest': since}
+        if items:
+            feed['latest'] = encode_cursor([items[0]['created_at'], items[0]['id']])
+        if len(rows) > limit:
+            feed['next'] = encode_cursor([items[-1]['created_at'], items[-1]['id']])
+        return feed
+    
+    def get_announcement(self, announcement_id):
+        """Full announcement, if it was posted to one of the student's sections"""
         db = Database()
         with db.get_connection() as conn:
             with conn.cursor() as cursor:
                 cursor.execute('''
-                    SELECT a.title, a.content, a.created_at, c.course_code, c.title as course_title
+                    SELECT a.id, a.title, a.content, a.created_at, c.course_code, c.title AS course_title
                     FROM announcements a
-                    JOIN course_sections cs ON a.section_id = cs.id
+                    JOIN enrollments e ON e.section_id = a.section_id AND e.student_id = %s
+                    JOIN course_sections cs ON cs.id = a.section_id
+                    JOIN courses c ON c.id = cs.course_id
+                    WHERE a.id = %s
+                ''', (self.id, announcement_id))
+                announcement = cursor.fetchone()
+                return dict(announcement) if announcement else None
+
+class EnrollmentQueue:
+    """Postgres-backed enrollment queue for registration rushes"""
+    
+    @staticmethod
+    def submit(student_id, section_id):
+        """Queue an enrollment request; resubmitting returns the pending request"""
+        db = Database()
+        with db.get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute('''
+                    INSERT INTO enrollment_requests (student_id, section_id)
+                    VALUES (%s, %s)
+                    ON CONFLICT (student_id, section_id) WHERE status = 'pending'
+                    DO UPDATE SET student_id = EXCLUDED.student_id
+                    RETURNING id
+                ''', (student_id, section_id))
+                request_id = cursor.fetchone()['id']
+                conn.commit()
+                return str(request_id)
+    
+    @staticmethod
+    def get_status(request_id, student_id):
+        db = Database()
+        with db.get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute('''
+                    SELECT r.id, r.section_id, r.status, r.reason, r.created_at, r.processed_at,
+                           c.course_code, c.title, cs.section_number,
+                           (SELECT COUNT(*) FROM enrollment_requests p
+                            WHERE p.section_id = r.section_id AND p.status = 'pending'
+                              AND p.created_at < r.created_at) AS queue_position
+                    FROM enrollment_requests r
+                    JOIN course_sections cs ON r.section_id = cs.id
                     JOIN courses c ON cs.course_id = c.id
-                    JOIN enrollments e ON cs.id = e.section_id
-                    WHERE e.student_id = %s
-                    ORDER BY a.created_at DESC
-                    LIMIT 10
-                ''', (self.id,))
+                    WHERE r.id = %s AND r.student_id = %s
+                ''', (request_id, student_id))
+                
+                row = cursor.fetchone()
+                return dict(row) if row else None
+    
+    @staticmethod
+    def process_batch(batch_size=500):
+        """Allocate seats for one batch of pending requests; returns how many were processed"""
+        db = Database()
+        with db.get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute('''
+                    SELECT id, student_id, section_id
+                    FROM enrollment_requests
+                    WHERE status = 'pending'
+                    ORDER BY created_at
+                    LIMIT %s
+                    FOR UPDATE SKIP LOCKED
+                ''', (batch_size,))
+                requests = cursor.fetchall()
+                if not requests:
+                    return 0
+                
+                section_ids = sorted({str(r['section_id']) for r in requests})
+                student_ids = {str(r['student_id']) for r in requests}
+                
+                # One lock per section for the whole batch, taken in a fixed order
+                cursor.execute('''
+                    SELECT id, status, semester, year, current_enrollment, max_capacity
+                    FROM course_sections
+                    WHERE id = ANY(%s::uuid[])
+                    ORDER BY id
+                    FOR UPDATE
+                ''', (section_ids,))
+                sections = {str(row['id']): dict(row) for row in cursor.fetchall()}
+                taken, meetings = _load_schedules(cursor, student_ids, section_ids)
+                
+                results = []
+                new_enrollments = []
+                for r in requests:
+                    student_id, section_id = str(r['student_id']), str(r['section_id'])
+                    section = sections.get(section_id)
+                    current = taken.setdefault(student_id, [])
+                    
+                    reason = _refusal(section_id, section, current, meetings)
+                    if reason:
+                        results.append((str(r['id']), 'rejected', reason))
+                    else:
+                        section['current_enrollment'] += 1
+                        current.append((section_id, section['semester'], section['year']))
+                        new_enrollments.append((student_id, section_id))
+                        results.append((str(r['id']), 'enrolled', None))
+                
+                if new_enrollments:
+                    _insert_enrollments(cursor, new_enrollments, sections)
                 
+                execute_values(cursor, '''
+                    UPDATE enrollment_requests r
+                    SET status = v.status, reason = v.reason, processed_at = CURRENT_TIMESTAMP
+                    FROM (VALUES %s) AS v(id, status, reason)
+                    WHERE r.id = v.id
+                ''', results, template='(%s::uuid, %s, %s)', page_size=len(results))
+                
+                conn.commit()
+                return len(requests)
+
+class Waitlist:
+    """Ordered per-section queues filled automatically as seats free up"""
+    
+    @staticmethod
+    def join(student_id, section_id):
+        """Join a section's waitlist; returns the entry's status, reason and queue position.
+        
+        A seat that is already free is taken at once ('enrolled'); the entry may also be
+        'removed' right away, with the reason, e.g. a time conflict.
+        """
+        db = Database()
+        with db.get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute('''
+                    SELECT cs.status,
+                           EXISTS (SELECT 1 FROM enrollments e
+                                   WHERE e.student_id = %(student_id)s AND e.section_id = cs.id) AS enrolled
+                    FROM course_sections cs WHERE cs.id = %(section_id)s
+                ''', {'student_id': student_id, 'section_id': section_id})
+                section = cursor.fetchone()
+                if not section or section['status'] != 'open':
+                    raise Exception("Section not available")
+                if section['enrolled']:
+                    raise Exception("Already enrolled")
+                
+                cursor.execute('''
+                    INSERT INTO waitlist_entries (student_id, section_id)
+                    VALUES (%s, %s)
+                    ON CONFLICT (student_id, section_id) WHERE status = 'waiting' DO NOTHING
+                ''', (student_id, section_id))
+                
+                # A seat may have freed since the page was rendered
+                _promote_waitlists(cursor, [section_id])
+                
+                # Only one entry per student can be waiting, so the newest one is this join's
+                cursor.execute('''
+                    SELECT w.status, w.reason,
+                           CASE WHEN w.status = 'waiting' THEN
+                               1 + (SELECT COUNT(*) FROM waitlist_entries p
+                                    WHERE p.section_id = w.section_id AND p.status = 'waiting'
+                                      AND (p.created_at, p.id) < (w.created_at, w.id))
+                           END AS position
+                    FROM waitlist_entries w
+                    WHERE w.student_id = %s AND w.section_id = %s
+                    ORDER BY w.created_at DESC, w.id DESC
+                    LIMIT 1
+                ''', (student_id, section_id))
+                entry = dict(cursor.fetchone())
+                conn.commit()
+                return entry
+    
+    @staticmethod
+    def leave(student_id, section_id):
+        db = Database()
+        with db.get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute('''
+                    UPDATE waitlist_entries SET status = 'left', processed_at = CURRENT_TIMESTAMP
+                    WHERE student_id = %s AND section_id = %s AND status = 'waiting'
+                ''', (student_id, section_id))
+                if cursor.rowcount == 0:
+                    raise Exception("Not on the waitlist for this section")
+                conn.commit()
+    
+    @staticmethod
+    def position(student_id, section_id):
+        """1-based place in the section's queue, or None if not waiting"""
+        db = Database()
+        with db.get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute('''
+                    SELECT 1 + (SELECT COUNT(*) FROM waitlist_entries p
+                                WHERE p.section_id = w.section_id AND p.status = 'waiting'
+                                  AND (p.created_at, p.id) < (w.created_at, w.id)) AS position
+                    FROM waitlist_entries w
+                    WHERE w.student_id = %s AND w.section_id = %s AND w.status = 'waiting'
+                ''', (student_id, section_id))
+                row = cursor.fetchone()
+                return row['position'] if row else None
+    
+    @staticmethod
+    def get_student_entries(student_id):
+        """Sections the student is waiting for with queue positions, plus recent outcomes"""
+        db = Database()
+        with db.get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute('''
+                    SELECT w.section_id, w.status, w.reason, w.created_at, w.processed_at,
+                           c.course_code, c.title, cs.section_number,
+                           CASE WHEN w.status = 'waiting' THEN
+                               1 + (SELECT COUNT(*) FROM waitlist_entries p
+                                    WHERE p.section_id = w.section_id AND p.status = 'waiting'
+                                      AND (p.created_at, p.id) < (w.created_at, w.id))
+                           END AS position
+                    FROM waitlist_entries w
+                    JOIN course_sections cs ON w.section_id = cs.id
+                    JOIN courses c ON cs.course_id = c.id
+                    WHERE w.student_id = %s
+                      AND (w.status = 'waiting' OR w.processed_at > CURRENT_TIMESTAMP - INTERVAL '7 days')
+                    ORDER BY w.status <> 'waiting', w.created_at
+                ''', (student_id,))
                 return [dict(row) for row in cursor.fetchall()]
+    
+    @staticmethod
+    def promote(section_ids=None):
+        """Sweep waitlists (all sections by default) in one transaction; returns students enrolled"""
+        db = Database()
+        with db.get_connection() as conn:
+            with conn.cursor() as cursor:
+                promoted = _promote_waitlists(cursor, section_ids)
+                conn.commit()
+                return promoted
 
 class Professor(User):
     def __init__(self, first_name, last_name, email, username, password, department, 
@@ -450,9 +984,15 @@ class Professor(User):
     
     def create_course_section(self, course_id, section_number, semester, year, 
                             schedule, room=None, max_capacity=30):
+        meetings = parse_schedule(schedule)
+        
         db = Database()
         with db.get_connection() as conn:
             with conn.cursor() as cursor:
+                conflicts = _booking_conflicts(cursor, self.id, semester, year, room, meetings)
+                if conflicts:
+                    raise Exception('; '.join(_describe_conflict(conflict) for conflict in conflicts))
+                
                 section_id = str(uuid.uuid4())
                 cursor.execute('''
                     INSERT INTO course_sections (id, course_id, professor_id, section_number, 
@@ -460,9 +1000,43 @@ class Professor(User):
                     VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
                 ''', (section_id, course_id, self.id, section_number, semester, year, 
                       schedule, room, max_capacity))
+                
+                if meetings:
+                    try:
+                        execute_values(cursor, '''
+                            INSERT INTO section_meetings (section_id, days, start_minute, end_minute)
+                            VALUES %s
+                        ''', [(section_id, *meeting) for meeting in meetings])
+                    except errors.ExclusionViolation:
+                        # Another section took the slot after the check above
+                        raise Exception("Room or instructor was just booked at that time; please try again")
+                
                 conn.commit()
                 return section_id
     
+    def update_section_capacity(self, section_id, max_capacity):
+        """Resize one of this professor's sections; added seats go to its waitlist"""
+        db = Database()
+        with db.get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute('''
+                    SELECT current_enrollment FROM course_sections
+                    WHERE id = %s AND professor_id = %s
+                    FOR UPDATE
+                ''', (section_id, self.id))
+                section = cursor.fetchone()
+                if not section:
+                    raise Exception("Section not found")
+                if max_capacity < max(section['current_enrollment'], 1):
+                    raise Exception(f"Capacity cannot be below current enrollment ({section['current_enrollment']})")
+                
+                cursor.execute('UPDATE course_sections SET max_capacity = %s WHERE id = %s',
+                               (max_capacity, section_id))
+                
+                promoted = _promote_waitlists(cursor, [section_id])
+                conn.commit()
+                return promoted
+    
     def get_teaching_sections(self, semester=None, year=None):
         db = Database()
         with db.get_connection() as conn:
@@ -484,6 +1058,14 @@ class Professor(User):
                 cursor.execute(query, params)
                 return [dict(row) for row in cursor.fetchall()]
     
+    def owns_section(self, section_id):
+        db = Database()
+        with db.get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute('SELECT 1 FROM course_sections WHERE id = %s AND professor_id = %s',
+                               (section_id, self.id))
+                return cursor.fetchone() is not None
+    
     def get_section_students(self, section_id):
         db = Database()
         with db.get_connection() as conn:
@@ -500,16 +1082,72 @@ class Professor(User):
                 return [dict(row) for row in cursor.fetchall()]
     
     def submit_grades(self, section_id, student_grades):
-        """Submit grades - simplified"""
+        """Apply {enrollment_id: grade} for one of this professor's sections in one statement"""
+        if not student_grades:
+            return {'matched': 0, 'updated': 0}
+        
         db = Database()
         with db.get_connection() as conn:
             with conn.cursor() as cursor:
-                for enrollment_id, grade in student_grades.items():
-                    cursor.execute('''
-                        UPDATE enrollments SET grade = %s
-                        WHERE id = %s
-                    ''', (grade, enrollment_id))
+                cursor.execute('''
+                    WITH v AS (
+                        SELECT * FROM unnest(%(enrollment_ids)s::uuid[], %(grades)s::varchar[])
+                                 AS v(enrollment_id, grade)
+                    ),
+                    section AS (
+                        SELECT id FROM course_sections
+                        WHERE id = %(section_id)s AND professor_id = %(professor_id)s
+                    ),
+                    old AS (
+                        SELECT e.id, e.grade, v.grade AS new_grade
+                        FROM enrollments e
+                        JOIN section ON e.section_id = section.id
+                        JOIN v ON v.enrollment_id = e.id
+                        FOR UPDATE OF e
+                    ),
+                    changes AS (
+                        UPDATE enrollments e SET grade = old.new_grade
+                        FROM old
+                        WHERE e.id = old.id AND old.grade IS DISTINCT FROM old.new_grade
+                        RETURNING e.student_id, e.section_id, old.grade AS old_grade, e.grade AS new_grade
+                    ),
+                ''' + _GRADE_CHANGE_DELTA + _GPA_DELTA_UPSERT + '''
+                    SELECT EXISTS (SELECT 1 FROM section) AS owned,
+                           (SELECT COUNT(*) FROM old) AS matched,
+                           (SELECT COUNT(*) FROM changes) AS updated
+                ''', {
+                    'enrollment_ids': list(student_grades.keys()),
+                    'grades': list(student_grades.values()),
+                    'section_id': section_id,
+                    'professor_id': self.id
+                })
+                result = cursor.fetchone()
+                
+                if not result['owned']:
+                    raise Exception("Section not found")
+                
                 conn.commit()
+                return {'matched': result['matched'], 'updated': result['updated']}
+    
+    def import_grades(self, section_id, grades_by_student):
+        """Apply {student number: grade}; returns the submit result and unknown student numbers"""
+        db = Database()
+        with db.get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute('''
+                    SELECT s.student_id, e.id AS enrollment_id
+                    FROM enrollments e
+                    JOIN students s ON e.student_id = s.user_id
+                    WHERE e.section_id = %s AND s.student_id = ANY(%s)
+                ''', (section_id, list(grades_by_student.keys())))
+                enrollment_ids = {row['student_id']: str(row['enrollment_id']) for row in cursor.fetchall()}
+        
+        unknown = sorted(code for code in grades_by_student if code not in enrollment_ids)
+        result = self.submit_grades(section_id, {
+            enrollment_ids[code]: grade for code, grade in grades_by_student.items()
+            if code in enrollment_ids
+        })
+        return result, unknown
     
     def create_announcement(self, section_id, title, content):
         """Create course announcement"""
@@ -539,26 +1177,410 @@ class Admin(User):
                 conn.commit()
     
     @staticmethod
-    def get_statistics():
+    def bulk_register_users(rows, workers=None, threads=False):
+        """Create students and professors from row dicts in a single transaction.
+        
+        Passwords are hashed across worker processes, or threads when threads is set
+        (for callers that must not fork, e.g. web workers). Returns (created count,
+        [(row index, error)]); rows with errors are skipped.
+        """
+        required = ['first_name', 'last_name', 'email', 'username', 'password', 'user_type']
+        # Column sizes; one over-long value would otherwise fail the whole transaction
+        limits = {'first_name': 100, 'last_name': 100, 'email': 255, 'username': 50, 'major': 100,
+                  'department': 100, 'position': 100, 'office_location': 100, 'office': 100, 'phone': 20}
+        errors = []
+        valid = []
+        seen_usernames = set()
+        seen_emails = set()
+        
+        for index, row in enumerate(rows):
+            row = {key: (value or '').strip() for key, value in row.items() if key}
+            row['email'] = row.get('email', '').lower()
+            missing = [field for field in required if not row.get(field)]
+            too_long = [field for field, limit in limits.items() if len(row.get(field, '')) > limit]
+            
+            if missing:
+                errors.append((index, f"missing {', '.join(missing)}"))
+            elif too_long:
+                errors.append((index, f"{', '.join(too_long)} too long"))
+            elif row['user_type'] not in ('student', 'professor'):
+                errors.append((index, f"invalid user_type {row['user_type']!r}"))
+            elif row['user_type'] == 'professor' and not row.get('department'):
+                errors.append((index, 'professors need a department'))
+            elif row['username'] in seen_usernames or row['email'] in seen_emails:
+                errors.append((index, 'duplicate username or email in file'))
+            else:
+                seen_usernames.add(row['username'])
+                seen_emails.add(row['email'])
+                valid.append((index, row))
+        
+        if not valid:
+            return 0, errors
+        
+        # Hashing dominates the cost; finish it before the transaction starts so the
+        # connection is not held idle meanwhile. Rows that turn out to be taken cost a hash.
+        hashes = hash_passwords([row['password'] for _, row in valid], workers, threads)
+        
+        now = datetime.now()
+        year = now.year
+        users = []
+        for (_, row), password_hash in zip(valid, hashes):
+            users.append((str(uuid.uuid4()), row['first_name'], row['last_name'], row['email'],
+                          row['username'], password_hash, row['user_type'], now, True))
+        
+        db = Database()
+        with db.get_connection() as conn:
+            with conn.cursor() as cursor:
+                # The unique constraints decide which rows are new, so concurrent imports can't collide
+                created = {str(row['id']) for row in execute_values(cursor, '''
+                    INSERT INTO users (id, first_name, last_name, email, username, password_hash,
+                                       user_type, created_at, is_active)
+                    VALUES %s
+                    ON CONFLICT DO NOTHING
+                    RETURNING id
+                ''', users, template='(%s::uuid, %s, %s, %s, %s, %s, %s, %s, %s)', page_size=1000, fetch=True)}
+                
+                students, professors = [], []
+                for (index, row), user in zip(valid, users):
+                    user_id = user[0]
+                    if user_id not in created:
+                        errors.append((index, 'username or email already registered'))
+                    elif row['user_type'] == 'student':
+                        students.append((user_id, f"STU{year}{str(uuid.uuid4())[:8].upper()}",
+                                         row.get('major') or None, 1, 'active'))
+                    else:
+                        professors.append((user_id, f"EMP{year}{str(uuid.uuid4())[:8].upper()}",
+                                           row['department'], row.get('position') or 'Assistant Professor',
+                                           row.get('office_location') or row.get('office') or None,
+                                           row.get('phone') or None))
+                
+                if students:
+                    _copy_rows(cursor, 'students', ['user_id', 'student_id', 'major', 'year_level', 'status'],
+                               students)
+                if professors:
+                    _copy_rows(cursor, 'professors', ['user_id', 'employee_id', 'department', 'position',
+                                                      'office_location', 'phone'], professors)
+                conn.commit()
+        
+        return len(created), sorted(errors)
+    
+    @staticmethod
+    def bulk_import_sections(rows):
+        """Create course sections from row dicts in a single transaction.
+        
+        Rows name the course by course_code and the instructor by username or employee_id
+        in professor. Returns (created count, [(row index, error)]); rows with errors,
+        including room or instructor double-bookings, are skipped.
+        """
+        required = ['course_code', 'section_number', 'semester', 'year', 'schedule', 'professor']
+        row_errors = []
+        valid = []
+        seen = set()
+        
+        for index, row in enumerate(rows):
+            row = {key.strip().lower(): '' if value is None else str(value).strip()
+                   for key, value in row.items() if key}
+            missing = [field for field in required if not row.get(field)]
+            capacity = row.get('max_capacity') or '30'
+            key = (row.get('course_code'), row.get('section_number'), row.get('semester'), row.get('year'))
+            
+            if missing:
+                row_errors.append((index, f"missing {', '.join(missing)}"))
+            elif len(row['section_number']) > 10 or len(row.get('room', '')) > 50:
+                row_errors.append((index, 'section_number or room is too long'))
+            elif row['semester'] not in SEMESTERS:
+                row_errors.append((index, f"invalid semester {row['semester']!r}"))
+            elif not row['year'].isdigit() or int(row['year']) < 1:
+                row_errors.append((index, f"invalid year {row['year']!r}"))
+            elif not capacity.isdigit() or int(capacity) < 1:
+                row_errors.append((index, f"invalid max_capacity {capacity!r}"))
+            elif key in seen:
+                row_errors.append((index, 'duplicate section in file'))
+            else:
+                try:
+                    meetings = parse_schedule(row['schedule'])
+                except ValueError as e:
+                    row_errors.append((index, str(e)))
+                    continue
+                seen.add(key)
+                valid.append((index, row, int(row['year']), int(capacity), meetings))
+        
+        if not valid:
+            return 0, row_errors
+        
         db = Database()
         with db.get_connection() as conn:
             with conn.cursor() as cursor:
-                stats = {}
+                cursor.execute(
+                    'SELECT id, course_code FROM courses WHERE is_active = TRUE AND course_code = ANY(%s)',
+                    (list({row['course_code'] for _, row, _, _, _ in valid}),))
+                course_ids = {row['course_code']: str(row['id']) for row in cursor.fetchall()}
                 
-                cursor.execute("SELECT COUNT(*) as count FROM users WHERE user_type = 'student'")
-                stats['student_count'] = cursor.fetchone()['count']
+                names = list({row['professor'] for _, row, _, _, _ in valid})
+                cursor.execute('''
+                    SELECT u.id, u.username, p.employee_id
+                    FROM professors p
+                    JOIN users u ON p.user_id = u.id
+                    WHERE u.is_active = TRUE AND (u.username = ANY(%s) OR p.employee_id = ANY(%s))
+                ''', (names, names))
+                professor_ids = {}
+                for row in cursor.fetchall():
+                    professor_ids[row['username']] = professor_ids[row['employee_id']] = str(row['id'])
+                
+                resolved = []
+                for index, row, year, capacity, meetings in valid:
+                    if row['course_code'] not in course_ids:
+                        row_errors.append((index, f"unknown course {row['course_code']!r}"))
+                    elif row['professor'] not in professor_ids:
+                        row_errors.append((index, f"unknown professor {row['professor']!r}"))
+                    else:
+                        resolved.append((index, row, course_ids[row['course_code']],
+                                         professor_ids[row['professor']], year, capacity, meetings))
                 
-                cursor.execute("SELECT COUNT(*) as count FROM users WHERE user_type = 'professor'")
-                stats['professor_count'] = cursor.fetchone()['count']
+                if not resolved:
+                    return 0, sorted(row_errors)
                 
-                cursor.execute("SELECT COUNT(*) as count FROM courses")
-                stats['course_count'] = cursor.fetchone()['count']
+                cursor.execute('''
+                    SELECT course_id, section_number, semester, year
+                    FROM course_sections
+                    WHERE (course_id, section_number, semester, year) IN (
+                        SELECT * FROM unnest(%s::uuid[], %s::text[], %s::text[], %s::int[])
+                    )
+                ''', ([entry[2] for entry in resolved], [entry[1]['section_number'] for entry in resolved],
+                      [entry[1]['semester'] for entry in resolved], [entry[4] for entry in resolved]))
+                existing = {(str(row['course_id']), row['section_number'], row['semester'], row['year'])
+                            for row in cursor.fetchall()}
                 
-                cursor.execute("SELECT COUNT(*) as count FROM course_sections")
-                stats['section_count'] = cursor.fetchone()['count']
+                booked_elsewhere = _booking_conflicts_many(
+                    cursor, [(professor_id, row['semester'], year, row.get('room'), meetings)
+                             for _, row, _, professor_id, year, _, meetings in resolved])
                 
+                # Rows accepted so far hold their rooms and instructors against later rows
+                booked = {}
+                sections, section_meetings = [], []
+                for (index, row, course_id, professor_id, year, capacity, meetings), conflicts in zip(
+                        resolved, booked_elsewhere):
+                    name = f"{row['course_code']}-{row['section_number']}"
+                    room = row.get('room', '').upper()
+                    resources = [('professor', professor_id)] + ([('room', room)] if room not in ('', 'TBA') else [])
+                    mask = week_mask(meetings)
+                    clash = next(((kind, other) for kind, resource in resources
+                                  for other_mask, other in booked.get((kind, resource, row['semester'], year), [])
+                                  if mask & other_mask), None)
+                    
+                    if (course_id, row['section_number'], row['semester'], year) in existing:
+                        row_errors.append((index, f"{name} already exists in {row['semester']} {year}"))
+                    elif conflicts:
+                        row_errors.append((index, '; '.join(_describe_conflict(conflict) for conflict in conflicts)))
+                    elif clash and clash[0] == 'room':
+                        row_errors.append((index, f"Room {row['room']} is also booked by {clash[1]} in this file"))
+                    elif clash:
+                        row_errors.append((index, f"The instructor also teaches {clash[1]} at that time in this file"))
+                    else:
+                        for kind, resource in resources:
+                            booked.setdefault((kind, resource, row['semester'], year), []).append((mask, name))
+                        section_id = str(uuid.uuid4())
+                        sections.append((section_id, course_id, professor_id, row['section_number'], row['semester'],
+                                         year, row['schedule'], row.get('room') or None, capacity))
+                        section_meetings.extend((section_id, *meeting) for meeting in meetings)
+                
+                if sections:
+                    _copy_rows(cursor, 'course_sections', ['id', 'course_id', 'professor_id', 'section_number',
+                                                           'semester', 'year', 'schedule', 'room', 'max_capacity'],
+                               sections)
+                    if section_meetings:
+                        try:
+                            _copy_rows(cursor, 'section_meetings', ['section_id', 'days', 'start_minute', 'end_minute'],
+                                       section_meetings)
+                        except errors.ExclusionViolation:
+                            raise Exception("A room or instructor was just booked by another section; please try again")
+                    conn.commit()
+        
+        return len(sections), sorted(row_errors)
+    
+    @staticmethod
+    def rollover_term(from_semester, from_year, to_semester, to_year):
+        """Copy every section of one term, with its meeting times, into another in one statement.
+        
+        New sections start open and empty. Sections whose number is already taken in the new
+        term, whose room or instructor is already booked there, or whose course or instructor
+        is inactive are skipped. Returns (created count, [(section, reason)]).
+        """
+        if from_semester not in SEMESTERS or to_semester not in SEMESTERS:
+            raise Exception(f"Semester must be one of {', '.join(SEMESTERS)}")
+        if from_year < 1 or to_year < 1:
+            raise Exception("Year must be positive")
+        if (from_semester, from_year) == (to_semester, to_year):
+            raise Exception("Choose a different term to copy into")
+        
+        db = Database()
+        with db.get_connection() as conn:
+            with conn.cursor() as cursor:
+                try:
+                    cursor.execute('''
+                        WITH source AS (
+                            SELECT cs.id, cs.course_id, cs.professor_id, cs.section_number, cs.schedule,
+                                   cs.room, cs.max_capacity, c.course_code,
+                                   CASE
+                                       WHEN NOT c.is_active OR NOT u.is_active
+                                           THEN 'course or instructor is inactive'
+                                       WHEN EXISTS (
+                                           SELECT 1 FROM course_sections t
+                                           WHERE t.course_id = cs.course_id AND t.section_number = cs.section_number
+                                             AND t.semester = %(to_semester)s AND t.year = %(to_year)s
+                                       ) THEN 'section number already exists'
+                                       WHEN EXISTS (
+                                           SELECT 1 FROM section_bookings sb
+                                           JOIN section_bookings tb ON tb.kind = sb.kind AND tb.resource = sb.resource
+                                                                   AND tb.year = %(to_year)s
+                                                                   AND tb.semester = %(to_semester)s
+                                                                   AND tb.day = sb.day AND tb.minutes && sb.minutes
+                                           WHERE sb.section_id = cs.id
+                                       ) THEN 'room or instructor already booked'
+                                   END AS skip_reason
+                            FROM course_sections cs
+                            JOIN courses c ON cs.course_id = c.id
+                            JOIN users u ON cs.professor_id = u.id
+                            WHERE cs.semester = %(from_semester)s AND cs.year = %(from_year)s
+                        ),
+                        inserted AS (
+                            INSERT INTO course_sections (course_id, professor_id, section_number, semester, year,
+                                                         schedule, room, max_capacity, current_enrollment, status)
+                            SELECT course_id, professor_id, section_number, %(to_semester)s, %(to_year)s,
+                                   schedule, room, max_capacity, 0, 'open'
+                            FROM source
+                            WHERE skip_reason IS NULL
+                            ON CONFLICT (course_id, section_number, semester, year) DO NOTHING
+                            RETURNING id, course_id, section_number
+                        ),
+                        copied_meetings AS (
+                            INSERT INTO section_meetings (section_id, days, start_minute, end_minute)
+                            SELECT i.id, m.days, m.start_minute, m.end_minute
+                            FROM inserted i
+                            JOIN source s ON s.course_id = i.course_id AND s.section_number = i.section_number
+                            JOIN section_meetings m ON m.section_id = s.id
+                        )
+                        SELECT s.course_code || '-' || s.section_number AS section,
+                               CASE WHEN i.id IS NULL
+                                    THEN COALESCE(s.skip_reason, 'section number already exists')
+                               END AS skipped
+                        FROM source s
+                        LEFT JOIN inserted i ON i.course_id = s.course_id AND i.section_number = s.section_number
+                        ORDER BY section
+                    ''', {'from_semester': from_semester, 'from_year': from_year,
+                          'to_semester': to_semester, 'to_year': to_year})
+                    rows = cursor.fetchall()
+                except errors.ExclusionViolation:
+                    raise Exception(f"Sections of {from_semester} {from_year} double-book a room or instructor; "
+                                    "resolve the conflicts it reports first")
+                conn.commit()
+        
+        skipped = [(row['section'], row['skipped']) for row in rows if row['skipped']]
+        return len(rows) - len(skipped), skipped
+    
+    @staticmethod
+    def get_statistics():
+        """Totals from the trigger-maintained stat_counters table.
+        
+        Users are counted per user_type (student_count, professor_count, admin_count);
+        course_count covers active courses only, as the listings do.
+        """
+        db = Database()
+        with db.get_connection() as conn:
+            with conn.cursor() as cursor:
+                stats = {'student_count': 0, 'professor_count': 0, 'admin_count': 0,
+                         'course_count': 0, 'section_count': 0}
+                cursor.execute('SELECT name, value FROM stat_counters')
+                stats.update((row['name'], row['value']) for row in cursor.fetchall())
                 return stats
     
+    @staticmethod
+    def get_student_statistics():
+        """Active, declared and undeclared counts over all active student accounts"""
+        db = Database()
+        with db.get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute('''
+                    SELECT COUNT(*) FILTER (WHERE s.status = 'active') AS active_students,
+                           COUNT(s.major) AS declared_majors,
+                           COUNT(*) - COUNT(s.major) AS undeclared
+                    FROM students s
+                    JOIN users u ON s.user_id = u.id
+                    WHERE u.is_active = TRUE
+                ''')
+                return dict(cursor.fetchone())
+    
+    @staticmethod
+    def get_course_statistics():
+        """Active course count and credit totals over the whole catalog"""
+        db = Database()
+        with db.get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute('''
+                    SELECT COUNT(*) AS active_courses,
+                           COALESCE(SUM(credits), 0) AS total_credits,
+                           COALESCE(ROUND(AVG(credits), 1), 0) AS average_credits
+                    FROM courses
+                    WHERE is_active = TRUE
+                ''')
+                return dict(cursor.fetchone())
+    
+    @staticmethod
+    def get_term_statistics(semester, year):
+        """Enrollment totals and fill rate over one term's sections"""
+        db = Database()
+        with db.get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute('''
+                    SELECT COUNT(*) AS sections,
+                           COALESCE(SUM(current_enrollment), 0) AS enrolled,
+                           COALESCE(SUM(max_capacity), 0) AS capacity,
+                           COUNT(*) FILTER (WHERE current_enrollment >= max_capacity) AS full_sections,
+                           COALESCE(ROUND(100.0 * SUM(current_enrollment) / NULLIF(SUM(max_capacity), 0), 1), 0) AS fill_rate
+                    FROM course_sections
+                    WHERE semester = %s AND year = %s
+                ''', (semester, year))
+                return dict(cursor.fetchone())
+    
+    @staticmethod
+    def get_booking_conflicts(semester, year):
+        """Pairs of the term's sections sharing a room or an instructor at overlapping times"""
+        db = Database()
+        with db.get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute('''
+                    WITH term AS (
+                        SELECT cs.id, cs.professor_id, booking_room(cs.room) AS room, cs.schedule,
+                               c.course_code || '-' || cs.section_number AS section,
+                               u.first_name || ' ' || u.last_name AS professor_name
+                        FROM course_sections cs
+                        JOIN courses c ON c.id = cs.course_id
+                        JOIN users u ON u.id = cs.professor_id
+                        WHERE cs.semester = %s AND cs.year = %s
+                    ),
+                    pairs AS (
+                        SELECT 'room' AS kind, a.room AS resource, a.id AS a_id, b.id AS b_id
+                        FROM term a JOIN term b ON a.room = b.room AND a.id < b.id
+                        UNION ALL
+                        SELECT 'professor', a.professor_name, a.id, b.id
+                        FROM term a JOIN term b ON a.professor_id = b.professor_id AND a.id < b.id
+                    )
+                    SELECT p.kind, p.resource, a.section AS section_a, a.schedule AS schedule_a,
+                           b.section AS section_b, b.schedule AS schedule_b
+                    FROM pairs p
+                    JOIN term a ON a.id = p.a_id
+                    JOIN term b ON b.id = p.b_id
+                    WHERE EXISTS (
+                        SELECT 1 FROM section_meetings ma
+                        JOIN section_meetings mb ON (ma.days & mb.days) <> 0
+                                                AND ma.start_minute < mb.end_minute
+                                                AND mb.start_minute < ma.end_minute
+                        WHERE ma.section_id = p.a_id AND mb.section_id = p.b_id
+                    )
+                    ORDER BY p.kind DESC, p.resource, a.section, b.section
+                ''', (semester, year))
+                return [dict(row) for row in cursor.fetchall()]
+    
     def create_course(self, course_code, title, description, credits, department=None, max_students=30):
         db = Database()
         with db.get_connection() as conn:
@@ -569,18 +1591,46 @@ class Admin(User):
                     VALUES (%s, %s, %s, %s, %s, %s, %s)
                 ''', (course_id, course_code, title, description, credits, department, max_students))
                 conn.commit()
-                return course_id
+        
+        on_commit(reference_cache.invalidate)
+        return course_id
     
     def update_course(self, course_id, course_code, title, description, credits, department=None, max_students=30):
         db = Database()
         with db.get_connection() as conn:
             with conn.cursor() as cursor:
                 cursor.execute('''
-                    UPDATE courses 
+                    WITH old AS (
+                        SELECT id, credits FROM courses WHERE id = %s FOR UPDATE
+                    )
+                    UPDATE courses c
                     SET course_code = %s, title = %s, description = %s, credits = %s, department = %s, max_students = %s
-                    WHERE id = %s
-                ''', (course_code, title, description, credits, department, max_students, course_id))
+                    FROM old
+                    WHERE c.id = old.id
+                    RETURNING old.credits AS old_credits
+                ''', (course_id, course_code, title, description, credits, department, max_students))
+                updated = cursor.fetchone()
+                
+                # Credits feed every graded enrollment's quality points
+                if updated and updated['old_credits'] != credits:
+                    cursor.execute('''
+                        WITH delta AS (
+                            SELECT e.student_id, cs.semester, cs.year,
+                                   SUM(gp.points) * %(diff)s AS quality_points,
+                                   COUNT(*) * %(diff)s AS graded_credits
+                            FROM enrollments e
+                            JOIN grade_points gp ON gp.grade = e.grade
+                            JOIN course_sections cs ON e.section_id = cs.id
+                            WHERE cs.course_id = %(course_id)s
+                            GROUP BY e.student_id, cs.semester, cs.year
+                        ),
+                    ''' + _GPA_DELTA_UPSERT + '''
+                        SELECT COUNT(*) AS students FROM delta
+                    ''', {'diff': credits - updated['old_credits'], 'course_id': course_id})
+                
                 conn.commit()
+        
+        on_commit(reference_cache.invalidate)
     
     def delete_course(self, course_id):
         db = Database()
@@ -588,19 +1638,46 @@ class Admin(User):
             with conn.cursor() as cursor:
                 cursor.execute('DELETE FROM courses WHERE id = %s', (course_id,))
                 conn.commit()
+        
+        on_commit(reference_cache.invalidate)
+    
+    COURSE_PAGE_KEYS = [('course_code', 'course_code')]
     
     @staticmethod
-    def get_all_courses(search=None, department=None):
+    def get_courses_page(search=None, department=None, after=None, before=None, limit=DEFAULT_PAGE_SIZE):
+        """One page ordered by course code, or by relevance when searching"""
+        if search:
+            return Search.page(lambda limit, offset: Search.courses(search, department, limit, offset),
+                               after, before, limit)
+        
         db = Database()
         with db.get_connection() as conn:
             with conn.cursor() as cursor:
                 query = 'SELECT * FROM courses WHERE is_active = TRUE'
                 params = []
                 
-                if search:
-                    query += ' AND (course_code ILIKE %s OR title ILIKE %s)'
-                    search_param = f'%{search}%'
-                    params.extend([search_param, search_param])
+                if department:
+                    query += ' AND department = %s'
+                    params.append(department)
+                
+                return fetch_page(cursor, query, params, Admin.COURSE_PAGE_KEYS, after, before, limit)
+    
+    @staticmethod
+    def get_all_courses(search=None, department=None):
+        if search:
+            return Search.courses(search, department)
+        
+        # Served from the reference cache; treat the returned rows as read-only
+        return list(reference_cache.get_or_load(('courses', department),
+                                                lambda: on_primary(lambda: Admin._load_courses(department))))
+    
+    @staticmethod
+    def _load_courses(department):
+        db = Database()
+        with db.get_connection() as conn:
+            with conn.cursor() as cursor:
+                query = 'SELECT * FROM courses WHERE is_active = TRUE'
+                params = []
                 
                 if department:
                     query += ' AND department = %s'
@@ -620,39 +1697,185 @@ class Admin(User):
                 course = cursor.fetchone()
                 return dict(course) if course else None
 
+class Export:
+    """CSV exports as (header, rows); rows stream from a server-side cursor"""
+    
+    @staticmethod
+    def section_roster(section_id):
+        header = ['student_id', 'last_name', 'first_name', 'email', 'major', 'enrollment_date', 'grade']
+        rows = Database().stream('''
+            SELECT s.student_id, u.last_name, u.first_name, u.email, s.major, e.enrollment_date, e.grade
+            FROM enrollments e
+            JOIN students s ON e.student_id = s.user_id
+            JOIN users u ON s.user_id = u.id
+            WHERE e.section_id = %s
+            ORDER BY u.last_name, u.first_name, s.student_id
+        ''', (section_id,))
+        return header, rows
+    
+    @staticmethod
+    def term_grades(semester, year):
+        header = ['student_id', 'last_name', 'first_name', 'course_code', 'section_number',
+                  'credits', 'grade']
+        rows = Database().stream('''
+            SELECT s.student_id, u.last_name, u.first_name, c.course_code, cs.section_number,
+                   c.credits, e.grade
+            FROM course_sections cs
+            JOIN courses c ON cs.course_id = c.id
+            JOIN enrollments e ON e.section_id = cs.id
+            JOIN students s ON e.student_id = s.user_id
+            JOIN users u ON s.user_id = u.id
+            WHERE cs.semester = %s AND cs.year = %s
+            ORDER BY c.course_code, cs.section_number, u.last_name, u.first_name
+        ''', (semester, year))
+        return header, rows
+    
+    @staticmethod
+    def student_directory():
+        header = ['student_id', 'last_name', 'first_name', 'email', 'username', 'major',
+                  'year_level', 'status', 'created_at']
+        rows = Database().stream('''
+            SELECT s.student_id, u.last_name, u.first_name, u.email, u.username, s.major,
+                   s.year_level, s.status, u.created_at
+            FROM users u
+            JOIN students s ON s.user_id = u.id
+            WHERE u.user_type = 'student' AND u.is_active = TRUE
+            ORDER BY u.last_name, u.first_name, u.id
+        ''')
+        return header, rows
+
+class Search:
+    """Ranked search over the trigram-indexed search_text columns"""
+    
+    # Substring match or close word match; both are served by the GIN index
+    MATCH_SQL = '({column} LIKE %s OR %s <%% {column})'
+    RANK_SQL = '({column} LIKE %s) DESC, word_similarity(%s, {column}) DESC'
+    LIMIT = 100
+    
+    @staticmethod
+    def match_params(term):
+        term = term.strip().lower()
+        pattern = term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        return [f'%{pattern}%', term]
+    
+    @staticmethod
+    def page(search, after=None, before=None, limit=DEFAULT_PAGE_SIZE):
+        """One page of ranked matches from search(limit, offset); page tokens carry the offset"""
+        values = decode_cursor(before or after, 1) if (before or after) else None
+        try:
+            offset = max(0, int(values[0])) if values else 0
+        except ValueError:
+            offset = 0
+        
+        rows = search(limit + 1, offset)
+        return {'items': rows[:limit],
+                'next': encode_cursor([offset + limit]) if len(rows) > limit else None,
+                'prev': encode_cursor([max(0, offset - limit)]) if offset else None}
+    
+    @staticmethod
+    def users(term, user_type=None, limit=LIMIT, offset=0):
+        db = Database()
+        with db.get_connection() as conn:
+            with conn.cursor() as cursor:
+                query = User.LISTING_SQL + ' AND ' + Search.MATCH_SQL.format(column='u.search_text')
+                params = Search.match_params(term)
+                
+                if user_type:
+                    query += ' AND u.user_type = %s'
+                    params.append(user_type)
+                
+                query += (' ORDER BY ' + Search.RANK_SQL.format(column='u.search_text') +
+                          ', u.last_name, u.first_name, u.id LIMIT %s OFFSET %s')
+                params.extend(Search.match_params(term) + [limit, offset])
+                
+                cursor.execute(query, params)
+                return [dict(row) for row in cursor.fetchall()]
+    
+    @staticmethod
+    def courses(term, department=None, limit=LIMIT, offset=0):
+        db = Database()
+        with db.get_connection() as conn:
+            with conn.cursor() as cursor:
+                query = 'SELECT * FROM courses WHERE is_active = TRUE AND ' + Search.MATCH_SQL.format(column='search_text')
+                params = Search.match_params(term)
+                
+                if department:
+                    query += ' AND department = %s'
+                    params.append(department)
+                
+                query += ' ORDER BY ' + Search.RANK_SQL.format(column='search_text') + ', course_code LIMIT %s OFFSET %s'
+                params.extend(Search.match_params(term) + [limit, offset])
+                
+                cursor.execute(query, params)
+                return [dict(row) for row in cursor.fetchall()]
+
 class Utils:
     @staticmethod
     def calculate_gpa(student_id):
-        """Simplified GPA calculation"""
-        grade_points = {'A': 4.0, 'B': 3.0, 'C': 2.0, 'D': 1.0, 'F': 0.0}
+        """Cumulative GPA from the maintained aggregate"""
+        db = Database()
+        with db.get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    'SELECT quality_points, graded_credits FROM student_gpa WHERE student_id = %s',
+                    (student_id,)
+                )
+                totals = cursor.fetchone()
+                
+                if not totals or not totals['graded_credits']:
+                    return 0.0
+                return round(float(totals['quality_points']) / totals['graded_credits'], 2)
+    
+    @staticmethod
+    def get_term_gpas(student_id):
+        """Per-term GPA keyed like 'Fall 2025'"""
+        db = Database()
+        with db.get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute('''
+                    SELECT semester, year, quality_points, graded_credits
+                    FROM student_gpa_terms
+                    WHERE student_id = %s AND graded_credits > 0
+                ''', (student_id,))
+                
+                return {f"{row['semester']} {row['year']}":
+                        round(float(row['quality_points']) / row['graded_credits'], 2)
+                        for row in cursor.fetchall()}
+    
+    @staticmethod
+    def rebuild_gpa(student_ids=None):
+        """Recompute GPA aggregates from enrollments (all students by default)"""
+        params = {'all': student_ids is None, 'ids': list(student_ids or [])}
         
         db = Database()
         with db.get_connection() as conn:
             with conn.cursor() as cursor:
+                # Grade changes committed after our snapshot wait here and apply their delta on top
+                cursor.execute('LOCK TABLE student_gpa_terms, student_gpa IN EXCLUSIVE MODE')
                 cursor.execute('''
-                    SELECT e.grade, c.credits
+                    DELETE FROM student_gpa_terms WHERE %(all)s OR student_id = ANY(%(ids)s::uuid[])
+                ''', params)
+                cursor.execute('''
+                    DELETE FROM student_gpa WHERE %(all)s OR student_id = ANY(%(ids)s::uuid[])
+                ''', params)
+                cursor.execute('''
+                    INSERT INTO student_gpa_terms (student_id, semester, year, quality_points, graded_credits)
+                    SELECT e.student_id, cs.semester, cs.year, SUM(gp.points * c.credits), SUM(c.credits)
                     FROM enrollments e
+                    JOIN grade_points gp ON gp.grade = e.grade
                     JOIN course_sections cs ON e.section_id = cs.id
                     JOIN courses c ON cs.course_id = c.id
-                    WHERE e.student_id = %s AND e.grade IS NOT NULL
-                ''', (student_id,))
-                
-                grades = cursor.fetchall()
-                
-                if not grades:
-                    return 0.0
-                
-                total_points = 0
-                total_credits = 0
-                
-                for grade in grades:
-                    if grade['grade'] in grade_points:
-                        points = grade_points[grade['grade']]
-                        credits = grade['credits']
-                        total_points += points * credits
-                        total_credits += credits
-                
-                return round(total_points / total_credits, 2) if total_credits > 0 else 0.0
+                    WHERE %(all)s OR e.student_id = ANY(%(ids)s::uuid[])
+                    GROUP BY e.student_id, cs.semester, cs.year
+                ''', params)
+                cursor.execute('''
+                    INSERT INTO student_gpa (student_id, quality_points, graded_credits)
+                    SELECT student_id, SUM(quality_points), SUM(graded_credits)
+                    FROM student_gpa_terms
+                    WHERE %(all)s OR student_id = ANY(%(ids)s::uuid[])
+                    GROUP BY student_id
+                ''', params)
+                conn.commit()
     
     @staticmethod
     def get_current_semester():
@@ -667,58 +1890,123 @@ class Utils:
         else:
             return "Summer", year
     
+    @staticmethod
+    def recent_terms(count):
+        """The current term and the ones before it, newest first"""
+        semester, year = Utils.get_current_semester()
+        terms = []
+        while len(terms) < count:
+            terms.append((semester, year))
+            index = SEMESTERS.index(semester) - 1
+            if index < 0:
+                index, year = len(SEMESTERS) - 1, year - 1
+            semester = SEMESTERS[index]
+        return terms
+    
+    SECTION_PAGE_KEYS = [('c.course_code', 'course_code'), ('cs.section_number', 'section_number'), ('cs.id', 'id')]
+    
     @staticmethod
     def get_available_sections(student_id=None, search=None, department=None):
         db = Database()
         with db.get_connection() as conn:
             with conn.cursor() as cursor:
-                current_semester, current_year = Utils.get_current_semester()
-                
-                query = '''
-                    SELECT cs.id, c.course_code, c.title, c.description, c.credits, c.department,
-                           cs.section_number, cs.schedule, cs.room, cs.current_enrollment, 
-                           cs.max_capacity, u.first_name, u.last_name, cs.professor_id
-                '''
-                params = [current_semester, current_year]
-                
-                if student_id:
-                    query += ', CASE WHEN e.id IS NOT NULL THEN true ELSE false END as is_enrolled'
-                    query += '''
-                        FROM course_sections cs
-                        JOIN courses c ON cs.course_id = c.id
-                        JOIN professors p ON cs.professor_id = p.user_id
-                        JOIN users u ON p.user_id = u.id
-                        LEFT JOIN enrollments e ON cs.id = e.section_id AND e.student_id = %s
-                    '''
-                    params = [student_id] + params
-                else:
-                    query += '''
-                        FROM course_sections cs
-                        JOIN courses c ON cs.course_id = c.id
-                        JOIN professors p ON cs.professor_id = p.user_id
-                        JOIN users u ON p.user_id = u.id
-                    '''
-                
-                query += ' WHERE cs.status = %s AND cs.semester = %s AND cs.year = %s'
-                params.extend(['open'])
-                
-                if search:
-                    query += ' AND (c.course_code ILIKE %s OR c.title ILIKE %s)'
-                    search_param = f'%{search}%'
-                    params.extend([search_param, search_param])
-                
-                if department:
-                    query += ' AND c.department = %s'
-                    params.append(department)
-                
+                query, params = Utils._available_sections_query(student_id, search, department)
                 query += ' ORDER BY c.course_code, cs.section_number'
                 
                 cursor.execute(query, params)
                 return [dict(row) for row in cursor.fetchall()]
     
+    @staticmethod
+    def get_available_sections_page(student_id=None, search=None, department=None,
+                                    after=None, before=None, limit=DEFAULT_PAGE_SIZE):
+        db = Database()
+        with db.get_connection() as conn:
+            with conn.cursor() as cursor:
+                query, params = Utils._available_sections_query(student_id, search, department)
+                return fetch_page(cursor, query, params, Utils.SECTION_PAGE_KEYS, after, before, limit)
+    
+    @staticmethod
+    def _available_sections_query(student_id, search, department):
+        """Open sections this term; the query ends in its WHERE clause"""
+        current_semester, current_year = Utils.get_current_semester()
+        
+        query = ''
+        params = []
+        
+        if student_id:
+            # Compare the student's meetings this term against every section in one pass
+            query += '''
+                WITH my_meetings AS (
+                    SELECT em.section_id, em.days, em.start_minute, em.end_minute, c.course_code
+                    FROM enrollments e
+                    JOIN course_sections cs ON e.section_id = cs.id
+                    JOIN courses c ON cs.course_id = c.id
+                    JOIN section_meetings em ON em.section_id = cs.id
+                    WHERE e.student_id = %s AND cs.semester = %s AND cs.year = %s
+                ),
+                conflicts AS (
+                    SELECT nm.section_id,
+                           array_agg(DISTINCT mm.course_code ORDER BY mm.course_code) AS conflicts_with
+                    FROM my_meetings mm
+                    JOIN section_meetings nm ON (mm.days & nm.days) <> 0
+                                             AND mm.start_minute < nm.end_minute
+                                             AND nm.start_minute < mm.end_minute
+                                             AND nm.section_id <> mm.section_id
+                    JOIN course_sections ns ON ns.id = nm.section_id
+                                           AND ns.semester = %s AND ns.year = %s
+                    GROUP BY nm.section_id
+                )
+            '''
+            params.extend([student_id, current_semester, current_year,
+                           current_semester, current_year])
+        
+        query += '''
+            SELECT cs.id, c.course_code, c.title, c.description, c.credits, c.department,
+                   cs.section_number, cs.schedule, cs.room, cs.current_enrollment, 
+                   cs.max_capacity, u.first_name, u.last_name, cs.professor_id
+        '''
+        
+        if student_id:
+            query += ''',
+                   CASE WHEN e.id IS NOT NULL THEN true ELSE false END as is_enrolled,
+                   COALESCE(cf.conflicts_with, '{}') AS conflicts_with
+                FROM course_sections cs
+                JOIN courses c ON cs.course_id = c.id
+                JOIN professors p ON cs.professor_id = p.user_id
+                JOIN users u ON p.user_id = u.id
+                LEFT JOIN enrollments e ON cs.id = e.section_id AND e.student_id = %s
+                LEFT JOIN conflicts cf ON cf.section_id = cs.id
+            '''
+            params.append(student_id)
+        else:
+            query += '''
+                FROM course_sections cs
+                JOIN courses c ON cs.course_id = c.id
+                JOIN professors p ON cs.professor_id = p.user_id
+                JOIN users u ON p.user_id = u.id
+            '''
+        
+        query += ' WHERE cs.status = %s AND cs.semester = %s AND cs.year = %s'
+        params.extend(['open', current_semester, current_year])
+        
+        if search:
+            query += ' AND ' + Search.MATCH_SQL.format(column='c.search_text')
+            params.extend(Search.match_params(search))
+        
+        if department:
+            query += ' AND c.department = %s'
+            params.append(department)
+        
+        return query, params
+    
     @staticmethod
     def get_departments():
         """Get list of departments"""
+        return list(reference_cache.get_or_load('departments',
+                                                lambda: on_primary(Utils._load_departments)))
+    
+    @staticmethod
+    def _load_departments():
         db = Database()
         with db.get_connection() as conn:
             with conn.cursor() as cursor:
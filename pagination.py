@@ -0,0 +1,79 @@
+import base64
+import binascii
+import json
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+def page_size(value, default=DEFAULT_PAGE_SIZE):
+    """Requested page size clamped to 1..MAX_PAGE_SIZE"""
+    try:
+        size = int(value)
+    except (TypeError, ValueError):
+        return default
+    return max(1, min(size, MAX_PAGE_SIZE))
+
+def encode_cursor(values):
+    raw = json.dumps([str(value) for value in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+def decode_cursor(token, length):
+    """Sort key values from a page token, or None if the token is malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        values = json.loads(raw)
+    except (binascii.Error, ValueError):
+        return None
+    if not isinstance(values, list) or len(values) != length:
+        return None
+    return values
+
+def keyset(query, params, keys, after=None, before=None, limit=DEFAULT_PAGE_SIZE):
+    """Append the keyset condition, order and limit to a query ending in a WHERE clause.
+
+    keys is a list of (sql expression, result column) pairs forming a unique sort key.
+    A malformed token is treated as no token, i.e. the first page.
+    """
+    columns = [column for column, _ in keys]
+    backwards = False
+    values = None
+    if before:
+        values = decode_cursor(before, len(keys))
+        backwards = values is not None
+    if values is None and after:
+        values = decode_cursor(after, len(keys))
+
+    if values is not None:
+        placeholders = ', '.join(['%s'] * len(values))
+        query += f" AND ({', '.join(columns)}) {'<' if backwards else '>'} ({placeholders})"
+        params = list(params) + values
+
+    direction = ' DESC' if backwards else ''
+    query += ' ORDER BY ' + ', '.join(column + direction for column in columns) + ' LIMIT %s'
+    params = list(params) + [limit + 1]
+    return query, params, backwards, values is not None
+
+def make_page(rows, keys, limit, backwards=False, from_cursor=False):
+    """Page of rows fetched with keyset(): {'items', 'next', 'prev'} with tokens or None"""
+    more = len(rows) > limit
+    items = [dict(row) for row in rows[:limit]]
+    if backwards:
+        items.reverse()
+
+    def token(row):
+        return encode_cursor([row[name] for _, name in keys])
+
+    page = {'items': items, 'next': None, 'prev': None}
+    if items:
+        # Paging back from a token there is always a next page, paging forward a previous one
+        if more or backwards:
+            page['next'] = token(items[-1])
+        if (more and backwards) or (from_cursor and not backwards):
+            page['prev'] = token(items[0])
+    return page
+
+def fetch_page(cursor, query, params, keys, after=None, before=None, limit=DEFAULT_PAGE_SIZE):
+    """Run a keyset-paginated query; the query must end in a WHERE clause"""
+    query, params, backwards, from_cursor = keyset(query, params, keys, after, before, limit)
+    cursor.execute(query, params)
+    return make_page(cursor.fetchall(), keys, limit, backwards, from_cursor)
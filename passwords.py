@@ -0,0 +1,72 @@
+from werkzeug.security import generate_password_hash, check_password_hash
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache
+import os
+import threading
+
+# Hash policy for new and upgraded hashes, e.g. 'pbkdf2:sha256:600000' or 'scrypt'
+PASSWORD_HASH_METHOD = os.getenv('PASSWORD_HASH_METHOD', 'pbkdf2')
+
+def hash_password(password):
+    return generate_password_hash(password, method=PASSWORD_HASH_METHOD)
+
+def hash_passwords(passwords, workers=None, threads=False):
+    """Hash many passwords across a process pool (hashing is CPU-bound).
+
+    threads uses a thread pool instead, for callers that must not fork; hashlib
+    releases the GIL while hashing, so threads still use every core.
+    """
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(passwords) < 2:
+        return [hash_password(password) for password in passwords]
+
+    executor = ThreadPoolExecutor if threads else ProcessPoolExecutor
+    with executor(max_workers=workers) as pool:
+        chunksize = max(1, len(passwords) // (workers * 4))
+        return list(pool.map(hash_password, passwords, chunksize=chunksize))
+
+@lru_cache(maxsize=None)
+def _policy_prefix():
+    # Werkzeug stores the fully expanded method (e.g. 'pbkdf2:sha256:600000')
+    return hash_password('policy').split('$', 1)[0]
+
+def needs_rehash(password_hash):
+    return password_hash.split('$', 1)[0] != _policy_prefix()
+
+def _check(password_hash, password):
+    if not check_password_hash(password_hash, password):
+        return False, None
+    return True, hash_password(password) if needs_rehash(password_hash) else None
+
+class PasswordVerifier:
+    """Bounded pool for password checks; sheds load instead of queueing without limit"""
+
+    def __init__(self, workers, max_pending):
+        # hashlib releases the GIL while hashing, so threads use every core
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password')
+        self._slots = threading.BoundedSemaphore(max_pending)
+
+    def verify(self, password_hash, password):
+        """Returns (valid, upgraded hash or None)"""
+        if not self._slots.acquire(blocking=False):
+            raise Exception("Too many sign-ins in progress, please try again")
+        try:
+            future = self._executor.submit(_check, password_hash, password)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future.result()
+
+_verifier = None
+_verifier_lock = threading.Lock()
+
+def verify_password(password_hash, password):
+    global _verifier
+    if _verifier is None:
+        with _verifier_lock:
+            if _verifier is None:
+                workers = int(os.getenv('LOGIN_HASH_WORKERS', str(os.cpu_count() or 1)))
+                max_pending = int(os.getenv('LOGIN_MAX_PENDING', str(workers * 4)))
+                _verifier = PasswordVerifier(workers, max_pending)
+    return _verifier.verify(password_hash, password)
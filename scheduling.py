@@ -0,0 +1,139 @@
+import heapq
+import re
+
+# Day letters used in schedule strings, stored as bits of a meeting's day mask
+DAY_BITS = {'M': 1, 'T': 2, 'W': 4, 'R': 8, 'F': 16, 'S': 32, 'U': 64}
+
+_MEETING_RE = re.compile(r'^([MTWRFSU]+)\s+(\d{1,2}):(\d{2})\s*-\s*(\d{1,2}):(\d{2})$', re.IGNORECASE)
+
+def parse_schedule(schedule):
+    """Parse 'MWF 10:00-11:00' into (days_mask, start_minute, end_minute) meetings.
+
+    Several meetings may be separated by ',' or ';'. 'TBA' has no meetings.
+    """
+    schedule = (schedule or '').strip()
+    if not schedule or schedule.upper() == 'TBA':
+        return []
+
+    meetings = []
+    for part in re.split(r'[;,]', schedule):
+        part = part.strip()
+        match = _MEETING_RE.match(part)
+        if not match:
+            raise ValueError(f"Invalid schedule '{part}', use e.g. 'MWF 10:00-11:00'")
+
+        days, start_hour, start_min, end_hour, end_min = match.groups()
+        start = int(start_hour) * 60 + int(start_min)
+        end = int(end_hour) * 60 + int(end_min)
+        if int(start_min) > 59 or int(end_min) > 59 or end > 24 * 60 or start >= end:
+            raise ValueError(f"Invalid meeting time '{part}'")
+
+        mask = 0
+        for day in days.upper():
+            mask |= DAY_BITS[day]
+        meetings.append((mask, start, end))
+    return meetings
+
+def meeting_days(mask):
+    return [day for day, bit in DAY_BITS.items() if mask & bit]
+
+def format_minutes(minute):
+    return f"{minute // 60}:{minute % 60:02d}"
+
+def meetings_overlap(a, b):
+    """Meetings share a day and their time intervals intersect"""
+    return bool(a[0] & b[0]) and a[1] < b[2] and b[1] < a[2]
+
+def schedules_conflict(meetings_a, meetings_b):
+    return any(meetings_overlap(a, b) for a in meetings_a for b in meetings_b)
+
+DAY_MINUTES = 24 * 60
+_DAY_MASK = (1 << DAY_MINUTES) - 1
+
+def week_mask(meetings):
+    """Bit per minute of the week a section meets; two sections conflict iff their masks intersect"""
+    mask = 0
+    for days, start, end in meetings:
+        span = ((1 << (end - start)) - 1) << start
+        for day, bit in enumerate(DAY_BITS.values()):
+            if days & bit:
+                mask |= span << (day * DAY_MINUTES)
+    return mask
+
+def schedule_score(mask):
+    """(days on campus, idle minutes between classes, latest finish); lower is better"""
+    days = gaps = latest = 0
+    for day in range(len(DAY_BITS)):
+        minutes = (mask >> (day * DAY_MINUTES)) & _DAY_MASK
+        if not minutes:
+            continue
+        first = (minutes & -minutes).bit_length() - 1
+        last = minutes.bit_length()
+        days += 1
+        gaps += (last - first) - bin(minutes).count('1')
+        latest = max(latest, last)
+    return days, gaps, latest
+
+_DAY_COUNT = [bin(days).count('1') for days in range(1 << len(DAY_BITS))]
+
+def _days(mask):
+    """Bitmask of the days a week mask touches"""
+    return sum(1 << day for day in range(len(DAY_BITS)) if (mask >> (day * DAY_MINUTES)) & _DAY_MASK)
+
+def build_schedules(courses, busy_mask=0, limit=20):
+    """Best conflict-free combinations taking one option from each course.
+
+    courses is a list of option lists; an option is (week_mask, payload), and options
+    with the same mask should be merged by the caller. Returns up to limit
+    (score, [payload per course]) pairs, best first (see schedule_score; busy_mask counts),
+    with payloads in the order courses were given.
+
+    Courses with the fewest options are placed first and every remaining course is
+    filtered against the partial schedule, so dead branches end as soon as any course
+    has no compatible option left. Options on fewer days are tried first; once limit
+    combinations are kept, branches already on more days than the worst kept are dropped.
+    """
+    order = sorted(range(len(courses)), key=lambda i: len(courses[i]))
+    # Heap of kept results with the worst on top: (negated score, negated counter, payloads)
+    best = []
+    counter = 0
+
+    def search(depth, mask, days, remaining, chosen):
+        nonlocal counter
+        if len(best) >= limit and _DAY_COUNT[days] > -best[0][0][0]:
+            return
+        if depth == len(order):
+            entry = (tuple(-value for value in schedule_score(mask)), -counter, dict(chosen))
+            counter += 1
+            if len(best) < limit:
+                heapq.heappush(best, entry)
+            elif entry[0] > best[0][0]:
+                heapq.heapreplace(best, entry)
+            return
+
+        course = order[depth]
+        for option_mask, option_days, payload in remaining[course]:
+            new_mask = mask | option_mask
+            # Forward check: every later course must keep a compatible option
+            narrowed = dict(remaining)
+            for later in order[depth + 1:]:
+                narrowed[later] = [option for option in remaining[later] if not option[0] & new_mask]
+                if not narrowed[later]:
+                    break
+            else:
+                chosen[course] = payload
+                search(depth + 1, new_mask, days | option_days, narrowed, chosen)
+                del chosen[course]
+
+    busy_days = _days(busy_mask)
+    initial = {}
+    for i, options in enumerate(courses):
+        usable = [(mask, _days(mask), payload) for mask, payload in options if not mask & busy_mask]
+        initial[i] = sorted(usable, key=lambda option: _DAY_COUNT[option[1] | busy_days])
+    if courses and all(initial.values()):
+        search(0, busy_mask, busy_days, initial, {})
+
+    # Best score first; ties keep the order they were found in
+    results = sorted(best, reverse=True)
+    return [(tuple(-value for value in score), [chosen[i] for i in range(len(courses))])
+            for score, _, chosen in results]